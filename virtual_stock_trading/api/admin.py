@@ -1,16 +1,32 @@
+import os
 from django.contrib import admin
-from .models import Stock, Portfolio, Position, Transaction, PortfolioSnapshot
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import (
+    Stock, DailyPrice, Portfolio, PortfolioCheckpoint, Position, Transaction, PortfolioSnapshot, PortfolioRisk,
+    RequestProfile,
+)
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display = ('symbol', 'company_name', 'last_price', 'last_updated')
     search_fields = ('symbol', 'company_name')
 
+@admin.register(DailyPrice)
+class DailyPriceAdmin(admin.ModelAdmin):
+    list_display = ('stock', 'date', 'close')
+    list_filter = ('stock',)
+    date_hierarchy = 'date'
+
 @admin.register(Portfolio)
 class PortfolioAdmin(admin.ModelAdmin):
     list_display = ('name', 'user', 'cash_balance', 'created_at')
     list_filter = ('user',)
     search_fields = ('name', 'user__username')
+    # Cash is derived from the transaction ledger
+    readonly_fields = ('cash_balance',)
 
 @admin.register(Position)
 class PositionAdmin(admin.ModelAdmin):
@@ -23,8 +39,75 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ('portfolio', 'stock', 'transaction_type')
     date_hierarchy = 'timestamp'
 
+    # The ledger is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(PortfolioCheckpoint)
+class PortfolioCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('portfolio', 'timestamp', 'last_transaction_id', 'cash_balance')
+    list_filter = ('portfolio',)
+    date_hierarchy = 'timestamp'
+
 @admin.register(PortfolioSnapshot)
 class PortfolioSnapshotAdmin(admin.ModelAdmin):
     list_display = ('portfolio', 'date', 'total_value')
     list_filter = ('portfolio', 'date')
     date_hierarchy = 'date'
+
+@admin.register(PortfolioRisk)
+class PortfolioRiskAdmin(admin.ModelAdmin):
+    list_display = ('portfolio', 'date', 'total_value', 'var_1d', 'cvar_1d', 'var_10d', 'cvar_10d')
+    list_filter = ('portfolio', 'date')
+    date_hierarchy = 'date'
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Profiles captured by ProfilingMiddleware, slowest first"""
+    list_display = ('path', 'view', 'method', 'status', 'trigger', 'duration_ms', 'db_queries', 'db_ms', 'created_at')
+    list_filter = ('trigger', 'method', 'view')
+    search_fields = ('path', 'view')
+    date_hierarchy = 'created_at'
+    ordering = ('-duration_ms',)
+    fields = ('created_at', 'method', 'path', 'view', 'status', 'trigger', 'duration_ms', 'db_queries', 'db_ms',
+              'download', 'stats_report', 'sql_report')
+    readonly_fields = fields
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='api_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not profile.profile_file or not os.path.exists(profile.profile_file):
+            raise Http404("The profile file is no longer available")
+        return FileResponse(open(profile.profile_file, 'rb'), as_attachment=True,
+                            filename=os.path.basename(profile.profile_file))
+
+    @admin.display(description='Profile file')
+    def download(self, obj):
+        if not obj.profile_file:
+            return '-'
+        return format_html('<a href="{}">Download .prof</a> (open with snakeviz or pstats)',
+                           reverse('admin:api_requestprofile_download', args=[obj.pk]))
+
+    @admin.display(description='Top functions')
+    def stats_report(self, obj):
+        return format_html('<pre>{}</pre>', obj.stats) if obj.stats else '-'
+
+    @admin.display(description='SQL (identical statements grouped)')
+    def sql_report(self, obj):
+        if not obj.sql:
+            return '-'
+        lines = '\n'.join(f"{entry['count']:>5}x {entry['ms']:>10.2f}ms  {entry['sql']}" for entry in obj.sql)
+        return format_html('<pre>{}</pre>', lines)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
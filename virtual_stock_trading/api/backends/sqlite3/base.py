@@ -0,0 +1,49 @@
+"""
+SQLite backend tuned for single-node production use.
+
+Each new connection switches the database to WAL, so readers no longer
+block behind a writer, and applies the pragmas below. Transactions start
+with BEGIN IMMEDIATE: the write lock is taken when the transaction starts,
+and concurrent writers wait for it through the busy timeout. With a
+deferred BEGIN, a transaction that reads and then writes (as a trade does)
+fails at once with "database is locked" when another writer got there
+first, because SQLite cannot wait out that kind of lock upgrade.
+
+OPTIONS may override 'pragmas' (merged over the defaults),
+'transaction_mode' and 'timeout' (the busy timeout in seconds).
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable across application crashes; in WAL mode only a power loss
+    # can undo the last commits
+    'synchronous': 'NORMAL',
+    # Negative values are KiB: a 64 MB page cache per connection
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+DEFAULT_TIMEOUT = 20
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        params.setdefault('timeout', DEFAULT_TIMEOUT)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+        if self.is_in_memory_db():
+            pragmas.pop('journal_mode', None)
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'IMMEDIATE')
+        self.cursor().execute(f"BEGIN {mode}")
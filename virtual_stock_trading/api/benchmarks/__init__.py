@@ -0,0 +1,4 @@
+"""
+Benchmarks for the trading, valuation, snapshot and search hot paths.
+Run them with `python manage.py run_benchmarks` against a scratch database.
+"""
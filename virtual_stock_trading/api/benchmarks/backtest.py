@@ -0,0 +1,63 @@
+import time
+from datetime import date, timedelta
+from ..services.backtest_service import STRATEGIES, Backtester, Commission, PriceHistory, Slippage
+from ..services.market_simulator import MarketSimulator
+from .runner import summarize
+
+# Strategy parameters used by the benchmark
+STRATEGY_PARAMS = {
+    'buy_and_hold': {},
+    'sma_crossover': {'fast': 20, 'slow': 50},
+    'momentum': {'lookback': 90, 'top': 20, 'rebalance': 30},
+}
+
+
+class BacktestBenchmark:
+    """
+    Times Backtester on `years` of daily closes for `symbols` symbols,
+    simulated by MarketSimulator, with each built-in strategy and a per-share
+    commission and slippage. Reports the median run time with the number
+    of rebalances and trades, which drive the fill loop.
+    """
+
+    def __init__(self, years=10, symbols=500, repeat=3, seed=0):
+        self.years = years
+        self.symbols = [f"BT{i:05d}" for i in range(symbols)]
+        self.repeat = repeat
+        self.seed = seed
+
+    def history(self):
+        days = round(self.years * 365.25)
+        close = MarketSimulator(seed=self.seed, tick_seconds=24 * 60 * 60).path(self.symbols, 0, days)
+        first = date(2000, 1, 1)
+        return PriceHistory([first + timedelta(days=day) for day in range(days)], self.symbols, close)
+
+    def run(self):
+        started = time.perf_counter()
+        history = self.history()
+        generated = time.perf_counter() - started
+        backtester = Backtester(100000.0, Commission(per_share=0.005, minimum=1.0), Slippage(bps=5))
+
+        results = {}
+        for name, params in STRATEGY_PARAMS.items():
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                result = backtester.run(history, STRATEGIES[name](**params))
+                timings.append(time.perf_counter() - started)
+            stats = result.stats()
+            results[name] = {
+                **summarize(timings),
+                'rebalances': stats['rebalances'],
+                'trades': stats['trades'],
+                'total_return': stats['total_return'],
+            }
+        return {
+            'meta': {
+                'days': len(history.dates),
+                'symbols': len(self.symbols),
+                'repeat': self.repeat,
+                'history_ms': round(generated * 1000, 3),
+            },
+            'results': results,
+        }
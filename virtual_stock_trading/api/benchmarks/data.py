@@ -0,0 +1,174 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from ..models import DailyPrice, Portfolio, PortfolioCheckpoint, Position, Stock, Transaction
+from ..services.holdings_index import HoldingsIndex
+from ..services.ledger_service import LedgerState
+from ..services.valuation_service import ValuationService
+
+
+class SyntheticDataGenerator:
+    """
+    Seeds a reproducible set of users, portfolios, stocks and years of
+    transactions for benchmarking.
+
+    Each portfolio's history is generated as a valid ledger (an opening
+    deposit, then buys, sells and deposits that never overdraw or oversell),
+    and its cash, positions, valuation and checkpoint are written to match.
+    All records carry a name prefix so cleanup() can remove them.
+    """
+    USER_PREFIX = 'bench_'
+    SYMBOL_PREFIX = 'BX'
+    BATCH_SIZE = 5000
+    OPENING_BALANCE = Decimal('100000.00')
+
+    def __init__(self, seed=42, users=20, portfolios_per_user=3, stocks=100, years=3,
+                 transactions_per_portfolio=500):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.portfolios_per_user = portfolios_per_user
+        self.stocks = stocks
+        self.years = years
+        self.transactions_per_portfolio = transactions_per_portfolio
+        self.states = {}
+
+    @classmethod
+    def cleanup(cls):
+        User.objects.filter(username__startswith=cls.USER_PREFIX).delete()
+        Stock.objects.filter(symbol__startswith=cls.SYMBOL_PREFIX).delete()
+        HoldingsIndex.rebuild()
+
+    @classmethod
+    def users_queryset(cls):
+        return User.objects.filter(username__startswith=cls.USER_PREFIX)
+
+    def generate(self):
+        """Seed the data set. Returns a dict of counts and the time taken."""
+        started = time.perf_counter()
+        with transaction.atomic():
+            stocks = self._create_stocks()
+            self._create_closes(stocks)
+            users = self._create_users()
+            Portfolio.objects.bulk_create([
+                Portfolio(user=user, name=f"Benchmark {user.id}-{i}", cash_balance=0)
+                for user in users for i in range(self.portfolios_per_user)
+            ])
+            portfolios = list(Portfolio.objects.filter(user__in=users).order_by('id'))
+
+            transaction_count = 0
+            for portfolio in portfolios:
+                transaction_count += self._create_history(portfolio, stocks)
+
+            self._create_checkpoints(portfolios)
+            for portfolio in portfolios:
+                ValuationService.recompute(portfolio)
+        HoldingsIndex.rebuild()
+
+        return {
+            'users': len(users),
+            'portfolios': len(portfolios),
+            'stocks': len(stocks),
+            'transactions': transaction_count,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+    def _create_stocks(self):
+        Stock.objects.bulk_create([
+            Stock(
+                symbol=f"{self.SYMBOL_PREFIX}{i:04d}",
+                company_name=f"Benchmark Company {i:04d}",
+                last_price=Decimal(self.rng.randint(2000, 50000)) / 100,
+                last_updated=timezone.now(),
+            )
+            for i in range(self.stocks)
+        ], ignore_conflicts=True)
+        return list(Stock.objects.filter(symbol__startswith=self.SYMBOL_PREFIX).order_by('id'))
+
+    def _create_closes(self, stocks):
+        """Daily closes for every stock over the whole span, as a random walk ending at last_price"""
+        today = timezone.localdate()
+        days = 365 * self.years
+        closes = []
+        for stock in stocks:
+            price = float(stock.last_price)
+            for offset in range(days + 1):
+                closes.append(DailyPrice(stock=stock, date=today - timedelta(days=offset), close=round(price, 2)))
+                price = max(1.0, price * (1 + self.rng.gauss(0, 0.015)))
+        DailyPrice.objects.bulk_create(closes, batch_size=self.BATCH_SIZE, ignore_conflicts=True)
+
+    def _create_users(self):
+        existing = self.users_queryset().count()
+        User.objects.bulk_create([
+            User(username=f"{self.USER_PREFIX}{existing + i}") for i in range(self.users)
+        ])
+        return list(self.users_queryset().order_by('-id')[:self.users])
+
+    def _create_history(self, portfolio, stocks):
+        """Generate and write one portfolio's ledger, cash and positions"""
+        now = timezone.now()
+        span = timedelta(days=365 * self.years)
+        offsets = sorted(self.rng.random() for _ in range(self.transactions_per_portfolio))
+        # Each portfolio trades a handful of stocks, as real users do
+        universe = self.rng.sample(stocks, min(len(stocks), 15))
+
+        state = LedgerState()
+        state.apply(Transaction.DEPOSIT, None, 1, self.OPENING_BALANCE)
+        events = [Transaction(
+            portfolio=portfolio, transaction_type=Transaction.DEPOSIT, quantity=1,
+            price=self.OPENING_BALANCE, timestamp=now - span, notes='Opening balance',
+        )]
+        for offset in offsets:
+            stock = self.rng.choice(universe)
+            price = (stock.last_price * Decimal(self.rng.uniform(0.6, 1.4))).quantize(Decimal('0.01'))
+            held = state.positions.get(stock.pk, (0, None))[0]
+            roll = self.rng.random()
+            if roll < 0.05:
+                transaction_type, quantity, price = Transaction.DEPOSIT, 1, Decimal(self.rng.randint(100, 5000))
+            elif held and roll < 0.45:
+                transaction_type, quantity = Transaction.SELL, self.rng.randint(1, held)
+            else:
+                affordable = int(state.cash // price) if price else 0
+                if affordable < 1:
+                    continue
+                transaction_type, quantity = Transaction.BUY, self.rng.randint(1, min(affordable, 50))
+
+            stock_id = stock.pk if transaction_type != Transaction.DEPOSIT else None
+            state.apply(transaction_type, stock_id, quantity, price)
+            events.append(Transaction(
+                portfolio=portfolio,
+                stock_id=stock_id,
+                transaction_type=transaction_type,
+                quantity=quantity,
+                price=price,
+                timestamp=now - span + span * offset,
+            ))
+
+        Transaction.objects.bulk_create(events, batch_size=self.BATCH_SIZE)
+        Position.objects.bulk_create([
+            Position(portfolio=portfolio, stock_id=stock_id, quantity=quantity, average_buy_price=avg_price)
+            for stock_id, (quantity, avg_price) in state.positions.items()
+        ])
+        Portfolio.objects.filter(pk=portfolio.pk).update(cash_balance=state.cash)
+        portfolio.cash_balance = state.cash
+        self.states[portfolio.pk] = state
+        return len(events)
+
+    def _create_checkpoints(self, portfolios):
+        last_ids = dict(
+            Transaction.objects.filter(portfolio__in=portfolios)
+            .values('portfolio_id').annotate(last=Max('id')).values_list('portfolio_id', 'last')
+        )
+        PortfolioCheckpoint.objects.bulk_create([
+            PortfolioCheckpoint(
+                portfolio=portfolio,
+                last_transaction_id=last_ids.get(portfolio.pk, 0),
+                cash_balance=self.states[portfolio.pk].cash,
+                positions=self.states[portfolio.pk].to_json(),
+            )
+            for portfolio in portfolios
+        ])
@@ -0,0 +1,54 @@
+import random
+import time
+from ..services.leaderboard_service import BOARDS, MemoryLeaderboardBackend, RedisLeaderboardBackend
+from .runner import summarize
+
+
+class LeaderboardBenchmark:
+    """
+    Times a leaderboard backend on `portfolios` random entries: a full load,
+    rescoring one portfolio (as a trade does), a top-10 read and a rank
+    lookup. The in-memory backend is used unless a Redis `url` is given;
+    with Redis, the benchmark's boards replace any stored under the same
+    keys. No database is involved.
+    """
+
+    def __init__(self, portfolios=100000, repeat=2000, url=None, seed=42):
+        self.portfolios = portfolios
+        self.repeat = repeat
+        self.url = url
+        self.rng = random.Random(seed)
+
+    def entries(self):
+        entries = {board: {} for board in BOARDS}
+        for portfolio_id in range(1, self.portfolios + 1):
+            base = self.rng.uniform(1000, 100000)
+            for board in BOARDS:
+                entries[board][portfolio_id] = (base, base * self.rng.uniform(0.5, 2.0))
+        return entries
+
+    def run(self):
+        backend = RedisLeaderboardBackend(self.url) if self.url else MemoryLeaderboardBackend()
+        entries = self.entries()
+        started = time.perf_counter()
+        backend.load(entries)
+        load_seconds = time.perf_counter() - started
+
+        ids = [self.rng.randint(1, self.portfolios) for _ in range(self.repeat)]
+        operations = {
+            'update': lambda portfolio_id: backend.set_totals({portfolio_id: self.rng.uniform(1000, 200000)}),
+            'top_10': lambda portfolio_id: backend.top('all', 0, 10),
+            'rank': lambda portfolio_id: backend.rank('all', portfolio_id),
+        }
+        results = {'load': {'seconds': round(load_seconds, 3)}}
+        for name, operation in operations.items():
+            timings = []
+            for portfolio_id in ids:
+                started = time.perf_counter()
+                operation(portfolio_id)
+                timings.append(time.perf_counter() - started)
+            results[name] = summarize(timings)
+        return {
+            'meta': {'backend': backend.name, 'portfolios': self.portfolios, 'repeat': self.repeat},
+            'results': results,
+        }
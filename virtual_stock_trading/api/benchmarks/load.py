@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db.models import Max
+from ..models import Portfolio, Position, Stock, Transaction
+from ..services.ledger_service import LedgerService
+from .quotes import OfflineQuoteProvider
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class OrderLoadHarness:
+    """
+    Fires concurrent orders at a running server and then checks that every
+    acknowledged order, and nothing else, is reflected in the database.
+
+    Orders are priced by OfflineQuoteProvider and sent to one of the order
+    endpoints; with a single portfolio all workers contend for the same
+    rows, with several they are spread across portfolios. The harness reads
+    and writes the server's database directly to set up its user and
+    portfolios and to check invariants, so run it from the same checkout
+    and settings as the server.
+    """
+    ENDPOINTS = ('view', 'ajax', 'api')
+    USERNAME = 'load_harness'
+    PASSWORD = 'load-harness-password'
+    SYMBOL_PREFIX = 'LD'
+    OPENING_BALANCE = Decimal('1000000.00')
+
+    def __init__(self, base_url, endpoints=ENDPOINTS, portfolios=1, symbols=5, concurrency=8,
+                 orders=500, buy_ratio=0.6, seed=42, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = endpoints
+        self.portfolio_count = portfolios
+        self.symbol_count = symbols
+        self.concurrency = concurrency
+        self.orders = orders
+        self.buy_ratio = buy_ratio
+        self.seed = seed
+        self.timeout = timeout
+        self.quotes = OfflineQuoteProvider()
+        self._local = threading.local()
+
+    def setup(self):
+        """Create the harness user, stocks and freshly funded portfolios"""
+        user, created = User.objects.get_or_create(username=self.USERNAME)
+        if created or not user.check_password(self.PASSWORD):
+            user.set_password(self.PASSWORD)
+            user.save()
+
+        self.symbols = [f"{self.SYMBOL_PREFIX}{i:03d}" for i in range(self.symbol_count)]
+        for symbol in self.symbols:
+            Stock.objects.get_or_create(symbol=symbol, defaults={
+                'company_name': f"Load Test {symbol}",
+                'last_price': Decimal(f"{self.quotes.base_price(symbol):.2f}"),
+            })
+
+        Portfolio.objects.filter(user=user).delete()
+        self.portfolios = []
+        for i in range(self.portfolio_count):
+            portfolio = Portfolio.objects.create(user=user, name=f"Load {i}", cash_balance=0)
+            LedgerService.open_portfolio(portfolio, self.OPENING_BALANCE)
+            self.portfolios.append(portfolio)
+
+        self.start_cash = {portfolio.pk: portfolio.cash_balance for portfolio in self.portfolios}
+        self.start_last_id = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+
+    def session(self):
+        """A logged-in requests session per worker thread"""
+        import requests
+
+        if getattr(self._local, 'session', None) is None:
+            session = requests.Session()
+            session.get(f"{self.base_url}/login/", timeout=self.timeout)
+            response = session.post(f"{self.base_url}/login/", data={
+                'username': self.USERNAME,
+                'password': self.PASSWORD,
+                'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+            }, timeout=self.timeout, allow_redirects=False)
+            if response.status_code != 302:
+                raise RuntimeError(f"Login failed with status {response.status_code}")
+            session.headers['X-CSRFToken'] = session.cookies.get('csrftoken', '')
+            session.headers['Referer'] = f"{self.base_url}/"
+            self._local.session = session
+        return self._local.session
+
+    def plan(self):
+        """The order list, generated up front so runs are reproducible"""
+        rng = random.Random(self.seed)
+        orders = []
+        for i in range(self.orders):
+            endpoint = self.endpoints[i % len(self.endpoints)]
+            # The AJAX endpoint only accepts buys
+            side = 'buy' if endpoint == 'ajax' or rng.random() < self.buy_ratio else 'sell'
+            symbol = rng.choice(self.symbols)
+            orders.append({
+                'endpoint': endpoint,
+                'portfolio': rng.choice(self.portfolios).pk,
+                'symbol': symbol,
+                'side': side,
+                'quantity': rng.randint(1, 10),
+                'price': self.quotes.get_stock_price(symbol)['price'],
+            })
+        return orders
+
+    def send(self, order):
+        """Place one order; returns (order, status code, seconds)"""
+        body = {
+            'stock_symbol': order['symbol'],
+            'quantity': order['quantity'],
+            'price': order['price'],
+            'transaction_type': order['side'],
+        }
+        if order['endpoint'] == 'view':
+            url = f"{self.base_url}/transaction/{order['portfolio']}/"
+        elif order['endpoint'] == 'ajax':
+            url = f"{self.base_url}/transactions/create/"
+            body['portfolio_id'] = order['portfolio']
+        else:
+            url = f"{self.base_url}/api/portfolios/{order['portfolio']}/transactions/"
+
+        started = time.perf_counter()
+        try:
+            status = self.session().post(url, json=body, timeout=self.timeout).status_code
+        except Exception:
+            status = 0
+        return order, status, time.perf_counter() - started
+
+    def run(self):
+        """Run the load, then check invariants. Returns a report dict."""
+        self.setup()
+        orders = self.plan()
+        # Log every worker in before the clock starts
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            list(pool.map(lambda _: self.session(), range(self.concurrency * 4)))
+
+            started = time.perf_counter()
+            outcomes = list(pool.map(self.send, orders))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(seconds for _, _, seconds in outcomes)
+        statuses = Counter(status for _, status, _ in outcomes)
+        accepted = [order for order, status, _ in outcomes if status == 201]
+        by_endpoint = defaultdict(list)
+        for order, status, seconds in outcomes:
+            by_endpoint[order['endpoint']].append(seconds)
+
+        return {
+            'config': {
+                'base_url': self.base_url,
+                'endpoints': list(self.endpoints),
+                'portfolios': self.portfolio_count,
+                'concurrency': self.concurrency,
+                'orders': self.orders,
+            },
+            'seconds': round(elapsed, 3),
+            'throughput_per_sec': round(len(accepted) / elapsed, 1) if elapsed else None,
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'latency_ms': self.latency_summary(latencies),
+            'latency_ms_by_endpoint': {
+                endpoint: self.latency_summary(sorted(seconds)) for endpoint, seconds in by_endpoint.items()
+            },
+            'invariants': self.check(accepted),
+        }
+
+    @staticmethod
+    def latency_summary(ordered):
+        return {
+            name: round(percentile(ordered, fraction) * 1000, 2) if ordered else None
+            for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))
+        }
+
+    def check(self, accepted):
+        """
+        Compare the database with the orders the server acknowledged.
+        Returns {invariant: list of violations}; all lists empty means pass.
+        """
+        expected_cash = dict(self.start_cash)
+        expected_shares = defaultdict(int)
+        for order in accepted:
+            amount = Decimal(str(order['price'])).quantize(Decimal('0.01')) * order['quantity']
+            sign = 1 if order['side'] == 'buy' else -1
+            expected_cash[order['portfolio']] -= sign * amount
+            expected_shares[(order['portfolio'], order['symbol'])] += sign * order['quantity']
+
+        violations = defaultdict(list)
+        recorded = Transaction.objects.filter(portfolio__in=self.portfolios, id__gt=self.start_last_id).count()
+        if recorded != len(accepted):
+            violations['every_ack_recorded_once'].append(
+                f"{len(accepted)} orders acknowledged, {recorded} transactions recorded"
+            )
+
+        for portfolio in Portfolio.objects.filter(pk__in=expected_cash):
+            if portfolio.cash_balance != expected_cash[portfolio.pk]:
+                violations['cash_conserved'].append(
+                    f"portfolio {portfolio.pk}: expected {expected_cash[portfolio.pk]}, stored {portfolio.cash_balance}"
+                )
+            if portfolio.cash_balance < 0:
+                violations['non_negative_cash'].append(f"portfolio {portfolio.pk}: {portfolio.cash_balance}")
+            differences = LedgerService.audit(portfolio)
+            if differences:
+                violations['ledger_matches_positions'].append(f"portfolio {portfolio.pk}: {'; '.join(differences)}")
+
+        stored_shares = {
+            (portfolio_id, symbol): quantity
+            for portfolio_id, symbol, quantity in Position.objects.filter(portfolio__in=self.portfolios)
+            .values_list('portfolio_id', 'stock__symbol', 'quantity')
+        }
+        for key in set(expected_shares) | set(stored_shares):
+            stored = stored_shares.get(key, 0)
+            if stored < 0:
+                violations['non_negative_positions'].append(f"{key}: {stored}")
+            if stored != expected_shares.get(key, 0):
+                violations['shares_conserved'].append(f"{key}: expected {expected_shares.get(key, 0)}, stored {stored}")
+
+        names = ('every_ack_recorded_once', 'cash_conserved', 'shares_conserved', 'non_negative_cash',
+                 'non_negative_positions', 'ledger_matches_positions')
+        return {name: violations.get(name, []) for name in names}
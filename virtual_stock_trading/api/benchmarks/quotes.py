@@ -0,0 +1,56 @@
+import zlib
+from unittest import mock
+from ..services.stock_service import StockService
+
+
+class OfflineQuoteProvider:
+    """
+    Serves deterministic quotes in place of Finnhub while active, so
+    benchmarks are repeatable and never touch the network.
+
+        with OfflineQuoteProvider() as quotes:
+            TradingService.execute_buy(portfolio, 'AAPL', 10)
+        quotes.calls  # number of quotes served
+    """
+
+    def __init__(self, base_prices=None):
+        self.base_prices = base_prices or {}
+        self.calls = 0
+        self._patches = []
+
+    def base_price(self, symbol):
+        if symbol in self.base_prices:
+            return self.base_prices[symbol]
+        # Stable pseudo-random price between 20 and 500 per symbol
+        return 20 + zlib.crc32(symbol.encode()) % 48000 / 100
+
+    def get_stock_price(self, symbol):
+        symbol = symbol.upper()
+        self.calls += 1
+        base = self.base_price(symbol)
+        # Small deterministic drift so consecutive orders are not all at one price
+        price = round(base * (1 + ((self.calls % 21) - 10) / 1000), 2)
+        return {
+            'symbol': symbol,
+            'price': price,
+            'change': round(price - base, 2),
+            'percent_change': round((price - base) / base * 100, 2),
+            'high': price,
+            'low': price,
+            'timestamp': None,
+        }
+
+    def __enter__(self):
+        self._patches = [
+            mock.patch.object(StockService, 'get_stock_price', self.get_stock_price),
+            mock.patch.object(StockService, 'use_mock_data', lambda: True),
+        ]
+        for patch in self._patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in reversed(self._patches):
+            patch.stop()
+        self._patches = []
+        return False
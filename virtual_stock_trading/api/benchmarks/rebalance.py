@@ -0,0 +1,43 @@
+import random
+import time
+from decimal import Decimal
+from ..services.rebalance_service import RebalanceService
+from .runner import summarize
+
+
+class RebalanceBenchmark:
+    """
+    Times RebalanceService.solve() and orders() for portfolios of each size
+    in `sizes`: random holdings rebalanced to new random target weights over
+    the held symbols plus 10% new ones. No database is involved.
+    """
+
+    def __init__(self, sizes=(100, 500), repeat=20, seed=42):
+        self.sizes = sizes
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+
+    def case(self, size):
+        symbols = [f"RB{i:05d}" for i in range(size + size // 10)]
+        prices = {symbol: Decimal(self.rng.randint(500, 50000)) / 100 for symbol in symbols}
+        holdings = {symbol: self.rng.randint(1, 200) for symbol in symbols[:size]}
+        weights = [Decimal(self.rng.random()) for _ in symbols]
+        total = sum(weights) / Decimal('0.98')  # keep 2% in cash
+        targets = {symbol: weight / total for symbol, weight in zip(symbols, weights)}
+        return holdings, prices, Decimal('10000.00'), targets
+
+    def run(self):
+        results = {}
+        for size in self.sizes:
+            holdings, prices, cash, targets = self.case(size)
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                wanted = RebalanceService.solve(holdings, prices, cash, targets, tolerance='0.001')
+                orders = RebalanceService.orders(holdings, wanted, prices)
+                timings.append(time.perf_counter() - started)
+            cash_after = cash + sum(
+                order['amount'] * (1 if order['side'] == 'sell' else -1) for order in orders
+            )
+            results[str(size)] = {**summarize(timings), 'orders': len(orders), 'cash_after': float(cash_after)}
+        return {'meta': {'repeat': self.repeat}, 'results': results}
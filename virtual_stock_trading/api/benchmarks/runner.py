@@ -0,0 +1,160 @@
+import platform
+import statistics
+import time
+from datetime import date, timedelta
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from ..models import Portfolio, PortfolioSnapshot, Transaction
+from ..services.backfill_service import SnapshotBackfillService
+from ..services.ledger_service import LedgerService
+from ..services.portfolio_service import PortfolioService
+from ..services.trading_service import TradingService
+from .data import SyntheticDataGenerator
+from .load import percentile
+from .quotes import OfflineQuoteProvider
+
+
+def summarize(timings, queries=None):
+    """Summarize a list of durations in seconds"""
+    ordered = sorted(timings)
+    result = {
+        'runs': len(ordered),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+    if queries is not None:
+        result['queries'] = queries
+    return result
+
+
+class BenchmarkRunner:
+    """
+    Times the hot paths against data seeded by SyntheticDataGenerator,
+    with quotes served by OfflineQuoteProvider.
+    """
+    # Metrics where a larger value is worse; ops_per_sec is the opposite
+    LOWER_IS_BETTER = ('median_ms', 'p95_ms', 'queries', 'seconds')
+    HIGHER_IS_BETTER = ('ops_per_sec',)
+
+    def __init__(self, orders=200, repeat=30):
+        self.orders = orders
+        self.repeat = repeat
+
+    def run(self):
+        user = SyntheticDataGenerator.users_queryset().filter(portfolios__positions__isnull=False).first()
+        if user is None:
+            raise ValueError("No benchmark data found; seed it first")
+        portfolio = Portfolio.objects.filter(user=user).order_by('id').first()
+
+        results = {}
+        with OfflineQuoteProvider() as quotes:
+            results.update(self.bench_trading(portfolio))
+            results.update(self.bench_views(user, portfolio))
+            results.update(self.bench_snapshots())
+            results['quote_calls'] = {'count': quotes.calls}
+
+        return {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'orders': self.orders,
+                'repeat': self.repeat,
+                'portfolios': Portfolio.objects.filter(user__in=SyntheticDataGenerator.users_queryset()).count(),
+            },
+            'results': results,
+        }
+
+    def bench_trading(self, portfolio):
+        """Throughput of market buys, then sells, through TradingService"""
+        symbols = list(portfolio.positions.values_list('stock__symbol', flat=True)[:5])
+        # Enough cash for every buy; the sells then unwind them
+        LedgerService.record(portfolio, Transaction.DEPOSIT, 1, 1000 * self.orders, notes='Benchmark funding')
+        results = {}
+        for name, execute in (('execute_buy', TradingService.execute_buy),
+                              ('execute_sell', TradingService.execute_sell)):
+            timings = []
+            for i in range(self.orders):
+                symbol = symbols[i % len(symbols)]
+                started = time.perf_counter()
+                execute(portfolio, symbol, 1)
+                timings.append(time.perf_counter() - started)
+            results[name] = summarize(timings)
+            results[name]['ops_per_sec'] = round(len(timings) / sum(timings), 1)
+        return results
+
+    def bench_views(self, user, portfolio):
+        """Latency and query counts of the portfolio and search endpoints"""
+        client = Client()
+        client.force_login(user)
+        symbol = portfolio.positions.values_list('stock__symbol', flat=True).first()
+        endpoints = {
+            'portfolio_list_api': '/api/portfolios/',
+            'portfolio_detail_api': f'/api/portfolios/{portfolio.id}/',
+            'portfolio_summary_api': f'/api/portfolios/{portfolio.id}/summary/',
+            'portfolio_transactions_api': f'/api/portfolios/{portfolio.id}/transactions/',
+            'portfolio_list_page': '/portfolios/',
+            'portfolio_detail_page': f'/portfolios/{portfolio.id}/',
+            'stock_search_api': f'/api/stocks/search/?q={symbol}',
+            'stock_filter_api': f'/api/stocks/?search={symbol[:3]}',
+        }
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url in endpoints.items():
+                client.get(url)  # warm up
+                timings = []
+                for _ in range(self.repeat):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = client.get(url)
+                        timings.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise ValueError(f"{url} returned {response.status_code}")
+                results[name] = summarize(timings, len(queries))
+        return results
+
+    def bench_snapshots(self):
+        """Runtime of the daily snapshot job and of a 30-day backfill"""
+        today = date.today()
+        timings = []
+        for _ in range(3):
+            PortfolioSnapshot.objects.filter(date=today).delete()
+            started = time.perf_counter()
+            count = PortfolioService.create_daily_snapshots()
+            timings.append(time.perf_counter() - started)
+        results = {'daily_snapshots': summarize(timings)}
+        results['daily_snapshots']['snapshots'] = count
+
+        started = time.perf_counter()
+        summary = SnapshotBackfillService.backfill(today - timedelta(days=30), today - timedelta(days=1), overwrite=True)
+        results['snapshot_backfill_30d'] = {
+            'seconds': round(time.perf_counter() - started, 3),
+            'snapshots': summary['snapshots'],
+        }
+        return results
+
+    @classmethod
+    def compare(cls, results, baseline, threshold=0.25):
+        """
+        Compare results with a baseline run. Returns a list of regressions
+        as (benchmark, metric, baseline value, current value) tuples for
+        metrics that got worse by more than threshold (a fraction).
+        """
+        regressions = []
+        for name, metrics in results['results'].items():
+            previous = baseline.get('results', {}).get(name, {})
+            for metric, value in metrics.items():
+                before = previous.get(metric)
+                if not before:
+                    continue
+                if metric in cls.LOWER_IS_BETTER and value > before * (1 + threshold):
+                    regressions.append((name, metric, before, value))
+                elif metric in cls.HIGHER_IS_BETTER and value < before * (1 - threshold):
+                    regressions.append((name, metric, before, value))
+        return regressions
@@ -0,0 +1,124 @@
+import random
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+from ..fast_serializers import FastPortfolioSerializer, FastPositionSerializer, FastTransactionSerializer
+from ..models import Portfolio, Position, Stock, Transaction
+from ..renderers import FastJSONRenderer
+from ..serializers import PortfolioSerializer, PositionSerializer, TransactionSerializer
+from .runner import summarize
+
+
+class SerializationBenchmark:
+    """
+    Compares the DRF serializers with JSONRenderer against the values()
+    serializers in fast_serializers with FastJSONRenderer, for portfolio,
+    position and transaction lists of each size in `sizes`.
+
+    The rows belong to a dedicated user and stocks, bulk-created by seed()
+    and removed by cleanup(). Each case times querying, serializing and
+    rendering together, counts the queries and checks that both paths
+    render the same bytes.
+    """
+    USERNAME = 'serial_bench'
+    SYMBOL_PREFIX = 'SB'
+    BATCH_SIZE = 2000
+
+    def __init__(self, sizes=(1000, 10000), repeat=5, seed=42):
+        self.sizes = sorted(sizes)
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def cleanup(cls):
+        User.objects.filter(username=cls.USERNAME).delete()
+        Stock.objects.filter(symbol__startswith=cls.SYMBOL_PREFIX).delete()
+
+    def seed(self):
+        """Create enough portfolios, positions and transactions for the largest size"""
+        rows = self.sizes[-1]
+        with transaction.atomic():
+            user = User.objects.create(username=self.USERNAME)
+            Stock.objects.bulk_create([
+                Stock(symbol=f"{self.SYMBOL_PREFIX}{i:05d}", company_name=f"Serializer Bench {i:05d}",
+                      last_price=Decimal(self.rng.randint(100, 50000)) / 100)
+                for i in range(rows)
+            ], batch_size=self.BATCH_SIZE)
+            stocks = list(Stock.objects.filter(symbol__startswith=self.SYMBOL_PREFIX).order_by('id'))
+            Portfolio.objects.bulk_create([
+                Portfolio(user=user, name=f"Serializer Bench {i}",
+                          cash_balance=Decimal(self.rng.randint(0, 10000000)) / 100,
+                          cached_total_value=Decimal(self.rng.randint(0, 10000000)) / 100)
+                for i in range(rows)
+            ], batch_size=self.BATCH_SIZE)
+            portfolio = Portfolio.objects.filter(user=user).order_by('id').first()
+            Position.objects.bulk_create([
+                Position(portfolio=portfolio, stock=stock, quantity=self.rng.randint(1, 500),
+                         average_buy_price=Decimal(self.rng.randint(100, 50000)) / 100)
+                for stock in stocks
+            ], batch_size=self.BATCH_SIZE)
+            Transaction.objects.bulk_create([
+                Transaction(portfolio=portfolio, stock=self.rng.choice(stocks), transaction_type=Transaction.BUY,
+                            quantity=self.rng.randint(1, 50), price=Decimal(self.rng.randint(100, 50000)) / 100)
+                for _ in range(rows)
+            ], batch_size=self.BATCH_SIZE)
+        return user, portfolio
+
+    def run(self):
+        self.cleanup()
+        user, portfolio = self.seed()
+        try:
+            results = {}
+            for size in self.sizes:
+                cases = {
+                    'portfolios': (
+                        Portfolio.objects.filter(user=user).order_by('id')[:size],
+                        PortfolioSerializer, FastPortfolioSerializer,
+                    ),
+                    'positions': (
+                        Position.objects.filter(portfolio=portfolio).order_by('id')[:size],
+                        PositionSerializer, FastPositionSerializer,
+                    ),
+                    'transactions': (
+                        Transaction.objects.filter(portfolio=portfolio).order_by('-timestamp', '-id')[:size],
+                        TransactionSerializer, FastTransactionSerializer,
+                    ),
+                }
+                for name, (queryset, serializer, fast_serializer) in cases.items():
+                    results[f'{name}_{size}'] = self.compare(queryset, serializer, fast_serializer)
+        finally:
+            self.cleanup()
+        return {'meta': {'database': connection.vendor, 'repeat': self.repeat}, 'results': results}
+
+    def compare(self, queryset, serializer, fast_serializer):
+        renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+        drf, drf_body = self.measure(lambda: renderer.render(serializer(queryset.all(), many=True).data))
+        fast, fast_body = self.measure(lambda: fast_renderer.render(fast_serializer.many(queryset.all())))
+        return {
+            'drf': drf,
+            'fast': fast,
+            'speedup': round(drf['median_ms'] / fast['median_ms'], 1) if fast['median_ms'] else None,
+            'identical': drf_body == fast_body,
+        }
+
+    def measure(self, render):
+        render()  # warm up
+        timings = []
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            # CaptureQueriesContext stops counting at 9000 queries
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(self.repeat):
+            queries = 0
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                body = render()
+                timings.append(time.perf_counter() - started)
+        return summarize(timings, queries), body
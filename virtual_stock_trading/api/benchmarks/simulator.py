@@ -0,0 +1,78 @@
+import time
+from ..services.market_simulator import MarketSimulator
+from .runner import summarize
+
+
+class SimulatorBenchmark:
+    """
+    Measures MarketSimulator throughput for stress tests: prices generated
+    per second for a universe of `symbols` synthetic symbols over `steps`
+    ticks, and the latency of single quotes with and without cached chunks.
+
+    Each run simulates a window no earlier run has touched, so chunks are
+    generated rather than served from the cache. The results also check
+    that two simulators with the same seed produce identical prices and
+    that the returns' volatility and correlation match the parameters.
+    """
+
+    def __init__(self, symbols=100, steps=100_000, repeat=5, seed=0):
+        self.symbols = [f"SIM{i:05d}" for i in range(symbols)]
+        self.steps = steps
+        self.repeat = repeat
+        self.seed = seed
+
+    def simulator(self):
+        return MarketSimulator(seed=self.seed)
+
+    def run(self):
+        return {
+            'meta': {'symbols': len(self.symbols), 'steps': self.steps, 'repeat': self.repeat},
+            'results': {
+                'path': self.bench_path(),
+                'quote': self.bench_quote(),
+                'checks': self.check(),
+            },
+        }
+
+    def bench_path(self):
+        simulator = self.simulator()
+        timings = []
+        for run in range(self.repeat):
+            started = time.perf_counter()
+            simulator.path(self.symbols, run * self.steps, self.steps)
+            timings.append(time.perf_counter() - started)
+        result = summarize(timings)
+        result['ticks_per_sec'] = round(len(self.symbols) * self.steps / min(timings))
+        return result
+
+    def bench_quote(self):
+        simulator = self.simulator()
+        cold, warm = [], []
+        for symbol in self.symbols[:50]:
+            for timings in (cold, warm):
+                started = time.perf_counter()
+                simulator.quote(symbol)
+                timings.append(time.perf_counter() - started)
+        return {'uncached': summarize(cold), 'cached': summarize(warm)}
+
+    def check(self):
+        import numpy as np
+
+        symbols = self.symbols[:10]
+        steps = min(self.steps, 50_000)
+        first = self.simulator()
+        second = self.simulator()
+        # Touch a later window first so the second simulator fills its caches in another order
+        second.path(symbols, 10 * steps, 10)
+        prices = first.path(symbols, steps, steps)
+
+        returns = np.diff(np.log(prices), axis=0)
+        upper = np.triu_indices(len(symbols), 1)
+        _, _, volatility, _ = first.params(symbols[0])
+        return {
+            'deterministic': bool(np.array_equal(prices, second.path(symbols, steps, steps))),
+            'volatility': round(float(returns.std(axis=0).mean() / np.sqrt(first.dt)), 4),
+            'expected_volatility': volatility,
+            'correlation': round(float(np.corrcoef(returns.T)[upper].mean()), 4),
+            'expected_correlation': round(float(first.correlation(symbols)[upper].mean()), 4),
+        }
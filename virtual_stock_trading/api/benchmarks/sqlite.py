@@ -0,0 +1,151 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from ..models import Portfolio, Position, Stock, Transaction
+from ..services.ledger_service import LedgerService
+from .load import percentile
+
+
+class SqliteConcurrencyBenchmark:
+    """
+    Compares concurrent trade and read throughput on a stock SQLite
+    configuration and on the tuned backend (SQLITE_TUNING=true).
+
+    For each mode a scratch database is migrated and seeded, then writer
+    and reader processes run side by side for a fixed time, as gunicorn
+    workers would. Writers place buys and sells through LedgerService;
+    readers load portfolios, positions and recent transactions. Each
+    process is a separate `manage.py benchmark_sqlite --role ...` run that
+    reports its counts as a JSON line.
+    """
+    MODES = ('stock', 'tuned')
+    USERNAME = 'sqlite_bench'
+    SYMBOL_PREFIX = 'SQ'
+    OPENING_BALANCE = Decimal('1000000.00')
+    # Time allowed for the worker processes to start before the clock runs
+    STARTUP_SECONDS = 5
+
+    def __init__(self, writers=4, readers=4, seconds=10, portfolios=1, symbols=5):
+        self.writers = writers
+        self.readers = readers
+        self.seconds = seconds
+        self.portfolios = portfolios
+        self.symbols = symbols
+
+    def run(self):
+        results = {mode: self.run_mode(mode) for mode in self.MODES}
+        stock, tuned = results['stock'], results['tuned']
+        results['improvement'] = {
+            metric: round(tuned[metric] / stock[metric], 2) if stock[metric] else None
+            for metric in ('writes_per_sec', 'reads_per_sec')
+        }
+        results['config'] = {
+            'writers': self.writers,
+            'readers': self.readers,
+            'seconds': self.seconds,
+            'portfolios': self.portfolios,
+        }
+        return results
+
+    def run_mode(self, mode):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}",
+                'DATABASE_REPLICA_URLS': '',
+                'SQLITE_TUNING': 'true' if mode == 'tuned' else 'false',
+                'USE_MOCK_DATA': 'true',
+                'LOG_LEVEL': 'WARNING',
+            }
+            self.manage(env, 'migrate', '--verbosity', '0')
+            self.manage(env, 'benchmark_sqlite', '--role', 'seed',
+                        '--portfolios', str(self.portfolios), '--symbols', str(self.symbols))
+
+            start_at = time.time() + self.STARTUP_SECONDS
+            workers = [('writer', i) for i in range(self.writers)] + [('reader', i) for i in range(self.readers)]
+            processes = [
+                subprocess.Popen(
+                    self.command('benchmark_sqlite', '--role', role, '--index', str(index),
+                                 '--start-at', str(start_at), '--seconds', str(self.seconds)),
+                    env=env, stdout=subprocess.PIPE, text=True,
+                )
+                for role, index in workers
+            ]
+            reports = []
+            for process in processes:
+                output, _ = process.communicate()
+                if process.returncode != 0:
+                    raise RuntimeError(f"Benchmark worker failed with exit code {process.returncode}")
+                reports.append(json.loads(output.strip().splitlines()[-1]))
+
+        return self.aggregate(reports)
+
+    def aggregate(self, reports):
+        summary = {}
+        for role in ('writer', 'reader'):
+            ops = sum(report['ops'] for report in reports if report['role'] == role)
+            latencies = sorted(ms for report in reports if report['role'] == role for ms in report['latencies_ms'])
+            name = 'writes' if role == 'writer' else 'reads'
+            summary[f'{name}_per_sec'] = round(ops / self.seconds, 1)
+            summary[f'{name}_errors'] = sum(report['errors'] for report in reports if report['role'] == role)
+            summary[f'{name}_p50_ms'] = percentile(latencies, 0.50)
+            summary[f'{name}_p95_ms'] = percentile(latencies, 0.95)
+        return summary
+
+    @staticmethod
+    def command(*args):
+        return [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), *args]
+
+    def manage(self, env, *args):
+        subprocess.run(self.command(*args), env=env, check=True, stdout=subprocess.DEVNULL)
+
+    @classmethod
+    def seed(cls, portfolios, symbols):
+        """Create the benchmark user, stocks and funded portfolios"""
+        user, _ = User.objects.get_or_create(username=cls.USERNAME)
+        for i in range(symbols):
+            Stock.objects.get_or_create(symbol=f"{cls.SYMBOL_PREFIX}{i:03d}", defaults={
+                'company_name': f"SQLite Bench {i:03d}",
+                'last_price': Decimal('100.00'),
+            })
+        for i in range(portfolios):
+            portfolio = Portfolio.objects.create(user=user, name=f"SQLite Bench {i}", cash_balance=0)
+            LedgerService.open_portfolio(portfolio, cls.OPENING_BALANCE)
+
+    @classmethod
+    def work(cls, role, index, start_at, seconds):
+        """Run one worker until the time is up; returns its report dict"""
+        portfolios = list(Portfolio.objects.filter(user__username=cls.USERNAME).order_by('id'))
+        stocks = list(Stock.objects.filter(symbol__startswith=cls.SYMBOL_PREFIX).order_by('id'))
+        portfolio = portfolios[index % len(portfolios)]
+
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = start_at + seconds
+        ops = errors = 0
+        latencies = []
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                if role == 'writer':
+                    stock = stocks[ops % len(stocks)]
+                    # Buy then sell each stock in turn so cash and positions stay bounded
+                    side = Transaction.BUY if (ops // len(stocks)) % 2 == 0 else Transaction.SELL
+                    LedgerService.record(portfolio, side, 1, stock.last_price, stock=stock)
+                else:
+                    list(Portfolio.objects.filter(user__username=cls.USERNAME)
+                         .values('id', 'cash_balance', 'cached_total_value'))
+                    list(Position.objects.filter(portfolio=portfolio).select_related('stock'))
+                    list(Transaction.objects.filter(portfolio=portfolio).order_by('-id')[:20])
+            except (OperationalError, ValueError):
+                errors += 1
+                continue
+            ops += 1
+            latencies.append(round((time.perf_counter() - started) * 1000, 3))
+        return {'role': role, 'index': index, 'ops': ops, 'errors': errors, 'latencies_ms': latencies}
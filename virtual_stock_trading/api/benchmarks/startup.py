@@ -0,0 +1,112 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+
+# What each kind of process imports before it can serve its first request
+# or task: the web worker loads the WSGI application and the URLconf (and
+# with it every view), the Celery worker loads the app and every tasks module.
+PROFILES = {
+    'web': (
+        "import django.conf, importlib\n"
+        "from virtual_stock_trading.wsgi import application\n"
+        "importlib.import_module(django.conf.settings.ROOT_URLCONF)\n"
+    ),
+    'worker': (
+        "import django\n"
+        "django.setup()\n"
+        "from virtual_stock_trading.celery import app\n"
+        "app.loader.import_default_modules()\n"
+    ),
+}
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class StartupBenchmark:
+    """
+    Measures how long web and Celery worker processes take to start, and
+    what they import, by running each profile in fresh interpreters.
+
+    Wall time is the median of `repeat` cold starts. Import time comes from
+    `python -X importtime`: the total, the most expensive top-level imports,
+    and whether any module in FORBIDDEN was imported. Those packages are
+    only needed by a few requests and tasks (imports, backfills, analytics)
+    and must be imported inside the functions that use them.
+    """
+    FORBIDDEN = ('pandas', 'numpy', 'scipy', 'yfinance', 'matplotlib')
+
+    def __init__(self, profiles=None, repeat=5, top=15):
+        self.profiles = profiles or list(PROFILES)
+        self.repeat = repeat
+        self.top = top
+
+    def run(self):
+        return {profile: self.measure(profile) for profile in self.profiles}
+
+    def command(self, profile, importtime=False):
+        flags = ['-X', 'importtime'] if importtime else []
+        return [sys.executable, *flags, '-c', PROFILES[profile]]
+
+    def environment(self):
+        return {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'virtual_stock_trading.settings'),
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+
+    def measure(self, profile):
+        env = self.environment()
+        subprocess.run(self.command(profile), env=env, check=True)  # warm up: compile bytecode, fill the page cache
+
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            subprocess.run(self.command(profile), env=env, check=True)
+            timings.append(time.perf_counter() - started)
+
+        result = subprocess.run(self.command(profile, importtime=True), env=env, check=True,
+                                stderr=subprocess.PIPE, text=True)
+        modules = self.parse_importtime(result.stderr)
+        top_level = sorted((m for m in modules if m['depth'] == 0), key=lambda m: m['cumulative_us'], reverse=True)
+        return {
+            'wall_ms': round(statistics.median(timings) * 1000, 1),
+            'import_ms': round(sum(m['self_us'] for m in modules) / 1000, 1),
+            'modules': len(modules),
+            'forbidden': sorted({
+                m['name'].split('.')[0] for m in modules if m['name'].split('.')[0] in self.FORBIDDEN
+            }),
+            'top_imports': [
+                {'module': m['name'], 'ms': round(m['cumulative_us'] / 1000, 1)} for m in top_level[:self.top]
+            ],
+        }
+
+    @staticmethod
+    def parse_importtime(output):
+        """Parse `-X importtime` output into dicts of name, depth, self and cumulative microseconds"""
+        modules = []
+        for line in output.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                modules.append({
+                    'name': name,
+                    'depth': (len(indent) - 1) // 2,
+                    'self_us': int(self_us),
+                    'cumulative_us': int(cumulative_us),
+                })
+        return modules
+
+    @classmethod
+    def check(cls, results, budget_ms=None):
+        """Problems with the results: forbidden imports, and import times over budget_ms"""
+        problems = []
+        for profile, result in results.items():
+            for module in result['forbidden']:
+                problems.append(f"{profile}: {module} is imported at startup")
+            if budget_ms is not None and result['import_ms'] > budget_ms:
+                problems.append(f"{profile}: imports took {result['import_ms']}ms, over the {budget_ms}ms budget")
+        return problems
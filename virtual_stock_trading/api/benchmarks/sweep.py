@@ -0,0 +1,55 @@
+import os
+import time
+from .backtest import BacktestBenchmark
+from ..services.sweep_service import ParameterSweep
+
+# 36 combinations of the SMA crossover, all valid
+GRID = {'fast': [5, 10, 15, 20, 30, 40], 'slow': [50, 75, 100, 150, 200, 250]}
+
+
+class SweepBenchmark:
+    """
+    Runs the same SMA crossover sweep over simulated closes with an
+    increasing number of worker processes and reports the speedup over a
+    single worker. Speedup is bounded by the CPU cores available; the
+    counts default to powers of two up to os.cpu_count().
+    """
+
+    def __init__(self, years=5, symbols=200, workers=None, seed=0):
+        self.years = years
+        self.symbols = symbols
+        self.seed = seed
+        cores = os.cpu_count() or 1
+        self.workers = workers or sorted({2 ** power for power in range(cores.bit_length()) if 2 ** power <= cores} | {cores})
+
+    def run(self):
+        history = BacktestBenchmark(self.years, self.symbols, seed=self.seed).history()
+        combinations = len(ParameterSweep.expand(GRID))
+        results = {}
+        baseline = None
+        for workers in sorted(self.workers):
+            sweep = ParameterSweep(history, 'sma_crossover', GRID, workers=workers)
+            started = time.perf_counter()
+            first = None
+            for _ in sweep.run():
+                first = first or time.perf_counter() - started
+            elapsed = time.perf_counter() - started
+            if workers == 1:
+                baseline = elapsed
+            speedup = baseline / elapsed if baseline else None
+            results[str(workers)] = {
+                'seconds': round(elapsed, 3),
+                'first_result_ms': round(first * 1000, 1),
+                'combinations_per_sec': round(combinations / elapsed, 2),
+                'speedup': round(speedup, 2) if speedup else None,
+                'efficiency': round(speedup / workers, 2) if speedup else None,
+            }
+        return {
+            'meta': {
+                'cpu_count': os.cpu_count(),
+                'days': len(history.dates),
+                'symbols': len(history.symbols),
+                'combinations': combinations,
+            },
+            'results': results,
+        }
@@ -0,0 +1,78 @@
+"""
+Routing of reads to the read replicas in settings.DATABASE_REPLICAS.
+
+Reads go to the primary unless the code runs inside use_replica(), which
+ReplicaRoutingMiddleware applies to read-only requests and the reporting
+tasks apply to themselves. Even then a read stays on the primary when it
+happens inside a transaction on the primary, after the current scope has
+written anything (unless the scope opted out of read-your-writes), or for
+models that must never be stale (sessions). Writes always go to the
+primary.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_use_replica = contextvars.ContextVar('db_use_replica', default=False)
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+_read_your_writes = contextvars.ContextVar('db_read_your_writes', default=True)
+
+
+@contextmanager
+def use_replica(read_your_writes=True):
+    """
+    Send reads in this block to a replica, where it is safe to. With
+    read_your_writes=False reads stay on the replica after the block
+    writes, for batch jobs whose reads do not depend on their own writes.
+    """
+    tokens = (_use_replica.set(True), _wrote.set(False), _read_your_writes.set(read_your_writes))
+    try:
+        yield
+    finally:
+        _use_replica.reset(tokens[0])
+        _wrote.reset(tokens[1])
+        _read_your_writes.reset(tokens[2])
+
+
+@contextmanager
+def use_primary():
+    """Send every read in this block to the primary"""
+    tokens = (_use_replica.set(False), _wrote.set(False))
+    try:
+        yield
+    finally:
+        _use_replica.reset(tokens[0])
+        _wrote.reset(tokens[1])
+
+
+def wrote():
+    """Whether anything was written in the current use_replica/use_primary block"""
+    return _wrote.get()
+
+
+class ReplicaRouter:
+    # Apps whose rows are read right after being written, e.g. a new session
+    PRIMARY_ONLY_APPS = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or not _use_replica.get() or (_wrote.get() and _read_your_writes.get())
+                or model._meta.app_label in self.PRIMARY_ONLY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Later reads in the same scope must see this write
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db == DEFAULT_DB_ALIAS
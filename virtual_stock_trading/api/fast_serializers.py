@@ -0,0 +1,132 @@
+"""
+Read-only serializers for list and detail responses.
+
+They produce exactly what the DRF serializers in serializers.py produce,
+but from queryset.values() rows, skipping model instances and per-field
+serializer machinery. Writes still go through the DRF serializers.
+"""
+from decimal import Decimal
+from django.db.models import F
+from django.utils import timezone
+from .models import Position
+
+CENTS = Decimal('0.01')
+
+
+def decimal_string(value):
+    """A DecimalField value as DRF renders it: a fixed-point string"""
+    return None if value is None else format(value.quantize(CENTS), 'f')
+
+
+def datetime_string(value):
+    """A DateTimeField value as DRF renders it: ISO 8601 in the current time zone"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+class ValuesSerializer:
+    """
+    Serializes rows of queryset.values(). Subclasses name the model
+    `fields` to select (a foreign key yields its id), `computed` output
+    names mapped to database expressions, `converters` applied to raw
+    values and `output` listing the keys in the order DRF emits them.
+    """
+    fields = ()
+    computed = {}
+    converters = {}
+    output = ()
+
+    @classmethod
+    def queryset(cls, queryset):
+        return queryset.values(*cls.fields, **cls.computed)
+
+    @classmethod
+    def to_representation(cls, row):
+        converters = cls.converters
+        return {
+            name: converters[name](row[name]) if name in converters else row[name]
+            for name in cls.output
+        }
+
+    @classmethod
+    def represent(cls, rows):
+        """Serialize rows already fetched with queryset()"""
+        return [cls.to_representation(row) for row in rows]
+
+    @classmethod
+    def many(cls, queryset):
+        return cls.represent(cls.queryset(queryset))
+
+    @classmethod
+    def one(cls, queryset):
+        """Serialize the single row of queryset, or return None if it is empty"""
+        row = cls.queryset(queryset).first()
+        return None if row is None else cls.to_representation(row)
+
+
+class FastPortfolioSerializer(ValuesSerializer):
+    """Output of PortfolioSerializer"""
+    fields = ('id', 'name', 'description', 'cash_balance', 'created_at', 'updated_at', 'last_repriced_at')
+    computed = {'total_value': F('cached_total_value')}
+    converters = {
+        'cash_balance': decimal_string,
+        'created_at': datetime_string,
+        'updated_at': datetime_string,
+        'last_repriced_at': datetime_string,
+    }
+    output = ('id', 'name', 'description', 'cash_balance', 'created_at', 'updated_at', 'total_value',
+              'last_repriced_at')
+
+
+class FastPositionSerializer(ValuesSerializer):
+    """Output of PositionSerializer, with the nested stock"""
+    fields = ('id', 'quantity', 'average_buy_price', 'stock_id', 'stock__symbol', 'stock__company_name',
+              'stock__last_price', 'stock__last_updated')
+
+    @classmethod
+    def to_representation(cls, row):
+        # As Position.current_value() and profit_loss(): exact Decimal
+        # arithmetic in Python (SQLite would multiply as floats), 0 without a price
+        price = row['stock__last_price']
+        quantity = row['quantity']
+        return {
+            'id': row['id'],
+            'stock': {
+                'id': row['stock_id'],
+                'symbol': row['stock__symbol'],
+                'company_name': row['stock__company_name'],
+                'last_price': decimal_string(row['stock__last_price']),
+                'last_updated': datetime_string(row['stock__last_updated']),
+            },
+            'quantity': quantity,
+            'average_buy_price': decimal_string(row['average_buy_price']),
+            'current_value': quantity * price if price else 0,
+            'profit_loss': (price - row['average_buy_price']) * quantity if price else 0,
+        }
+
+
+class FastTransactionSerializer(ValuesSerializer):
+    """Output of TransactionSerializer"""
+    fields = ('id', 'portfolio', 'stock', 'transaction_type', 'quantity', 'price', 'timestamp')
+    converters = {
+        'price': decimal_string,
+        'timestamp': datetime_string,
+    }
+    output = fields
+
+
+class FastPortfolioDetailSerializer:
+    """Output of PortfolioDetailSerializer"""
+
+    @classmethod
+    def one(cls, queryset):
+        portfolio = FastPortfolioSerializer.one(queryset)
+        if portfolio is not None:
+            portfolio['positions'] = FastPositionSerializer.many(
+                Position.objects.filter(portfolio_id=portfolio['id']).order_by('id')
+            )
+        return portfolio
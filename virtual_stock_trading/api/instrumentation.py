@@ -0,0 +1,82 @@
+import contextvars
+import time
+from .metrics import registry
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Wall time of a request by view', ('view', 'method'))
+REQUESTS = registry.counter(
+    'http_requests', 'Requests by view and response status', ('view', 'method', 'status'))
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'Database queries per request by view', ('view',), QUERY_BUCKETS)
+REQUEST_DB_SECONDS = registry.histogram(
+    'http_request_db_duration_seconds', 'Database time per request by view', ('view',))
+UPSTREAM_SECONDS = registry.histogram(
+    'upstream_request_duration_seconds', 'Latency of calls to external services', ('service', 'endpoint'))
+UPSTREAM_REQUESTS = registry.counter(
+    'upstream_requests', 'Calls to external services by outcome', ('service', 'endpoint', 'outcome'))
+CACHE_REQUESTS = registry.counter(
+    'cache_requests', 'Cache lookups by cache and result', ('cache', 'result'))
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Counters for one request, collected while it is being handled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """A connection.execute_wrapper that counts and times queries"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+def activate(metrics):
+    """Make metrics the current request's collector; returns a reset token"""
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current():
+    """The RequestMetrics of the request being handled, or None"""
+    return _current.get()
+
+
+def record_upstream(service, endpoint, seconds, ok=True):
+    """Record one call to an external service, e.g. a Finnhub quote"""
+    UPSTREAM_SECONDS.observe(seconds, service, endpoint)
+    UPSTREAM_REQUESTS.inc(service, endpoint, 'ok' if ok else 'error')
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.upstream_calls += 1
+        metrics.upstream_seconds += seconds
+
+
+def record_cache(cache, hit):
+    """Record one cache lookup and whether it was served from the cache"""
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
@@ -0,0 +1,116 @@
+"""
+Logging building blocks referenced from settings.LOGGING.
+
+Records are put on an in-memory queue by the request thread and
+formatted and written by a background listener thread, so a log call
+costs a queue append rather than a blocking write to stdout.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from .metrics import registry
+
+DROPPED = registry.counter(
+    'log_records_dropped', 'Log records discarded because the log queue was full', ('logger',))
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed as extra="""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through a fraction of records below min_level, for high-frequency
+    events such as search keystrokes and quote lookups. Records at or above
+    min_level always pass.
+    """
+
+    def __init__(self, rate=1.0, min_level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.min_level = logging.getLevelName(min_level) if isinstance(min_level, str) else min_level
+
+    def filter(self, record):
+        return record.levelno >= self.min_level or self.rate >= 1 or random.random() < self.rate
+
+
+class QueueingStreamHandler(QueueHandler):
+    """
+    Writes to a stream from a background thread. The calling thread only
+    enqueues the record; when the queue is full the record is dropped and
+    counted instead of blocking the request.
+
+    The listener thread is started lazily in each process, so the handler
+    also works when gunicorn forks workers after configuring logging.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Formatting happens in the listener thread, on the target handler
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Records stay in this process, so there is no need to format them
+        # up front as QueueHandler does to make them picklable
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc(record.name)
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent's listener thread does not exist here
+                self.queue = queue.Queue(maxsize=self.queue_size)
+            self._listener = QueueListener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None and self._pid == os.getpid():
+            # Flushes the records still queued
+            listener.stop()
+        super().close()
+
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from api.services.backfill_service import SnapshotBackfillService
+
+
+class Command(BaseCommand):
+    help = "Rebuild missing daily portfolio snapshots from the transaction ledger and stored daily closes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="First date to backfill (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last date to backfill (default: yesterday)")
+        parser.add_argument('--portfolio', type=int, action='append', dest='portfolios',
+                            help="Only backfill this portfolio; may be repeated")
+        parser.add_argument('--batch-size', type=int, default=SnapshotBackfillService.BATCH_SIZE)
+        parser.add_argument('--overwrite', action='store_true', help="Replace existing snapshots in the range")
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start'])
+        end = parse_date(options['end']) if options['end'] else date.today() - timedelta(days=1)
+        if start is None or end is None:
+            raise CommandError("Dates must be in YYYY-MM-DD format")
+
+        try:
+            summary = SnapshotBackfillService.backfill(
+                start, end, options['portfolios'], options['batch_size'], options['overwrite']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {summary['snapshots']:,} snapshots for {summary['portfolios']:,} portfolios "
+            f"over {summary['days']:,} days in {summary['seconds']}s"
+        ))
+        if summary['unpriced_position_days']:
+            self.stderr.write(
+                f"{summary['unpriced_position_days']:,} position-days had no price and were valued at zero; "
+                f"load closes with load_price_history and rerun with --overwrite"
+            )
@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.backtest import BacktestBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the backtesting engine on simulated daily closes for many years "
+        "and symbols, with each built-in strategy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=float, default=10)
+        parser.add_argument('--symbols', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        results = BacktestBenchmark(
+            years=options['years'], symbols=options['symbols'], repeat=options['repeat'], seed=options['seed'],
+        ).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
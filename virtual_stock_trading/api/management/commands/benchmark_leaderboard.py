@@ -0,0 +1,25 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.leaderboard import LeaderboardBenchmark
+
+
+class Command(BaseCommand):
+    help = "Time leaderboard updates, top-N reads and rank lookups on random portfolios"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--portfolios', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=2000)
+        parser.add_argument('--redis', help="Benchmark the Redis backend at this URL instead of the in-memory one")
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        results = LeaderboardBenchmark(
+            portfolios=options['portfolios'], repeat=options['repeat'], url=options['redis'],
+        ).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
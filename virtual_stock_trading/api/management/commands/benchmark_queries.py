@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from api.models import Stock, Portfolio, Position, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic transactions and report query plans and timings for the "
+        "hot transaction, position and stock search queries. Run against a "
+        "scratch database: seeding 10M rows takes a while."
+    )
+
+    USER_PREFIX = 'bench_queries_'
+    SYMBOL_PREFIX = 'BQ'
+    CHUNK_SIZE = 50000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=10_000_000)
+        parser.add_argument('--portfolios', type=int, default=1000)
+        parser.add_argument('--stocks', type=int, default=500)
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--skip-seed', action='store_true', help="Reuse previously seeded data")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the seeded data afterwards")
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.seed(options)
+
+        portfolio = Portfolio.objects.filter(user__username__startswith=self.USER_PREFIX).first()
+        if portfolio is None:
+            self.stderr.write("No seeded data found; run without --skip-seed first")
+            return
+
+        since = timezone.now() - timedelta(days=90)
+        queries = {
+            'latest transactions (portfolio detail)':
+                lambda: portfolio.transactions.order_by('-timestamp')[:10],
+            'transaction history page':
+                lambda: portfolio.transactions.order_by('-timestamp', '-id')[:100],
+            'buys in the last 90 days':
+                lambda: portfolio.transactions.filter(transaction_type=Transaction.BUY, timestamp__gte=since),
+            'positions by user':
+                lambda: Position.objects.filter(portfolio__user=portfolio.user).select_related('stock'),
+            'stock search':
+                lambda: Stock.objects.filter(Q(symbol__icontains='q12') | Q(company_name__icontains='q12')),
+        }
+
+        self.stdout.write(f"Database: {connection.vendor}, "
+                          f"{Transaction.objects.count():,} transactions\n")
+        for label, build in queries.items():
+            queryset = build()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f"median {statistics.median(timings):.2f} ms, "
+                f"max {max(timings):.2f} ms over {len(timings)} runs\n"
+            )
+
+        if options['cleanup']:
+            User.objects.filter(username__startswith=self.USER_PREFIX).delete()
+            Stock.objects.filter(symbol__startswith=self.SYMBOL_PREFIX).delete()
+
+    def seed(self, options):
+        rng = random.Random(42)
+        started = time.perf_counter()
+
+        Stock.objects.bulk_create([
+            Stock(symbol=f"{self.SYMBOL_PREFIX}{i:04d}", company_name=f"Benchmark Company {i:04d}",
+                  last_price=Decimal(rng.randint(1000, 50000)) / 100, last_updated=timezone.now())
+            for i in range(options['stocks'])
+        ], ignore_conflicts=True)
+        stock_ids = list(Stock.objects.filter(symbol__startswith=self.SYMBOL_PREFIX).values_list('id', flat=True))
+
+        User.objects.bulk_create([
+            User(username=f"{self.USER_PREFIX}{i}") for i in range(max(1, options['portfolios'] // 5))
+        ], ignore_conflicts=True)
+        user_ids = list(User.objects.filter(username__startswith=self.USER_PREFIX).values_list('id', flat=True))
+
+        Portfolio.objects.bulk_create([
+            Portfolio(user_id=user_ids[i % len(user_ids)], name=f"Benchmark {i}", cash_balance=100000)
+            for i in range(options['portfolios'])
+        ])
+        portfolio_ids = list(
+            Portfolio.objects.filter(user_id__in=user_ids).values_list('id', flat=True)
+        )
+
+        Position.objects.bulk_create([
+            Position(portfolio_id=portfolio_id, stock_id=stock_id, quantity=rng.randint(1, 500),
+                     average_buy_price=Decimal(rng.randint(1000, 50000)) / 100)
+            for portfolio_id in portfolio_ids
+            for stock_id in rng.sample(stock_ids, min(10, len(stock_ids)))
+        ], ignore_conflicts=True)
+
+        now = timezone.now()
+        span_seconds = options['years'] * 365 * 24 * 3600
+        types = [Transaction.BUY, Transaction.BUY, Transaction.SELL, Transaction.DEPOSIT]
+        remaining = options['transactions']
+        while remaining > 0:
+            batch = []
+            for _ in range(min(self.CHUNK_SIZE, remaining)):
+                transaction_type = rng.choice(types)
+                is_trade = transaction_type in (Transaction.BUY, Transaction.SELL)
+                batch.append(Transaction(
+                    portfolio_id=rng.choice(portfolio_ids),
+                    stock_id=rng.choice(stock_ids) if is_trade else None,
+                    transaction_type=transaction_type,
+                    quantity=rng.randint(1, 100) if is_trade else 1,
+                    price=Decimal(rng.randint(1000, 50000)) / 100,
+                    timestamp=now - timedelta(seconds=rng.randrange(span_seconds)),
+                ))
+            Transaction.objects.bulk_create(batch)
+            remaining -= len(batch)
+            self.stdout.write(f"  seeded {options['transactions'] - remaining:,} transactions", ending='\r')
+
+        self.stdout.write(f"\nSeeded in {time.perf_counter() - started:.1f}s")
+        # Refresh planner statistics so the plans reflect the seeded volume
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,23 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.rebalance import RebalanceBenchmark
+
+
+class Command(BaseCommand):
+    help = "Time the rebalancing solver on random portfolios of the given sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,500', help="Comma-separated numbers of holdings")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        results = RebalanceBenchmark(sizes=sizes, repeat=options['repeat']).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
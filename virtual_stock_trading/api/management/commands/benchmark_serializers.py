@@ -0,0 +1,27 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.serialization import SerializationBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the DRF serializers with the fast values() serializers and "
+        "orjson renderer on portfolio, position and transaction lists. Seeds "
+        "its own rows and removes them afterwards; run against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help="Comma-separated list sizes")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        results = SerializationBenchmark(sizes=sizes, repeat=options['repeat']).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
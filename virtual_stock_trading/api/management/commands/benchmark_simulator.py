@@ -0,0 +1,30 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.simulator import SimulatorBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure market simulator throughput (prices generated per second) and "
+        "quote latency, and check that its paths are reproducible and have the "
+        "configured volatility and correlation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=100, help="Symbols in the simulated universe")
+        parser.add_argument('--steps', type=int, default=100_000, help="Ticks simulated per run")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        results = SimulatorBenchmark(
+            symbols=options['symbols'], steps=options['steps'], repeat=options['repeat'], seed=options['seed'],
+        ).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,50 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.sqlite import SqliteConcurrencyBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent trade and read throughput on stock SQLite settings and "
+        "on the tuned SQLite backend (WAL, pragmas, busy timeout, BEGIN IMMEDIATE). "
+        "Each mode runs on its own scratch database in separate processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="Processes placing trades")
+        parser.add_argument('--readers', type=int, default=4, help="Processes reading portfolios")
+        parser.add_argument('--seconds', type=int, default=10, help="Duration of each run")
+        parser.add_argument('--portfolios', type=int, default=1,
+                            help="Portfolios the writers trade in (1 = all contend for one)")
+        parser.add_argument('--symbols', type=int, default=5)
+        parser.add_argument('--output', help="Write results to this JSON file")
+        # Used by the worker processes the benchmark starts
+        parser.add_argument('--role', choices=['seed', 'writer', 'reader'], help="(internal)")
+        parser.add_argument('--index', type=int, default=0, help="(internal)")
+        parser.add_argument('--start-at', type=float, help="(internal)")
+
+    def handle(self, *args, **options):
+        if options['role'] == 'seed':
+            SqliteConcurrencyBenchmark.seed(options['portfolios'], options['symbols'])
+            return
+        if options['role']:
+            report = SqliteConcurrencyBenchmark.work(
+                options['role'], options['index'], options['start_at'], options['seconds']
+            )
+            self.stdout.write(json.dumps(report))
+            return
+
+        results = SqliteConcurrencyBenchmark(
+            writers=options['writers'],
+            readers=options['readers'],
+            seconds=options['seconds'],
+            portfolios=options['portfolios'],
+            symbols=options['symbols'],
+        ).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
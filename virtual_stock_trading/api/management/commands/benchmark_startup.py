@@ -0,0 +1,37 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks.startup import PROFILES, StartupBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start time and imports of web and Celery worker processes "
+        "with `python -X importtime`. Fails if a heavy optional package (pandas, "
+        "numpy, ...) is imported at startup or, with --budget-ms, if imports take "
+        "longer than the budget, so it can run in CI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                            help="Process to measure (repeatable; default: all)")
+        parser.add_argument('--repeat', type=int, default=5, help="Cold starts timed per profile")
+        parser.add_argument('--top', type=int, default=15, help="Most expensive imports to list")
+        parser.add_argument('--budget-ms', type=float, help="Fail if imports take longer than this")
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        results = StartupBenchmark(options['profile'], options['repeat'], options['top']).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        problems = StartupBenchmark.check(results, options['budget_ms'])
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f"{len(problems)} startup checks failed")
+        self.stdout.write(self.style.SUCCESS("Startup checks passed"))
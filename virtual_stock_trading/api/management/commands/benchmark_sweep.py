@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmarks.sweep import SweepBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the speedup of backtest parameter sweeps with the number of "
+        "worker processes, on simulated daily closes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=float, default=5)
+        parser.add_argument('--symbols', type=int, default=200)
+        parser.add_argument('--workers', type=int, nargs='+', help="Worker counts to time (default: 1, 2, 4 ... CPUs)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        results = SweepBenchmark(
+            years=options['years'], symbols=options['symbols'], workers=options['workers'], seed=options['seed'],
+        ).run()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,39 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Portfolio
+from api.services.export_service import ExportService
+
+
+class Command(BaseCommand):
+    help = "Stream a portfolio's transaction or snapshot history as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('portfolio_id', type=int)
+        parser.add_argument('kind', choices=['transactions', 'snapshots'])
+        parser.add_argument('--output', choices=list(ExportService.FORMATS), default='csv')
+        parser.add_argument('--start', help="Earliest date or datetime to include")
+        parser.add_argument('--end', help="Latest date or datetime to include")
+        parser.add_argument('--gzip', action='store_true', help="Compress the output")
+        parser.add_argument('--file', help="Write to this path instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            portfolio = Portfolio.objects.get(pk=options['portfolio_id'])
+            start = ExportService.parse_bound(options['start'])
+            end = ExportService.parse_bound(options['end'], end=True)
+        except Portfolio.DoesNotExist:
+            raise CommandError(f"Portfolio {options['portfolio_id']} does not exist")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks, filename = ExportService.export(
+            portfolio, options['kind'], options['output'], start, end, options['gzip']
+        )
+        if options['file']:
+            with open(options['file'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
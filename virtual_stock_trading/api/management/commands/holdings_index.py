@@ -0,0 +1,22 @@
+import json
+from django.core.management.base import BaseCommand
+from api.services.holdings_index import HoldingsIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuild the symbol -> holders index or report its metrics"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['rebuild', 'stats'])
+        parser.add_argument('--symbol', help="Look up the holders of a symbol before reporting stats")
+
+    def handle(self, *args, **options):
+        if options['action'] == 'rebuild':
+            count = HoldingsIndex.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} holdings"))
+            return
+
+        if options['symbol']:
+            holders = HoldingsIndex.holders(options['symbol'])
+            self.stdout.write(f"{options['symbol'].upper()}: {len(holders)} holders")
+        self.stdout.write(json.dumps(HoldingsIndex.stats(), indent=2))
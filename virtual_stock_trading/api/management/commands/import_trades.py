@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Portfolio
+from api.services.import_service import TradeImportService
+
+
+class Command(BaseCommand):
+    help = "Import a CSV of historical trades into a portfolio"
+
+    def add_arguments(self, parser):
+        parser.add_argument('portfolio_id', type=int)
+        parser.add_argument('path', help="CSV with timestamp, transaction_type, symbol, quantity, price columns")
+        parser.add_argument('--chunk-size', type=int, default=TradeImportService.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            portfolio = Portfolio.objects.get(pk=options['portfolio_id'])
+        except Portfolio.DoesNotExist:
+            raise CommandError(f"Portfolio {options['portfolio_id']} does not exist")
+
+        try:
+            summary = TradeImportService.import_csv(portfolio, options['path'], options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['rows']:,} rows in {summary['seconds']}s "
+            f"({summary['rows_per_second']:,} rows/sec); "
+            f"{summary['positions']} open positions, cash ${summary['cash_balance']}"
+        ))
@@ -0,0 +1,18 @@
+import json
+from django.core.management.base import BaseCommand
+from api.services.leaderboard_service import LeaderboardService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the portfolio leaderboards or report their sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['rebuild', 'stats'])
+
+    def handle(self, *args, **options):
+        if options['action'] == 'rebuild':
+            count = LeaderboardService.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Ranked {count} portfolios"))
+            return
+
+        self.stdout.write(json.dumps(LeaderboardService.stats(), indent=2))
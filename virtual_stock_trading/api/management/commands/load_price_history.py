@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from api.services.price_history_service import PriceHistoryService
+
+
+class Command(BaseCommand):
+    help = "Store historical daily closes from a CSV file or the quote provider"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="CSV with date, symbol and close columns")
+        parser.add_argument('--symbols', nargs='+', help="Fetch closes for these symbols from Finnhub")
+        parser.add_argument('--start', help="First date to fetch (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last date to fetch (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                written = PriceHistoryService.load_csv(options['file'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        elif options['symbols']:
+            start = parse_date(options['start'] or '')
+            end = parse_date(options['end'] or '')
+            if start is None or end is None:
+                raise CommandError("--start and --end (YYYY-MM-DD) are required with --symbols")
+            written = PriceHistoryService.fetch(options['symbols'], start, end)
+        else:
+            raise CommandError("Pass --file or --symbols")
+
+        self.stdout.write(self.style.SUCCESS(f"Stored {written:,} daily closes"))
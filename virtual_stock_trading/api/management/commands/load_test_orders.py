@@ -0,0 +1,53 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks.load import OrderLoadHarness
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent orders at a running server and check that cash, positions and "
+        "the ledger stay consistent. Start the server against the same database with "
+        "USE_MOCK_DATA=true, e.g. `USE_MOCK_DATA=true python manage.py runserver` or "
+        "gunicorn with several workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=OrderLoadHarness.ENDPOINTS,
+                            help="Endpoint to load (view, ajax or api); may be repeated, default all")
+        parser.add_argument('--portfolios', type=int, default=1,
+                            help="Portfolios to spread orders over; 1 makes every order contend")
+        parser.add_argument('--symbols', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--buy-ratio', type=float, default=0.6)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the report to this JSON file")
+
+    def handle(self, *args, **options):
+        harness = OrderLoadHarness(
+            options['base_url'],
+            endpoints=tuple(options['endpoints'] or OrderLoadHarness.ENDPOINTS),
+            portfolios=options['portfolios'],
+            symbols=options['symbols'],
+            concurrency=options['concurrency'],
+            orders=options['orders'],
+            buy_ratio=options['buy_ratio'],
+            seed=options['seed'],
+        )
+        try:
+            report = harness.run()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        failed = {name: problems for name, problems in report['invariants'].items() if problems}
+        if failed:
+            raise CommandError(f"Invariants violated: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS("All invariants hold"))
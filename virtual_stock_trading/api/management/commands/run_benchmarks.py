@@ -0,0 +1,68 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks.data import SyntheticDataGenerator
+from api.benchmarks.runner import BenchmarkRunner
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic data and benchmark the trading, portfolio, snapshot and "
+        "search hot paths. Results are written as JSON and can be compared with a "
+        "baseline run; the command fails if any metric regressed. Run against a "
+        "scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--portfolios-per-user', type=int, default=3)
+        parser.add_argument('--stocks', type=int, default=100)
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--transactions', type=int, default=500, help="Transactions per portfolio")
+        parser.add_argument('--orders', type=int, default=200, help="Orders per trading benchmark")
+        parser.add_argument('--repeat', type=int, default=30, help="Timed requests per endpoint")
+        parser.add_argument('--skip-seed', action='store_true', help="Reuse previously seeded data")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the seeded data afterwards")
+        parser.add_argument('--output', help="Write results to this JSON file")
+        parser.add_argument('--baseline', help="Compare with results from an earlier run")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed slowdown as a fraction of the baseline (default 0.25)")
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            SyntheticDataGenerator.cleanup()
+            seeded = SyntheticDataGenerator(
+                seed=options['seed'],
+                users=options['users'],
+                portfolios_per_user=options['portfolios_per_user'],
+                stocks=options['stocks'],
+                years=options['years'],
+                transactions_per_portfolio=options['transactions'],
+            ).generate()
+            self.stdout.write(f"Seeded {seeded['transactions']:,} transactions across "
+                              f"{seeded['portfolios']:,} portfolios in {seeded['seconds']}s")
+
+        try:
+            results = BenchmarkRunner(options['orders'], options['repeat']).run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if options['cleanup']:
+                SyntheticDataGenerator.cleanup()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = BenchmarkRunner.compare(results, baseline, options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stderr.write(f"{name}.{metric}: {before} -> {after}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} benchmark metrics regressed beyond {options['threshold']:.0%}")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
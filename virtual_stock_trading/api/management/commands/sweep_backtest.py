@@ -0,0 +1,85 @@
+import json
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from api.services.backtest_service import Commission, PriceHistory, Slippage
+from api.services.sweep_service import ParameterSweep
+
+
+def parse_value(value):
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        "Backtest a strategy for every combination of parameter values over stored "
+        "daily closes, on a pool of worker processes. Results are written as JSON "
+        "lines as they finish; Ctrl-C stops the sweep early."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', required=True)
+        parser.add_argument('--start', required=True, help="First day (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last day (default: yesterday)")
+        parser.add_argument('--strategy', required=True)
+        parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2,...',
+                            help="Values of a strategy parameter; may be repeated")
+        parser.add_argument('--initial-cash', type=float, default=100000.0)
+        parser.add_argument('--commission-per-share', type=float, default=0.0)
+        parser.add_argument('--commission-minimum', type=float, default=0.0)
+        parser.add_argument('--slippage-bps', type=float, default=5.0)
+        parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+        parser.add_argument('--sort', default='sharpe', help="Statistic to rank the best results by")
+        parser.add_argument('--top', type=int, default=5, help="Best results to list at the end")
+        parser.add_argument('--output', help="Write results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start'])
+        end = parse_date(options['end']) if options['end'] else date.today() - timedelta(days=1)
+        if start is None or end is None:
+            raise CommandError("Dates must be in YYYY-MM-DD format")
+        grid = {}
+        for param in options['param']:
+            name, _, values = param.partition('=')
+            if not name or not values:
+                raise CommandError(f"Invalid --param {param!r}; expected NAME=V1,V2,...")
+            grid[name] = [parse_value(value) for value in values.split(',')]
+
+        try:
+            history = PriceHistory.from_database(options['symbols'], start, end)
+            sweep = ParameterSweep(
+                history, options['strategy'], grid,
+                initial_cash=options['initial_cash'],
+                commission=Commission(per_share=options['commission_per_share'],
+                                      minimum=options['commission_minimum']),
+                slippage=Slippage(bps=options['slippage_bps']),
+                workers=options['workers'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'w') if options['output'] else self.stdout
+        results = []
+        try:
+            for result in sweep.run():
+                results.append(result)
+                output.write(json.dumps(result, default=str) + '\n')
+                output.flush()
+        except KeyboardInterrupt:
+            sweep.cancel()
+            self.stderr.write(f"Stopped after {len(results)} of {len(sweep.combinations)} combinations")
+        finally:
+            if options['output']:
+                output.close()
+
+        ranked = sorted(
+            (result for result in results if options['sort'] in result.get('stats', {})),
+            key=lambda result: result['stats'][options['sort']], reverse=True,
+        )
+        for result in ranked[:options['top']]:
+            self.stderr.write(f"{options['sort']}={result['stats'][options['sort']]} {result['params']}")
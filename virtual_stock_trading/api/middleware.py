@@ -0,0 +1,291 @@
+import io
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from . import db_router, instrumentation
+from .models import RequestProfile
+
+logger = logging.getLogger('api.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Measures each request's wall time, database queries and time, external
+    API calls and cache lookups. The figures are added to the response as a
+    Server-Timing header, logged with the request, and recorded in the
+    per-view histograms served at /metrics.
+
+    Disabled entirely when settings.PERF_INSTRUMENTATION is false.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_INSTRUMENTATION', True)
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', settings.DEBUG)
+        self.slow_seconds = getattr(settings, 'PERF_SLOW_REQUEST_MS', 1000) / 1000
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.activate(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+
+        elapsed = metrics.elapsed()
+        view = self.view_name(request)
+        instrumentation.REQUEST_SECONDS.observe(elapsed, view, request.method)
+        instrumentation.REQUESTS.inc(view, request.method, str(response.status_code))
+        instrumentation.REQUEST_QUERIES.observe(metrics.db_queries, view)
+        instrumentation.REQUEST_DB_SECONDS.observe(metrics.db_seconds, view)
+
+        if self.server_timing:
+            response['Server-Timing'] = self.server_timing_header(metrics, elapsed)
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_queries': metrics.db_queries,
+            'db_ms': round(metrics.db_seconds * 1000, 2),
+            'upstream_calls': metrics.upstream_calls,
+            'upstream_ms': round(metrics.upstream_seconds * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+        }
+        level = logging.WARNING if elapsed >= self.slow_seconds else logging.INFO
+        logger.log(
+            level,
+            f"{request.method} {request.path} {response.status_code} {fields['duration_ms']}ms "
+            f"db={metrics.db_queries}/{fields['db_ms']}ms upstream={metrics.upstream_calls}/{fields['upstream_ms']}ms",
+            extra={'perf': fields},
+        )
+        return response
+
+    @staticmethod
+    def view_name(request):
+        """A bounded label for the view that handled the request"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route or 'unnamed'
+
+    @staticmethod
+    def server_timing_header(metrics, elapsed):
+        parts = [
+            f"app;dur={elapsed * 1000:.1f}",
+            f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.db_queries} queries"',
+            f'upstream;dur={metrics.upstream_seconds * 1000:.1f};desc="{metrics.upstream_calls} calls"',
+        ]
+        if metrics.cache_hits or metrics.cache_misses:
+            parts.append(f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"')
+        return ', '.join(parts)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling. A request is run under cProfile when it
+    carries the PROFILING_HEADER (staff users, or clients sending
+    PROFILING_TOKEN as its value) or is picked at PROFILING_SAMPLE_RATE.
+    Every request's SQL is traced, and requests slower than
+    PROFILING_SLOW_MS are saved with their SQL even when not profiled.
+
+    Results are stored as RequestProfile rows, browsable in the admin,
+    with the raw profile written to PROFILING_DIR. Unless
+    PROFILING_ENABLED is set the middleware removes itself from the chain
+    at startup, so it costs nothing when disabled.
+    """
+    # cProfile can only profile one request per process at a time
+    _profiler_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.header = settings.PROFILING_HEADER
+        self.token = settings.PROFILING_TOKEN
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.slow_seconds = settings.PROFILING_SLOW_MS / 1000 if settings.PROFILING_SLOW_MS else None
+        self.directory = settings.PROFILING_DIR
+        self.keep = settings.PROFILING_KEEP
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        profiler = None
+        if trigger and self._profiler_lock.acquire(blocking=False):
+            import cProfile
+            profiler = cProfile.Profile()
+
+        queries = []
+
+        def trace(execute, sql, params, many, context):
+            query_started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((sql, time.perf_counter() - query_started))
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(trace))
+                if profiler is not None:
+                    profiler.enable()
+                    stack.callback(profiler.disable)
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                self._profiler_lock.release()
+        elapsed = time.perf_counter() - started
+
+        slow = self.slow_seconds is not None and elapsed >= self.slow_seconds
+        if profiler is None and not slow:
+            return response
+        try:
+            self.save(request, response, trigger if profiler is not None else RequestProfile.SLOW,
+                      elapsed, profiler, queries, include_sql=slow or profiler is not None)
+        except Exception as e:
+            logger.exception("Could not save request profile: %s", e)
+        return response
+
+    def trigger(self, request):
+        """Why this request should be profiled, or None"""
+        requested = request.headers.get(self.header)
+        if requested:
+            if self.token and constant_time_compare(requested, self.token):
+                return RequestProfile.HEADER
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return RequestProfile.HEADER
+        if self.sample_rate and random.random() < self.sample_rate:
+            return RequestProfile.SAMPLE
+        return None
+
+    @staticmethod
+    def summarize_sql(queries, limit=50):
+        """Group identical statements, most total time first, so N+1 patterns stand out"""
+        grouped = defaultdict(lambda: [0, 0.0])
+        for sql, seconds in queries:
+            grouped[sql][0] += 1
+            grouped[sql][1] += seconds
+        ordered = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': sql, 'count': count, 'ms': round(seconds * 1000, 3)}
+            for sql, (count, seconds) in ordered[:limit]
+        ]
+
+    def save(self, request, response, trigger, elapsed, profiler, queries, include_sql):
+        stats = ''
+        profile_file = ''
+        if profiler is not None:
+            import pstats
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(40)
+            stats = buffer.getvalue()
+            os.makedirs(self.directory, exist_ok=True)
+            profile_file = os.path.join(
+                self.directory, f"{timezone.now():%Y%m%d-%H%M%S}-{os.getpid()}-{random.getrandbits(32):08x}.prof"
+            )
+            profiler.dump_stats(profile_file)
+
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.path[:500],
+            view=PerformanceMiddleware.view_name(request)[:200],
+            status=response.status_code,
+            trigger=trigger,
+            duration_ms=round(elapsed * 1000, 2),
+            db_queries=len(queries),
+            db_ms=round(sum(seconds for _, seconds in queries) * 1000, 2),
+            stats=stats,
+            sql=self.summarize_sql(queries) if include_sql else [],
+            profile_file=profile_file,
+        )
+        logger.info(f"Saved {trigger} profile {profile.pk} for {request.method} {request.path} "
+                    f"({profile.duration_ms}ms, {profile.db_queries} queries)")
+        self.prune()
+        return profile
+
+    def prune(self):
+        """Keep only the newest PROFILING_KEEP profiles"""
+        stale = list(RequestProfile.objects.order_by('-id').values_list('id', 'profile_file')[self.keep:])
+        if not stale:
+            return
+        RequestProfile.objects.filter(id__in=[profile_id for profile_id, _ in stale]).delete()
+        for _, path in stale:
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves read-only requests from the read replicas. Requests that may
+    write use the primary throughout, and a client that has just written
+    (placed a trade, moved cash) keeps reading from the primary for
+    REPLICA_STICKY_SECONDS, so replication lag never shows it a stale
+    balance. Not loaded when no replicas are configured.
+    """
+    COOKIE = 'db_primary_until'
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', None):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sticky_seconds = settings.REPLICA_STICKY_SECONDS
+
+    def __call__(self, request):
+        use_replica = request.method in self.SAFE_METHODS and not self.sticky(request)
+        scope = db_router.use_replica if use_replica else db_router.use_primary
+        with scope():
+            response = self.get_response(request)
+            wrote = db_router.wrote()
+
+        if response.streaming:
+            # Streamed exports run their queries as the body is consumed
+            response.streaming_content = self.stream(response.streaming_content, scope)
+        if wrote and request.method not in self.SAFE_METHODS:
+            response.set_signed_cookie(
+                self.COOKIE, str(time.time() + self.sticky_seconds), salt=self.COOKIE,
+                max_age=self.sticky_seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def sticky(self, request):
+        until = request.get_signed_cookie(self.COOKIE, default=None, salt=self.COOKIE)
+        try:
+            return until is not None and float(until) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def stream(content, scope):
+        iterator = iter(content)
+        while True:
+            with scope():
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            yield chunk
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+def populate_valuations(apps, schema_editor):
+    Portfolio = apps.get_model('api', 'Portfolio')
+    for portfolio in Portfolio.objects.prefetch_related('positions__stock'):
+        stock_value = sum(
+            position.quantity * position.stock.last_price
+            for position in portfolio.positions.all()
+            if position.stock.last_price
+        )
+        portfolio.cached_stock_value = stock_value
+        portfolio.cached_total_value = portfolio.cash_balance + stock_value
+        portfolio.save(update_fields=['cached_stock_value', 'cached_total_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_transaction_notes_alter_transaction_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolio',
+            name='cached_stock_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='portfolio',
+            name='cached_total_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='portfolio',
+            name='last_repriced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_valuations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:20
+
+from django.db import migrations, models
+import django.db.models.functions.text
+import django.utils.timezone
+
+
+TRIGRAM_INDEXES = {
+    'stock_company_name_trgm_idx': 'company_name',
+    'stock_symbol_trgm_idx': 'symbol',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # StockViewSet's SearchFilter issues UPPER(col) LIKE '%q%', which only a
+    # trigram index can serve; other backends keep the plain indexes.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON api_stock USING gin (UPPER({column}) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_portfolio_valuation_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.functions.text.Upper('company_name'), name='stock_company_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['portfolio', '-timestamp', '-id'], name='txn_portfolio_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['portfolio', 'transaction_type', 'timestamp'], name='txn_portfolio_type_ts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfolio',
+            constraint=models.CheckConstraint(check=models.Q(('cash_balance__gte', 0)), name='portfolio_cash_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='position',
+            constraint=models.CheckConstraint(check=models.Q(('average_buy_price__gte', 0)), name='position_avg_price_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.CheckConstraint(check=models.Q(('last_price__gte', 0)), name='stock_last_price_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='txn_quantity_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.CheckConstraint(check=models.Q(('price__gte', 0)), name='txn_price_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.CheckConstraint(check=models.Q(('transaction_type__in', ['deposit', 'withdraw']), ('stock__isnull', False), _connector='OR'), name='txn_trade_has_stock'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_baseline_checkpoints(apps, schema_editor):
+    """
+    Record each existing portfolio's current state as its first checkpoint.
+    Earlier transactions predate the ledger and are not replayed.
+    """
+    Portfolio = apps.get_model('api', 'Portfolio')
+    PortfolioCheckpoint = apps.get_model('api', 'PortfolioCheckpoint')
+    Transaction = apps.get_model('api', 'Transaction')
+    now = django.utils.timezone.now()
+    for portfolio in Portfolio.objects.prefetch_related('positions'):
+        last_transaction = Transaction.objects.filter(portfolio=portfolio).order_by('-id').first()
+        PortfolioCheckpoint.objects.create(
+            portfolio=portfolio,
+            timestamp=now,
+            last_transaction_id=last_transaction.id if last_transaction else 0,
+            cash_balance=portfolio.cash_balance,
+            positions={
+                str(position.stock_id): [position.quantity, str(position.average_buy_price)]
+                for position in portfolio.positions.all()
+            },
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_hot_path_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('cash_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('positions', models.JSONField(default=dict)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='api.portfolio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['portfolio', '-timestamp'], name='checkpoint_portfolio_ts_idx')],
+            },
+        ),
+        migrations.RunPython(create_baseline_checkpoints, migrations.RunPython.noop),
+    ]
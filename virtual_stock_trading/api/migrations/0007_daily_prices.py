@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_ledger_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('close', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_prices', to='api.stock')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyprice',
+            constraint=models.CheckConstraint(check=models.Q(('close__gte', 0)), name='daily_price_close_non_negative'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyprice',
+            unique_together={('stock', 'date')},
+        ),
+    ]
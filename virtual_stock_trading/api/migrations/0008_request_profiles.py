@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_daily_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('view', models.CharField(max_length=200)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('trigger', models.CharField(choices=[('header', 'Requested by header'), ('sample', 'Sampled'), ('slow', 'Over the latency threshold')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('db_queries', models.PositiveIntegerField(default=0)),
+                ('db_ms', models.FloatField(default=0)),
+                ('stats', models.TextField(blank=True)),
+                ('sql', models.JSONField(blank=True, default=list)),
+                ('profile_file', models.CharField(blank=True, max_length=500)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-duration_ms'], name='request_profile_duration_idx')],
+            },
+        ),
+    ]
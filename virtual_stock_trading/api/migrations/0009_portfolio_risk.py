@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_request_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioRisk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('confidence', models.DecimalField(decimal_places=4, max_digits=5)),
+                ('var_1d', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('cvar_1d', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('var_10d', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('cvar_10d', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('scenarios', models.PositiveIntegerField()),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_reports', to='api.portfolio')),
+            ],
+            options={
+                'unique_together': {('portfolio', 'date')},
+            },
+        ),
+    ]
@@ -1,5 +1,9 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Stock(models.Model):
@@ -8,10 +12,34 @@ class Stock(models.Model):
     last_price = models.DecimalField(max_digits=15, decimal_places=2, null=True)
     last_updated = models.DateTimeField(null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(Upper('company_name'), name='stock_company_name_upper_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=Q(last_price__gte=0), name='stock_last_price_non_negative'),
+        ]
+
     def __str__(self):
         return f"{self.symbol} - {self.company_name}"
 
 
+class DailyPrice(models.Model):
+    """Closing price of a stock on a given day, used to value past portfolios"""
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='daily_prices')
+    date = models.DateField()
+    close = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        unique_together = ('stock', 'date')
+        constraints = [
+            models.CheckConstraint(check=Q(close__gte=0), name='daily_price_close_non_negative'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.symbol} {self.date} (${self.close})"
+
+
 class Portfolio(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolios')
     name = models.CharField(max_length=100)
@@ -20,16 +48,54 @@ class Portfolio(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized valuation, maintained incrementally by ValuationService
+    cached_stock_value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    cached_total_value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    last_repriced_at = models.DateTimeField(null=True, blank=True)
+
+    VALUATION_FIELDS = ('cached_stock_value', 'cached_total_value', 'last_repriced_at')
+    # Written by LedgerService as events are recorded
+    LEDGER_FIELDS = ('cash_balance',)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=Q(cash_balance__gte=0), name='portfolio_cash_non_negative'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.user.username}"
+
+    def save(self, *args, **kwargs):
+        """
+        Save the portfolio without overwriting the valuation columns or the
+        cash balance, which are updated atomically in the database and may be
+        stale in memory. LedgerService writes the cash balance by naming it in
+        update_fields; the cached total is then brought in line with it.
+        """
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding:
+            self.cached_total_value = Decimal(str(self.cash_balance)) + Decimal(str(self.cached_stock_value))
+            super().save(*args, **kwargs)
+            return
+        if update_fields is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.VALUATION_FIELDS + self.LEDGER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if update_fields is not None and 'cash_balance' in update_fields:
+            Portfolio.objects.filter(pk=self.pk).update(
+                cached_total_value=F('cash_balance') + F('cached_stock_value')
+            )
+            self.refresh_from_db(fields=self.VALUATION_FIELDS)
     
     def total_stock_value(self):
-        """Calculate the total value of all stocks in this portfolio"""
-        return sum(position.current_value() for position in self.positions.all())
+        """Return the cached total value of all stocks in this portfolio"""
+        return self.cached_stock_value
     
     def total_value(self):
-        """Calculate the total portfolio value (cash + stocks)"""
-        return self.cash_balance + self.total_stock_value()
+        """Return the cached total portfolio value (cash + stocks)"""
+        return self.cached_total_value
 
 
 class Position(models.Model):
@@ -40,6 +106,9 @@ class Position(models.Model):
 
     class Meta:
         unique_together = ('portfolio', 'stock')
+        constraints = [
+            models.CheckConstraint(check=Q(average_buy_price__gte=0), name='position_avg_price_non_negative'),
+        ]
 
     def __str__(self):
         return f"{self.portfolio.name} - {self.stock.symbol} ({self.quantity})"
@@ -72,11 +141,37 @@ class Transaction(models.Model):
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     notes = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Transaction history: portfolio.transactions.order_by('-timestamp'), id breaks ties
+            models.Index(fields=['portfolio', '-timestamp', '-id'], name='txn_portfolio_ts_idx'),
+            models.Index(fields=['portfolio', 'transaction_type', 'timestamp'], name='txn_portfolio_type_ts_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=Q(quantity__gt=0), name='txn_quantity_positive'),
+            models.CheckConstraint(check=Q(price__gte=0), name='txn_price_non_negative'),
+            models.CheckConstraint(
+                check=Q(transaction_type__in=['deposit', 'withdraw']) | Q(stock__isnull=False),
+                name='txn_trade_has_stock',
+            ),
+        ]
     
     def __str__(self):
+        if self.stock_id is None:
+            return f"{self.transaction_type} {self.price}"
         return f"{self.transaction_type} {self.quantity} {self.stock.symbol} @ {self.price}"
+
+    def save(self, *args, **kwargs):
+        """Transactions form an append-only ledger: entries are never changed"""
+        if not self._state.adding:
+            raise ValueError("Transactions are append-only and cannot be modified")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Transactions are append-only and cannot be deleted")
     
     @property
     def total_amount(self):
@@ -84,6 +179,27 @@ class Transaction(models.Model):
         return self.price * self.quantity
 
 
+class PortfolioCheckpoint(models.Model):
+    """
+    Portfolio state after every ledger transaction up to last_transaction_id,
+    so point-in-time state is rebuilt without replaying the whole history.
+    positions maps stock id -> [quantity, average buy price].
+    """
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='checkpoints')
+    timestamp = models.DateTimeField(default=timezone.now)
+    last_transaction_id = models.BigIntegerField(default=0)
+    cash_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    positions = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['portfolio', '-timestamp'], name='checkpoint_portfolio_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio.name} @ {self.timestamp:%Y-%m-%d %H:%M} (#{self.last_transaction_id})"
+
+
 class PortfolioSnapshot(models.Model):
     portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='snapshots')
     date = models.DateField()
@@ -94,3 +210,63 @@ class PortfolioSnapshot(models.Model):
     
     def __str__(self):
         return f"{self.portfolio.name} - {self.date} (${self.total_value})"
+
+
+class PortfolioRisk(models.Model):
+    """
+    Monte Carlo value at risk of a portfolio's positions on a given day:
+    the loss not exceeded with the given confidence (VaR) and the average
+    loss beyond it (CVaR), over 1 and 10 trading days.
+    """
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='risk_reports')
+    date = models.DateField()
+    total_value = models.DecimalField(max_digits=15, decimal_places=2)
+    confidence = models.DecimalField(max_digits=5, decimal_places=4)
+    var_1d = models.DecimalField(max_digits=15, decimal_places=2)
+    cvar_1d = models.DecimalField(max_digits=15, decimal_places=2)
+    var_10d = models.DecimalField(max_digits=15, decimal_places=2)
+    cvar_10d = models.DecimalField(max_digits=15, decimal_places=2)
+    scenarios = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('portfolio', 'date')
+
+    def __str__(self):
+        return f"{self.portfolio.name} - {self.date} (1-day VaR ${self.var_1d})"
+
+
+class RequestProfile(models.Model):
+    """
+    A profiled request captured by ProfilingMiddleware: timings, the top of
+    its cProfile stats and, for slow requests, the SQL it ran. The raw
+    profile is kept on disk in settings.PROFILING_DIR.
+    """
+    HEADER = 'header'
+    SAMPLE = 'sample'
+    SLOW = 'slow'
+    TRIGGER_CHOICES = [
+        (HEADER, 'Requested by header'),
+        (SAMPLE, 'Sampled'),
+        (SLOW, 'Over the latency threshold'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200)
+    status = models.PositiveSmallIntegerField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    db_queries = models.PositiveIntegerField(default=0)
+    db_ms = models.FloatField(default=0)
+    stats = models.TextField(blank=True)
+    sql = models.JSONField(default=list, blank=True)
+    profile_file = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-duration_ms'], name='request_profile_duration_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms)"
@@ -0,0 +1,106 @@
+import base64
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (ordering field, id).
+
+    Each page is fetched with a range condition on the last row seen rather
+    than an OFFSET, so deep pages cost the same as the first one and rows
+    sharing a timestamp are never skipped or repeated.
+    """
+    ordering = ('-timestamp', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, page_size))
+        except (TypeError, ValueError):
+            pass
+        return max(1, min(page_size, max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        key_field = self.ordering[0].lstrip('-')
+        descending = self.ordering[0].startswith('-')
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model._meta.get_field(key_field))
+        if position is not None:
+            value, pk = position
+            lookup = 'lt' if descending else 'gt'
+            # The inclusive bound lets the database use a plain index range scan
+            queryset = queryset.filter(**{f'{key_field}__{lookup}e': value}).filter(
+                Q(**{f'{key_field}__{lookup}': value}) | Q(**{key_field: value, f'pk__{lookup}': pk})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            last = results[-1]
+            # Rows are model instances, or dicts from the fast read-only serializers
+            if isinstance(last, dict):
+                self.next_position = (last[key_field], last['id'])
+            else:
+                self.next_position = (getattr(last, key_field), last.pk)
+        return results
+
+    def decode_cursor(self, request, key_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            return key_field.to_python(value), int(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        value, pk = position
+        payload = json.dumps([value.isoformat(), pk]).encode('ascii')
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TransactionPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class SnapshotPagination(KeysetPagination):
+    ordering = ('-date', '-id')
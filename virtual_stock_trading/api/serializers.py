@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import Stock, Portfolio, Position, Transaction, PortfolioSnapshot
 
 class UserSerializer(serializers.ModelSerializer):
@@ -62,10 +63,28 @@ class PortfolioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Portfolio
         fields = ['id', 'name', 'description', 'cash_balance', 
-                  'created_at', 'updated_at', 'total_value']
+                  'created_at', 'updated_at', 'total_value', 'last_repriced_at']
+        read_only_fields = ['last_repriced_at']
     
     def get_total_value(self, obj):
         return obj.total_value()
+    
+    def validate_cash_balance(self, value):
+        if self.instance is None:
+            # The opening balance is recorded as a deposit
+            if value < 0:
+                raise serializers.ValidationError("The opening balance cannot be negative.")
+            return value
+        # Cash only changes through ledger entries (deposits, withdrawals, trades)
+        if value != self.instance.cash_balance:
+            raise serializers.ValidationError(
+                "Cash can't be edited directly; use /portfolios/<id>/adjust-cash/ to deposit or withdraw."
+            )
+        return value
+    
+    def update(self, instance, validated_data):
+        validated_data.pop('cash_balance', None)
+        return super().update(instance, validated_data)
 
 class PortfolioDetailSerializer(PortfolioSerializer):
     positions = PositionSerializer(many=True, read_only=True)
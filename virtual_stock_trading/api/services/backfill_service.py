@@ -0,0 +1,226 @@
+import logging
+import time
+from decimal import Decimal
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from ..models import Portfolio, PortfolioCheckpoint, PortfolioSnapshot, Transaction
+from .price_history_service import PriceHistoryService
+
+logger = logging.getLogger(__name__)
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+class SnapshotBackfillService:
+    """
+    Rebuilds daily portfolio values from the transaction ledger and stored
+    daily closes, and inserts the snapshots that are missing.
+
+    Cash and share counts are additive over ledger events, so the holdings
+    on day d are the holdings before the first recorded event plus the net
+    change of every event up to d. Portfolios are processed in batches:
+    per-day net changes are aggregated in the database, turned into
+    (portfolio, stock) x day share matrices with a cumulative sum, and
+    multiplied by the matching day x stock price matrix.
+    """
+    BATCH_SIZE = 200
+    INSERT_BATCH_SIZE = 5000
+
+    @classmethod
+    def backfill(cls, start, end, portfolio_ids=None, batch_size=None, overwrite=False):
+        """
+        Compute daily values for start..end (inclusive) and write snapshots
+        for days that have none. With overwrite=True existing snapshots in
+        the range are replaced as well.
+
+        Returns a summary dict.
+        """
+        import pandas as pd
+
+        started = time.perf_counter()
+        batch_size = batch_size or cls.BATCH_SIZE
+        days = pd.date_range(start, end, freq='D')
+        if not len(days):
+            raise ValueError("The end date must not be before the start date")
+
+        portfolios = Portfolio.objects.order_by('id')
+        if portfolio_ids:
+            portfolios = portfolios.filter(id__in=portfolio_ids)
+        ids = list(portfolios.values_list('id', flat=True))
+
+        stock_ids = set(
+            Transaction.objects.filter(portfolio_id__in=ids, stock__isnull=False)
+            .values_list('stock_id', flat=True).distinct()
+        )
+        for positions in PortfolioCheckpoint.objects.filter(portfolio_id__in=ids).values_list('positions', flat=True):
+            stock_ids.update(int(stock_id) for stock_id in positions)
+        stock_ids = sorted(stock_ids)
+        prices = PriceHistoryService.price_matrix(days, stock_ids) if stock_ids else None
+        stock_rows = {stock_id: row for row, stock_id in enumerate(stock_ids)}
+
+        written = 0
+        unpriced = 0
+        for offset in range(0, len(ids), batch_size):
+            batch = ids[offset:offset + batch_size]
+            totals, first_days, batch_unpriced = cls._values(batch, days, prices, stock_rows)
+            unpriced += batch_unpriced
+            written += cls._write(batch, days, totals, first_days, overwrite)
+
+        summary = {
+            'portfolios': len(ids),
+            'days': len(days),
+            'snapshots': written,
+            'unpriced_position_days': unpriced,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        if unpriced:
+            logger.warning(f"Backfill valued {unpriced} position-days at zero for lack of a price")
+        logger.info(f"Backfilled {written} snapshots for {len(ids)} portfolios "
+                    f"from {days[0].date()} to {days[-1].date()} in {summary['seconds']}s")
+        return summary
+
+    @classmethod
+    def _net_changes(cls, queryset):
+        """Annotate a grouped transaction queryset with net cash and share changes"""
+        amount = F('price') * F('quantity')
+        return queryset.annotate(
+            cash=Sum(Case(
+                When(transaction_type__in=[Transaction.SELL, Transaction.DEPOSIT], then=amount),
+                default=-amount,
+                output_field=MONEY,
+            )),
+            shares=Sum(Case(
+                When(transaction_type=Transaction.BUY, then=F('quantity')),
+                When(transaction_type=Transaction.SELL, then=-F('quantity')),
+                default=Value(0),
+                output_field=IntegerField(),
+            )),
+        )
+
+    @classmethod
+    def _opening_state(cls, batch):
+        """
+        Return ({portfolio_id: cash}, {(portfolio_id, stock_id): shares})
+        held before each portfolio's first recorded event: its earliest
+        checkpoint minus the events that checkpoint covers.
+        """
+        cash = {}
+        shares = {}
+        for checkpoint in PortfolioCheckpoint.objects.filter(portfolio_id__in=batch).order_by('portfolio_id', 'timestamp', 'id'):
+            if checkpoint.portfolio_id in cash:
+                continue
+            cash[checkpoint.portfolio_id] = float(checkpoint.cash_balance)
+            for stock_id, (quantity, _) in checkpoint.positions.items():
+                shares[(checkpoint.portfolio_id, int(stock_id))] = quantity
+
+        anchor = PortfolioCheckpoint.objects.filter(portfolio=OuterRef('portfolio')) \
+            .order_by('timestamp', 'id').values('last_transaction_id')[:1]
+        covered = cls._net_changes(
+            Transaction.objects.filter(portfolio_id__in=batch)
+            .annotate(anchor_id=Subquery(anchor))
+            .filter(id__lte=F('anchor_id'))
+            .values('portfolio_id', 'stock_id')
+        ).values_list('portfolio_id', 'stock_id', 'cash', 'shares')
+        for portfolio_id, stock_id, net_cash, net_shares in covered:
+            cash[portfolio_id] = cash.get(portfolio_id, 0.0) - float(net_cash or 0)
+            if stock_id is not None:
+                shares[(portfolio_id, stock_id)] = shares.get((portfolio_id, stock_id), 0) - net_shares
+        return cash, shares
+
+    @classmethod
+    def _values(cls, batch, days, prices, stock_rows):
+        """
+        Return (portfolios x days values, index of each portfolio's first
+        day, number of unpriced position-days) for a batch of portfolio ids.
+        """
+        import numpy as np
+        import pandas as pd
+
+        n_days = len(days)
+        portfolio_rows = {portfolio_id: row for row, portfolio_id in enumerate(batch)}
+        changes = pd.DataFrame.from_records(
+            cls._net_changes(
+                Transaction.objects.filter(portfolio_id__in=batch)
+                .annotate(day=TruncDate('timestamp'))
+                .values('portfolio_id', 'stock_id', 'day')
+            ).values_list('portfolio_id', 'stock_id', 'day', 'cash', 'shares'),
+            columns=['portfolio_id', 'stock_id', 'day', 'cash', 'shares'],
+        )
+        # Column j receives every change dated on or before days[j]; n_days means after the range
+        changes['column'] = np.searchsorted(days.to_numpy(), pd.to_datetime(changes['day']).to_numpy())
+        changes['row'] = changes['portfolio_id'].map(portfolio_rows)
+        opening_cash, opening_shares = cls._opening_state(batch)
+
+        # Cash: opening balance plus the running sum of daily net changes
+        cash = np.zeros((len(batch), n_days + 1))
+        np.add.at(cash, (changes['row'].to_numpy(dtype='int64'), changes['column'].to_numpy(dtype='int64')),
+                  changes['cash'].astype(float).to_numpy())
+        cash = cash[:, :n_days].cumsum(axis=1)
+        cash += np.array([opening_cash.get(portfolio_id, 0.0) for portfolio_id in batch])[:, None]
+
+        # Shares: one row per (portfolio, stock) pair, sorted by portfolio
+        trades = changes[changes['stock_id'].notna()].astype({'stock_id': 'int64'})
+        pairs = pd.concat([
+            trades[['portfolio_id', 'stock_id']],
+            pd.DataFrame(list(opening_shares), columns=['portfolio_id', 'stock_id']),
+        ]).drop_duplicates().sort_values(['portfolio_id', 'stock_id'])
+        pair_index = pd.MultiIndex.from_frame(pairs)
+        stock_value = np.zeros((len(batch), n_days))
+        unpriced = 0
+        if len(pair_index):
+            shares = np.zeros((len(pair_index), n_days + 1))
+            np.add.at(shares, (pair_index.get_indexer(pd.MultiIndex.from_frame(trades[['portfolio_id', 'stock_id']])),
+                               trades['column'].to_numpy(dtype='int64')), trades['shares'].to_numpy(dtype=float))
+            shares = shares[:, :n_days].cumsum(axis=1)
+            shares += np.array([opening_shares.get(pair, 0) for pair in pair_index], dtype=float)[:, None]
+
+            pair_prices = prices[[stock_rows[stock_id] for stock_id in pairs['stock_id']]]
+            held = shares != 0
+            unpriced = int((held & np.isnan(pair_prices)).sum())
+            values = np.where(held, shares * np.nan_to_num(pair_prices), 0.0)
+
+            # Pairs are sorted by portfolio, so each portfolio is a contiguous block of rows
+            pair_rows = pairs['portfolio_id'].map(portfolio_rows).to_numpy()
+            starts = np.flatnonzero(np.r_[True, pair_rows[1:] != pair_rows[:-1]])
+            stock_value[pair_rows[starts]] = np.add.reduceat(values, starts, axis=0)
+
+        # A portfolio is valued from its creation or its first recorded event, whichever is earlier
+        created = dict(Portfolio.objects.filter(id__in=batch).values_list('id', 'created_at'))
+        first_days = np.searchsorted(
+            days.to_numpy(),
+            np.array([timezone.localdate(created[portfolio_id]) for portfolio_id in batch], dtype='datetime64[ns]'),
+        )
+        if len(changes):
+            first_event = changes.groupby('row')['column'].min()
+            rows = first_event.index.to_numpy()
+            first_days[rows] = np.minimum(first_days[rows], first_event.to_numpy())
+
+        return np.round(cash + stock_value, 2), first_days, unpriced
+
+    @classmethod
+    def _write(cls, batch, days, totals, first_days, overwrite):
+        """Insert snapshots for the batch, skipping days that already have one unless overwriting"""
+        dates = [day.date() for day in days]
+        existing = set()
+        if not overwrite:
+            existing = set(
+                PortfolioSnapshot.objects.filter(portfolio_id__in=batch, date__range=(dates[0], dates[-1]))
+                .values_list('portfolio_id', 'date')
+            )
+
+        snapshots = [
+            PortfolioSnapshot(portfolio_id=portfolio_id, date=dates[column],
+                              total_value=Decimal(f"{totals[row, column]:.2f}"))
+            for row, portfolio_id in enumerate(batch)
+            for column in range(first_days[row], len(dates))
+            if (portfolio_id, dates[column]) not in existing
+        ]
+        if overwrite:
+            PortfolioSnapshot.objects.bulk_create(
+                snapshots, batch_size=cls.INSERT_BATCH_SIZE, update_conflicts=True,
+                unique_fields=['portfolio', 'date'], update_fields=['total_value'],
+            )
+        else:
+            PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=cls.INSERT_BATCH_SIZE, ignore_conflicts=True)
+        return len(snapshots)
@@ -0,0 +1,381 @@
+import logging
+import math
+from decimal import Decimal
+from ..models import PortfolioSnapshot, Stock
+from .price_history_service import PriceHistoryService
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal('0.01')
+
+
+class PriceHistory:
+    """
+    Daily prices of a set of symbols: `close` is a (days x symbols) float
+    array with NaN where a price is unknown. `open` and `volume`, when
+    given, have the same shape; fills then happen at the open and slippage
+    can depend on the order's share of the day's volume.
+    """
+
+    def __init__(self, dates, symbols, close, open=None, volume=None):
+        import numpy as np
+
+        self.dates = list(dates)
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.close = np.asarray(close, dtype=float)
+        self.open = None if open is None else np.asarray(open, dtype=float)
+        self.volume = None if volume is None else np.asarray(volume, dtype=float)
+        shape = (len(self.dates), len(self.symbols))
+        for name in ('close', 'open', 'volume'):
+            values = getattr(self, name)
+            if values is not None and values.shape != shape:
+                raise ValueError(f"{name} has shape {values.shape}, expected {shape}")
+
+    @classmethod
+    def from_database(cls, symbols, start, end):
+        """
+        Stored daily closes, with the last known price carried forward, for
+        every calendar day from start to end.
+
+        Raises:
+            ValueError: For unknown symbols, symbols with no prices in the
+                range, or an empty range.
+        """
+        import pandas as pd
+
+        symbols = [symbol.upper() for symbol in symbols]
+        days = pd.date_range(start, end, freq='D')
+        if not len(days):
+            raise ValueError("The end date must not be before the start date")
+        stock_ids = dict(Stock.objects.filter(symbol__in=symbols).values_list('symbol', 'id'))
+        unknown = [symbol for symbol in symbols if symbol not in stock_ids]
+        if unknown:
+            raise ValueError(f"Unknown symbols: {', '.join(unknown)}")
+
+        close = PriceHistoryService.price_matrix(days, [stock_ids[symbol] for symbol in symbols]).T
+        unpriced = [symbol for column, symbol in enumerate(symbols) if pd.isna(close[:, column]).all()]
+        if unpriced:
+            raise ValueError(f"No price history between {start} and {end} for: {', '.join(unpriced)}")
+        return cls([day.date() for day in days], symbols, close)
+
+    def periods_per_year(self):
+        if len(self.dates) < 2:
+            return 365.25
+        return 365.25 * (len(self.dates) - 1) / max((self.dates[-1] - self.dates[0]).days, 1)
+
+
+# Strategies. A strategy is a callable taking a PriceHistory and returning
+# a (days x symbols) array of target portfolio weights, decided on each
+# day's close and traded on the next day. Weights of unpriced symbols are
+# ignored; rows should sum to at most 1 (no leverage or shorting).
+
+def _rolling_mean(values, window):
+    """Trailing mean over `window` rows, NaN until `window` prices are known"""
+    import numpy as np
+
+    known = ~np.isnan(values)
+    sums = np.cumsum(np.where(known, values, 0.0), axis=0)
+    counts = np.cumsum(known, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums / window, np.nan)
+
+
+def _equal_weights(selected):
+    """Equal weights across the selected symbols of each day"""
+    import numpy as np
+
+    selected = selected.astype(float)
+    counts = selected.sum(axis=1, keepdims=True)
+    return np.divide(selected, counts, out=np.zeros_like(selected), where=counts > 0)
+
+
+def buy_and_hold():
+    """Equal weights in every priced symbol, from the first day"""
+    import numpy as np
+
+    def strategy(history):
+        return _equal_weights(~np.isnan(history.close))
+    return strategy
+
+
+def sma_crossover(fast=20, slow=50):
+    """Hold, in equal weights, the symbols whose fast moving average is above the slow one"""
+    if not 0 < fast < slow:
+        raise ValueError("fast must be positive and shorter than slow")
+
+    def strategy(history):
+        return _equal_weights(_rolling_mean(history.close, fast) > _rolling_mean(history.close, slow))
+    return strategy
+
+
+def momentum(lookback=90, top=10, rebalance=30):
+    """Every `rebalance` days, hold the `top` symbols with the best return over `lookback` days"""
+    import numpy as np
+
+    if lookback < 1 or top < 1 or rebalance < 1:
+        raise ValueError("lookback, top and rebalance must be positive")
+
+    def strategy(history):
+        close = history.close
+        returns = np.full(close.shape, -np.inf)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns[lookback:] = close[lookback:] / close[:-lookback] - 1
+        returns[np.isnan(returns)] = -np.inf
+        ranks = np.argsort(np.argsort(-returns, axis=1, kind='stable'), axis=1, kind='stable')
+        selected = (ranks < top) & np.isfinite(returns)
+        # Keep each rebalance day's selection until the next one
+        rebalance_days = np.arange(len(close)) // rebalance * rebalance
+        return _equal_weights(selected[rebalance_days])
+    return strategy
+
+
+STRATEGIES = {
+    'buy_and_hold': buy_and_hold,
+    'sma_crossover': sma_crossover,
+    'momentum': momentum,
+}
+
+
+class Commission:
+    """Commission per order: `per_share` plus `rate` of the notional, at least `minimum`"""
+
+    def __init__(self, per_share=0.0, rate=0.0, minimum=0.0):
+        self.per_share = per_share
+        self.rate = rate
+        self.minimum = minimum
+
+    def __call__(self, shares, notional):
+        import numpy as np
+
+        fees = np.maximum(self.per_share * np.abs(shares) + self.rate * np.abs(notional), self.minimum)
+        return np.where(shares != 0, fees, 0.0)
+
+
+class Slippage:
+    """
+    Fraction of the price an order pays (buys) or gives up (sells): `bps`
+    basis points, plus `impact` times the order's share of the day's
+    volume when volumes are known.
+    """
+
+    def __init__(self, bps=5.0, impact=0.0):
+        self.bps = bps
+        self.impact = impact
+
+    def __call__(self, shares, volume=None):
+        import numpy as np
+
+        fraction = np.full(shares.shape, self.bps / 10000)
+        if volume is not None and self.impact:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                participation = np.where(volume > 0, np.abs(shares) / volume, 0.0)
+            fraction += self.impact * np.nan_to_num(participation)
+        return fraction
+
+
+class BacktestResult:
+    """Equity curve, trading costs and statistics of a backtest"""
+
+    def __init__(self, history, equity, cash, holdings, trades, commission, slippage, turnover, rebalances):
+        self.history = history
+        self.equity = equity
+        self.cash = cash
+        self.holdings = holdings
+        self.trades = trades
+        self.commission = commission
+        self.slippage = slippage
+        self.turnover = turnover
+        self.rebalances = rebalances
+
+    def stats(self):
+        import numpy as np
+
+        equity = self.equity
+        periods = self.history.periods_per_year()
+        returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+        years = (len(equity) - 1) / periods
+        total_return = equity[-1] / equity[0] - 1
+        volatility = float(returns.std() * math.sqrt(periods)) if len(returns) else 0.0
+        drawdowns = equity / np.maximum.accumulate(equity) - 1
+        return {
+            'start_value': round(float(equity[0]), 2),
+            'end_value': round(float(equity[-1]), 2),
+            'total_return': round(float(total_return), 6),
+            'annual_return': round(float((1 + total_return) ** (1 / years) - 1), 6) if years > 0 else 0.0,
+            'volatility': round(volatility, 6),
+            'sharpe': round(float(returns.mean() * periods / volatility), 4) if volatility else 0.0,
+            'max_drawdown': round(float(drawdowns.min()), 6),
+            'trades': self.trades,
+            'rebalances': self.rebalances,
+            'commission': round(self.commission, 2),
+            'slippage': round(self.slippage, 2),
+            'turnover': round(self.turnover, 2),
+        }
+
+    def equity_curve(self):
+        """[{'date', 'total_value'}] in the shape of PortfolioSnapshot"""
+        return [
+            {'date': day, 'total_value': Decimal(f"{value:.2f}").quantize(CENTS)}
+            for day, value in zip(self.history.dates, self.equity.tolist())
+        ]
+
+    def snapshots(self, portfolio):
+        """Unsaved PortfolioSnapshots of the equity curve for a portfolio"""
+        return [PortfolioSnapshot(portfolio=portfolio, **point) for point in self.equity_curve()]
+
+    def positions(self):
+        """{symbol: shares} held at the end"""
+        return {
+            symbol: int(shares) for symbol, shares in zip(self.history.symbols, self.holdings.tolist()) if shares
+        }
+
+
+class Backtester:
+    """
+    Runs a strategy over a PriceHistory with a simulated cash account.
+
+    Signals and target weights are computed for all days and symbols at
+    once by the strategy. Orders are only generated on days the target
+    weights change: on those days the portfolio is rebalanced to whole
+    shares of the targets at the day's open (or close without opens),
+    selling first and scaling buys down to the cash available. Between
+    rebalances holdings are constant, so the equity curve is computed
+    for all days at once from the holdings and prices.
+    """
+
+    def __init__(self, initial_cash=100000.0, commission=None, slippage=None):
+        self.initial_cash = float(initial_cash)
+        self.commission = commission or Commission()
+        self.slippage = slippage or Slippage()
+
+    def run(self, history, strategy):
+        import numpy as np
+
+        close = history.close
+        days, symbols = close.shape
+        if not days:
+            raise ValueError("The price history is empty")
+        fill_prices = history.open if history.open is not None else close
+        priced = ~np.isnan(fill_prices)
+
+        weights = np.nan_to_num(np.asarray(strategy(history), dtype=float))
+        if weights.shape != close.shape:
+            raise ValueError(f"The strategy returned weights of shape {weights.shape}, expected {close.shape}")
+        if (weights < 0).any() or (weights.sum(axis=1) > 1 + 1e-9).any():
+            raise ValueError("Weights must be non-negative and sum to at most 1 on each day")
+
+        # Weights decided on a day's close are traded on the next day
+        targets = np.zeros_like(weights)
+        targets[1:] = weights[:-1]
+        targets[~priced] = 0.0
+        changed = np.flatnonzero(np.any(np.diff(targets, axis=0, prepend=0.0) != 0, axis=1))
+
+        holdings = np.zeros(symbols)
+        cash = self.initial_cash
+        holding_changes = np.zeros((len(changed), symbols))
+        cash_after = np.empty(len(changed))
+        trades = 0
+        commission_paid = slippage_paid = turnover = 0.0
+
+        for event, day in enumerate(changed):
+            prices = np.where(priced[day], fill_prices[day], 0.0)
+            equity = cash + holdings @ prices
+            with np.errstate(invalid='ignore', divide='ignore'):
+                wanted = np.where(prices > 0, np.floor(targets[day] * equity / prices), holdings)
+            orders = wanted - holdings
+            volume = history.volume[day] if history.volume is not None else None
+
+            sells = np.minimum(orders, 0.0)
+            sell_prices = prices * (1 - self.slippage(sells, volume))
+            sell_fees = self.commission(sells, sells * sell_prices).sum()
+            available = cash - sells @ sell_prices - sell_fees
+
+            buys = np.maximum(orders, 0.0)
+            buy_prices = prices * (1 + self.slippage(buys, volume))
+            buy_fees = self.commission(buys, buys * buy_prices).sum()
+            cost = buys @ buy_prices + buy_fees
+            if cost > available and cost > 0:
+                buys = np.floor(buys * max(available, 0.0) / cost)
+                buy_prices = prices * (1 + self.slippage(buys, volume))
+                buy_fees = self.commission(buys, buys * buy_prices).sum()
+                cost = buys @ buy_prices + buy_fees
+
+            orders = sells + buys
+            holdings = holdings + orders
+            cash = available - cost
+            holding_changes[event] = orders
+            cash_after[event] = cash
+            trades += int(np.count_nonzero(orders))
+            commission_paid += float(sell_fees + buy_fees)
+            slippage_paid += float(-sells @ (prices - sell_prices) + buys @ (buy_prices - prices))
+            turnover += float(np.abs(orders) @ prices)
+
+        # Holdings and cash of every day are those after its latest rebalance
+        latest = np.searchsorted(changed, np.arange(days), side='right') - 1
+        held = np.vstack([np.zeros(symbols), np.cumsum(holding_changes, axis=0)])[latest + 1]
+        cash_by_day = np.concatenate([[self.initial_cash], cash_after])[latest + 1]
+        valuation_prices = np.nan_to_num(close)
+        equity = cash_by_day + np.einsum('ij,ij->i', held, valuation_prices)
+
+        return BacktestResult(
+            history, equity, cash, holdings, trades, commission_paid, slippage_paid, turnover, len(changed),
+        )
+
+
+class BacktestService:
+    """
+    Backtests the built-in strategies over stored price history, for
+    trying a strategy on a portfolio's cash before trading it.
+    """
+    MAX_SYMBOLS = 500
+    MAX_DAYS = 20 * 366
+
+    @classmethod
+    def strategy(cls, name, params=None):
+        """
+        Build a built-in strategy from its name and parameters.
+
+        Raises:
+            ValueError: For an unknown strategy or invalid parameters.
+        """
+        if name not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {name}. Choose from {', '.join(sorted(STRATEGIES))}")
+        try:
+            return STRATEGIES[name](**(params or {}))
+        except TypeError as e:
+            raise ValueError(f"Invalid parameters for {name}: {e}")
+
+    @classmethod
+    def run(cls, symbols, start, end, strategy, params=None, initial_cash=100000.0,
+            commission=None, slippage=None):
+        """
+        Backtest a built-in strategy over the stored closes of the symbols
+        between start and end. Returns a BacktestResult.
+
+        Raises:
+            ValueError: For invalid symbols, dates, strategy or parameters.
+        """
+        if not symbols:
+            raise ValueError("At least one symbol is required")
+        if not all(isinstance(symbol, str) for symbol in symbols):
+            raise ValueError("Symbols must be strings")
+        if len(symbols) > cls.MAX_SYMBOLS:
+            raise ValueError(f"At most {cls.MAX_SYMBOLS} symbols can be backtested at once")
+        if (end - start).days > cls.MAX_DAYS:
+            raise ValueError(f"At most {cls.MAX_DAYS} days can be backtested at once")
+        if not math.isfinite(initial_cash) or initial_cash <= 0:
+            raise ValueError("The initial cash must be a positive number")
+        costs = [vars(model).values() for model in (commission, slippage) if model is not None]
+        if not all(math.isfinite(value) for values in costs for value in values):
+            raise ValueError("Commission and slippage must be finite numbers")
+
+        strategy = cls.strategy(strategy, params)
+        history = PriceHistory.from_database(symbols, start, end)
+        result = Backtester(initial_cash, commission, slippage).run(history, strategy)
+        logger.info(
+            f"Backtested {len(history.symbols)} symbols over {len(history.dates)} days: "
+            f"{result.rebalances} rebalances, {result.trades} trades"
+        )
+        return result
@@ -0,0 +1,127 @@
+import csv
+import zlib
+from datetime import datetime, time
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from ..models import PortfolioSnapshot, Transaction
+
+
+class _LineBuffer:
+    """File-like object that hands back what csv.writer writes to it"""
+    def write(self, value):
+        return value
+
+
+class ExportService:
+    """
+    Streams transaction and snapshot histories as CSV or NDJSON.
+    Rows are read with values_list() and a server-side iterator, so memory
+    use stays flat however long the history is.
+    """
+    FORMATS = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+    CHUNK_SIZE = 2000
+
+    TRANSACTION_FIELDS = ('id', 'timestamp', 'transaction_type', 'stock__symbol', 'quantity', 'price', 'notes')
+    TRANSACTION_COLUMNS = ('id', 'timestamp', 'transaction_type', 'symbol', 'quantity', 'price', 'notes')
+    SNAPSHOT_FIELDS = ('date', 'total_value')
+    SNAPSHOT_COLUMNS = ('date', 'total_value')
+
+    @classmethod
+    def parse_bound(cls, value, end=False):
+        """
+        Parse a date or datetime query parameter into an aware datetime.
+        A bare date used as an end bound covers the whole day.
+        Raises ValueError for malformed values.
+        """
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"Invalid date: {value}")
+            parsed = datetime.combine(day, time.max if end else time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    @classmethod
+    def transaction_rows(cls, portfolio, start=None, end=None):
+        queryset = Transaction.objects.filter(portfolio=portfolio)
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end:
+            queryset = queryset.filter(timestamp__lte=end)
+        return queryset.order_by('timestamp', 'id').values_list(
+            *cls.TRANSACTION_FIELDS
+        ).iterator(chunk_size=cls.CHUNK_SIZE)
+
+    @classmethod
+    def snapshot_rows(cls, portfolio, start=None, end=None):
+        queryset = PortfolioSnapshot.objects.filter(portfolio=portfolio)
+        if start:
+            queryset = queryset.filter(date__gte=start.date())
+        if end:
+            queryset = queryset.filter(date__lte=end.date())
+        return queryset.order_by('date').values_list(
+            *cls.SNAPSHOT_FIELDS
+        ).iterator(chunk_size=cls.CHUNK_SIZE)
+
+    @classmethod
+    def export(cls, portfolio, kind, output='csv', start=None, end=None, compress=False):
+        """
+        Return (chunks, filename) for a 'transactions' or 'snapshots' export.
+        """
+        if kind == 'transactions':
+            columns = cls.TRANSACTION_COLUMNS
+            rows = cls.transaction_rows(portfolio, start, end)
+        else:
+            columns = cls.SNAPSHOT_COLUMNS
+            rows = cls.snapshot_rows(portfolio, start, end)
+
+        chunks = cls.encode(columns, rows, output)
+        filename = f"portfolio-{portfolio.id}-{kind}.{output}"
+        if compress:
+            chunks = cls.gzip(chunks)
+            filename += '.gz'
+        return chunks, filename
+
+    @classmethod
+    def encode(cls, columns, rows, output='csv'):
+        """Yield the rows encoded as CSV or NDJSON, in chunks of CHUNK_SIZE rows"""
+        if output == 'csv':
+            writer = csv.writer(_LineBuffer())
+            yield writer.writerow(columns).encode('utf-8')
+
+            def encode_row(row):
+                return writer.writerow([
+                    value.isoformat() if hasattr(value, 'isoformat') else value for value in row
+                ])
+        else:
+            encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+            def encode_row(row):
+                return encoder.encode(dict(zip(columns, row))) + '\n'
+
+        lines = []
+        for row in rows:
+            lines.append(encode_row(row))
+            if len(lines) >= cls.CHUNK_SIZE:
+                yield ''.join(lines).encode('utf-8')
+                lines = []
+        if lines:
+            yield ''.join(lines).encode('utf-8')
+
+    @classmethod
+    def gzip(cls, chunks):
+        """Compress a stream of byte chunks into a gzip stream"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
@@ -0,0 +1,231 @@
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from ..models import Position
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryHoldingsBackend:
+    """
+    In-process index. Each worker process holds its own copy, built from
+    Position on first use, so it is only authoritative for single-process
+    deployments; use the Redis backend when several workers trade.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._holders = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.rebuild()
+
+    def adjust(self, symbol, portfolio_id, quantity_delta):
+        if not self._loaded:
+            # A fresh build already reflects the position being adjusted
+            self.rebuild()
+            return
+        with self._lock:
+            holders = self._holders[symbol]
+            quantity = holders.get(portfolio_id, 0) + quantity_delta
+            if quantity > 0:
+                holders[portfolio_id] = quantity
+            else:
+                holders.pop(portfolio_id, None)
+                if not holders:
+                    del self._holders[symbol]
+
+    def set_quantity(self, symbol, portfolio_id, quantity):
+        self._ensure_loaded()
+        with self._lock:
+            if quantity > 0:
+                self._holders[symbol][portfolio_id] = quantity
+            elif symbol in self._holders:
+                self._holders[symbol].pop(portfolio_id, None)
+                if not self._holders[symbol]:
+                    del self._holders[symbol]
+
+    def holders(self, symbol):
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._holders.get(symbol, {}))
+
+    def load(self, rows):
+        holders = defaultdict(dict)
+        for symbol, portfolio_id, quantity in rows:
+            if quantity > 0:
+                holders[symbol][portfolio_id] = quantity
+        with self._lock:
+            self._holders = holders
+            self._loaded = True
+        return sum(len(entries) for entries in holders.values())
+
+    def rebuild(self):
+        return self.load(HoldingsIndex.position_rows())
+
+    def memory_bytes(self):
+        with self._lock:
+            total = sys.getsizeof(self._holders)
+            for symbol, entries in self._holders.items():
+                total += sys.getsizeof(symbol) + sys.getsizeof(entries)
+                total += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in entries.items())
+            return total
+
+    def symbol_count(self):
+        with self._lock:
+            return len(self._holders)
+
+
+class RedisHoldingsBackend:
+    """Shared index stored as one Redis hash per symbol (portfolio id -> quantity)"""
+    name = 'redis'
+    KEY_PREFIX = 'holdings:'
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, symbol):
+        return f"{self.KEY_PREFIX}{symbol}"
+
+    def adjust(self, symbol, portfolio_id, quantity_delta):
+        key = self._key(symbol)
+        quantity = self._redis.hincrby(key, portfolio_id, quantity_delta)
+        if quantity <= 0:
+            self._redis.hdel(key, portfolio_id)
+
+    def set_quantity(self, symbol, portfolio_id, quantity):
+        if quantity > 0:
+            self._redis.hset(self._key(symbol), portfolio_id, quantity)
+        else:
+            self._redis.hdel(self._key(symbol), portfolio_id)
+
+    def holders(self, symbol):
+        return {
+            int(portfolio_id): int(quantity)
+            for portfolio_id, quantity in self._redis.hgetall(self._key(symbol)).items()
+        }
+
+    def _keys(self):
+        return self._redis.scan_iter(match=f"{self.KEY_PREFIX}*", count=1000)
+
+    def load(self, rows):
+        pipe = self._redis.pipeline(transaction=True)
+        for key in self._keys():
+            pipe.delete(key)
+        count = 0
+        for symbol, portfolio_id, quantity in rows:
+            if quantity > 0:
+                pipe.hset(self._key(symbol), portfolio_id, quantity)
+                count += 1
+        pipe.execute()
+        return count
+
+    def rebuild(self):
+        return self.load(HoldingsIndex.position_rows())
+
+    def memory_bytes(self):
+        return sum(self._redis.memory_usage(key) or 0 for key in self._keys())
+
+    def symbol_count(self):
+        return sum(1 for _ in self._keys())
+
+
+class HoldingsIndex:
+    """
+    Reverse index from stock symbol to the portfolios holding it and their
+    quantities. Trade execution keeps it current through adjust(); it can
+    always be rebuilt from Position.
+
+    The backend is chosen by settings.HOLDINGS_INDEX_URL: a redis:// URL
+    selects the shared Redis backend, otherwise an in-process index is used.
+    Only a shared index is authoritative; see shared().
+    """
+    _backend = None
+    _backend_lock = threading.Lock()
+
+    # Lookup latency counters, reported by stats()
+    _lookups = 0
+    _lookup_seconds = 0.0
+    _lookup_max_seconds = 0.0
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            with cls._backend_lock:
+                if cls._backend is None:
+                    url = getattr(settings, 'HOLDINGS_INDEX_URL', '')
+                    if url.startswith(('redis://', 'rediss://')):
+                        cls._backend = RedisHoldingsBackend(url)
+                    else:
+                        cls._backend = MemoryHoldingsBackend()
+        return cls._backend
+
+    @classmethod
+    def shared(cls):
+        """
+        Whether every process sees the same index. A per-process index
+        misses positions opened by other processes, so it must not be used
+        to find the holders to reprice.
+        """
+        return cls.backend().name == 'redis'
+
+    @classmethod
+    def position_rows(cls):
+        """Yield (symbol, portfolio_id, quantity) for every open position"""
+        return Position.objects.filter(quantity__gt=0).values_list(
+            'stock__symbol', 'portfolio_id', 'quantity'
+        ).iterator(chunk_size=5000)
+
+    @classmethod
+    def adjust(cls, symbol, portfolio_id, quantity_delta):
+        """Apply a trade's change in quantity to the index"""
+        if quantity_delta:
+            cls.backend().adjust(symbol.upper(), portfolio_id, quantity_delta)
+
+    @classmethod
+    def set_quantity(cls, symbol, portfolio_id, quantity):
+        """Record a portfolio's absolute holding of a symbol, e.g. after a bulk write"""
+        cls.backend().set_quantity(symbol.upper(), portfolio_id, quantity)
+
+    @classmethod
+    def holders(cls, symbol):
+        """Return {portfolio_id: quantity} for every portfolio holding symbol"""
+        started = time.perf_counter()
+        holders = cls.backend().holders(symbol.upper())
+        elapsed = time.perf_counter() - started
+        cls._lookups += 1
+        cls._lookup_seconds += elapsed
+        cls._lookup_max_seconds = max(cls._lookup_max_seconds, elapsed)
+        return holders
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuild the index from Position; returns the number of entries"""
+        started = time.perf_counter()
+        count = cls.backend().rebuild()
+        logger.info(
+            f"Rebuilt {cls.backend().name} holdings index with {count} entries "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+        return count
+
+    @classmethod
+    def stats(cls):
+        """Return memory footprint and lookup latency metrics for the index"""
+        backend = cls.backend()
+        lookups = cls._lookups
+        return {
+            'backend': backend.name,
+            'symbols': backend.symbol_count(),
+            'memory_bytes': backend.memory_bytes(),
+            'lookups': lookups,
+            'lookup_avg_ms': (cls._lookup_seconds / lookups * 1000) if lookups else 0.0,
+            'lookup_max_ms': cls._lookup_max_seconds * 1000,
+        }
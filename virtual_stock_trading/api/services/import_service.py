@@ -0,0 +1,279 @@
+import logging
+import time
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from ..models import Portfolio, Position, Stock, Transaction
+from .holdings_index import HoldingsIndex
+from .leaderboard_service import LeaderboardService
+from .ledger_service import LedgerService
+from .valuation_service import ValuationService
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+CENTS = Decimal('0.01')
+
+
+class TradeImportService:
+    """
+    Replays a CSV of historical trades onto a portfolio.
+
+    The file is read in chunks; within a chunk, cash and positions are
+    running sums computed with vectorized NumPy in integer cents and shares,
+    average buy prices follow the ledger's Decimal rules, and transactions
+    are written with bulk_create. Only per-symbol running totals are carried
+    between chunks, so memory is bounded by the chunk size whatever the
+    file length.
+
+    Expected columns: timestamp, transaction_type, symbol, quantity, price.
+    Deposits and withdrawals leave symbol empty and carry their amount in
+    price, with quantity defaulting to 1, as cash transactions do elsewhere.
+    """
+    REQUIRED_COLUMNS = ('timestamp', 'transaction_type', 'symbol', 'quantity', 'price')
+    CASH_TYPES = (Transaction.DEPOSIT, Transaction.WITHDRAW)
+    TRADE_TYPES = (Transaction.BUY, Transaction.SELL)
+    CHUNK_SIZE = 50000
+    BATCH_SIZE = 5000
+    # Largest value Transaction.price (max_digits=10, decimal_places=2) can hold
+    MAX_PRICE = 99999999.99
+
+    @classmethod
+    def import_csv(cls, portfolio, source, chunk_size=None):
+        """
+        Import trades from a path or file-like object into portfolio.
+
+        Returns a summary dict with row counts and throughput.
+
+        Raises:
+            ValueError: If a row is malformed, sells more shares than held,
+                or takes the cash balance below zero. Nothing is written.
+        """
+        import pandas as pd
+
+        started = time.perf_counter()
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+
+        with transaction.atomic():
+            # Lock the portfolio as LedgerService.record does, so no order
+            # lands between reading the starting state and writing the result
+            locked = Portfolio.objects.select_for_update().get(pk=portfolio.pk)
+            # Running state carried between chunks: symbol -> [quantity, average buy price]
+            holdings = {
+                symbol: [quantity, avg_price]
+                for symbol, quantity, avg_price in Position.objects.filter(portfolio=locked)
+                .values_list('stock__symbol', 'quantity', 'average_buy_price')
+            }
+            state = {
+                'cash': int(locked.cash_balance * 100),  # cents
+                'last_timestamp': None,
+                'rows': 0,
+            }
+            stock_ids = {}
+
+            reader = pd.read_csv(
+                source, chunksize=chunk_size, dtype={'symbol': 'string', 'transaction_type': 'string'},
+                keep_default_na=False, na_values={'quantity': [''], 'price': ['']},
+            )
+            for chunk in reader:
+                frame = cls._prepare_chunk(chunk, state['rows'])
+                cls._check_order(frame, state)
+                cls._apply_cash(frame, state)
+                cls._apply_positions(frame, holdings)
+                cls._write_transactions(locked, frame, stock_ids)
+                state['rows'] += len(frame)
+
+            cls._write_positions(locked, holdings, stock_ids)
+            locked.cash_balance = Decimal(state['cash']) / 100
+            locked.save(update_fields=['cash_balance', 'updated_at'])
+            ValuationService.recompute(locked)
+
+            def index_holdings():
+                for symbol, (quantity, _) in holdings.items():
+                    HoldingsIndex.set_quantity(symbol, portfolio.pk, quantity)
+            # The index only follows the import once it has committed
+            transaction.on_commit(index_holdings)
+
+            # Checkpoint the imported state so later replays start after the import
+            LedgerService.create_checkpoint(locked, from_current_state=True)
+            # Imported deposits move the leaderboard bases as well as the total
+            LeaderboardService.reset([portfolio.pk])
+        portfolio.refresh_from_db(fields=['cash_balance', *Portfolio.VALUATION_FIELDS])
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'rows': state['rows'],
+            'positions': sum(1 for quantity, _ in holdings.values() if quantity > 0),
+            'cash_balance': portfolio.cash_balance,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(state['rows'] / elapsed) if elapsed else state['rows'],
+        }
+        logger.info(f"Imported {summary['rows']} trades into portfolio {portfolio.id} "
+                    f"({summary['rows_per_second']} rows/sec)")
+        return summary
+
+    @classmethod
+    def _prepare_chunk(cls, chunk, offset):
+        """Normalize and validate one chunk of CSV rows"""
+        import pandas as pd
+
+        missing = [column for column in cls.REQUIRED_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        frame = pd.DataFrame({
+            'timestamp': pd.to_datetime(chunk['timestamp'], utc=True, errors='coerce'),
+            'transaction_type': chunk['transaction_type'].str.strip().str.lower(),
+            'symbol': chunk['symbol'].str.strip().str.upper(),
+            'quantity': pd.to_numeric(chunk['quantity'], errors='coerce'),
+            'price': pd.to_numeric(chunk['price'], errors='coerce'),
+        })
+        is_cash = frame['transaction_type'].isin(cls.CASH_TYPES)
+        frame.loc[is_cash & frame['quantity'].isna(), 'quantity'] = 1
+        frame['row'] = range(offset + 2, offset + 2 + len(frame))  # 1-based, after the header
+
+        checks = [
+            (frame['timestamp'].isna(), "invalid timestamp"),
+            (~frame['transaction_type'].isin(cls.TRADE_TYPES + cls.CASH_TYPES), "unknown transaction type"),
+            (frame['quantity'].isna() | (frame['quantity'] <= 0) | (frame['quantity'] % 1 != 0),
+             "quantity must be a positive integer"),
+            (frame['price'].isna() | (frame['price'] < 0), "price must be a non-negative number"),
+            (frame['price'] > cls.MAX_PRICE, "price is too large"),
+            (~is_cash & (frame['symbol'] == ''), "trades need a symbol"),
+        ]
+        for invalid, message in checks:
+            if invalid.any():
+                raise ValueError(f"Row {frame.loc[invalid, 'row'].iloc[0]}: {message}")
+
+        frame['quantity'] = frame['quantity'].astype('int64')
+        frame['price'] = frame['price'].round(2)
+        # Money is carried in integer cents from here on
+        frame['cents'] = (frame['price'] * 100).round().astype('int64')
+        frame.loc[is_cash, 'symbol'] = ''
+        return frame
+
+    @classmethod
+    def _check_order(cls, frame, state):
+        timestamps = frame['timestamp']
+        previous = timestamps.shift(1)
+        if state['last_timestamp'] is not None:
+            previous.iloc[0] = state['last_timestamp']
+        out_of_order = timestamps < previous
+        if out_of_order.any():
+            raise ValueError(f"Row {frame.loc[out_of_order, 'row'].iloc[0]}: rows must be in chronological order")
+        state['last_timestamp'] = timestamps.iloc[-1]
+
+    @classmethod
+    def _apply_cash(cls, frame, state):
+        """Apply the chunk's cash movements, rejecting any overdraft"""
+        import numpy as np
+
+        amount = (frame['quantity'] * frame['cents']).to_numpy()
+        sign = frame['transaction_type'].map({
+            Transaction.BUY: -1, Transaction.SELL: 1, Transaction.DEPOSIT: 1, Transaction.WITHDRAW: -1,
+        }).to_numpy(dtype='int64')
+        running_cash = state['cash'] + np.cumsum(sign * amount)
+        overdrawn = running_cash < 0
+        if overdrawn.any():
+            row = frame['row'].to_numpy()[overdrawn.argmax()]
+            raise ValueError(f"Row {row}: insufficient cash")
+        state['cash'] = int(running_cash[-1])
+
+    @classmethod
+    def _apply_positions(cls, frame, holdings):
+        """
+        Advance each symbol's (quantity, average buy price) over the chunk.
+
+        Quantities are running sums. The average buy price follows
+        LedgerState.apply, so an imported position matches a replay of its
+        ledger: each buy blends its cost in and rounds to cents, sells leave
+        it unchanged, and a position that is fully sold starts over. Only
+        the buys after a symbol's last zero crossing can affect it; those
+        are applied one by one in Decimal.
+        """
+        import numpy as np
+
+        trades = frame[frame['transaction_type'].isin(cls.TRADE_TYPES)]
+        for symbol, rows in trades.groupby('symbol', sort=False):
+            is_buy = (rows['transaction_type'] == Transaction.BUY).to_numpy()
+            shares = rows['quantity'].to_numpy()
+            cents = rows['cents'].to_numpy()
+            quantity_0, avg_price = holdings.get(symbol, (0, ZERO))
+
+            quantity = quantity_0 + np.cumsum(np.where(is_buy, shares, -shares))
+            if (quantity < 0).any():
+                row = rows['row'].to_numpy()[(quantity < 0).argmax()]
+                raise ValueError(f"Row {row}: sells more {symbol} than held")
+
+            start = 0
+            closed = np.flatnonzero(quantity == 0)
+            if len(closed):
+                start = closed[-1] + 1
+                avg_price = ZERO
+            held = np.concatenate(([quantity_0], quantity[:-1]))
+            for k in start + np.flatnonzero(is_buy[start:]):
+                amount = Decimal(int(shares[k]) * int(cents[k])) / 100
+                avg_price = ((avg_price * int(held[k]) + amount) / int(quantity[k])).quantize(CENTS)
+            holdings[symbol] = [int(quantity[-1]), avg_price]
+
+    @classmethod
+    def _resolve_stocks(cls, frame, stock_ids):
+        """Make sure every traded symbol has a Stock row and cache its id"""
+        trades = frame[frame['symbol'] != '']
+        last_prices = trades.groupby('symbol')['cents'].last()
+        new_symbols = [symbol for symbol in last_prices.index if symbol not in stock_ids]
+        if not new_symbols:
+            return
+        Stock.objects.bulk_create([
+            Stock(symbol=symbol, company_name=symbol,
+                  last_price=Decimal(int(last_prices[symbol])) / 100, last_updated=timezone.now())
+            for symbol in new_symbols
+        ], ignore_conflicts=True)
+        stock_ids.update(Stock.objects.filter(symbol__in=new_symbols).values_list('symbol', 'id'))
+
+    @classmethod
+    def _write_transactions(cls, portfolio, frame, stock_ids):
+        cls._resolve_stocks(frame, stock_ids)
+        rows = zip(
+            frame['timestamp'].dt.to_pydatetime(), frame['transaction_type'], frame['symbol'],
+            frame['quantity'].tolist(), frame['cents'].tolist(),
+        )
+        Transaction.objects.bulk_create((
+            Transaction(
+                portfolio_id=portfolio.pk,
+                stock_id=stock_ids.get(symbol),
+                transaction_type=transaction_type,
+                quantity=quantity,
+                price=Decimal(cents) / 100,
+                timestamp=timestamp,
+                notes='Imported',
+            )
+            for timestamp, transaction_type, symbol, quantity, cents in rows
+        ), batch_size=cls.BATCH_SIZE)
+
+    @classmethod
+    def _write_positions(cls, portfolio, holdings, stock_ids):
+        invalid = sorted(symbol for symbol, (_, avg_price) in holdings.items() if not avg_price.is_finite())
+        if invalid:
+            raise ValueError(f"Could not compute an average buy price for: {', '.join(invalid)}")
+        missing = [symbol for symbol in holdings if symbol not in stock_ids]
+        stock_ids.update(Stock.objects.filter(symbol__in=missing).values_list('symbol', 'id'))
+
+        open_positions = [
+            Position(
+                portfolio_id=portfolio.pk,
+                stock_id=stock_ids[symbol],
+                quantity=quantity,
+                average_buy_price=avg_price,
+            )
+            for symbol, (quantity, avg_price) in holdings.items() if quantity > 0
+        ]
+        Position.objects.bulk_create(
+            open_positions,
+            batch_size=cls.BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['portfolio', 'stock'],
+            update_fields=['quantity', 'average_buy_price'],
+        )
+        closed = [stock_ids[symbol] for symbol, (quantity, _) in holdings.items() if quantity == 0]
+        Position.objects.filter(portfolio=portfolio, stock_id__in=closed).delete()
@@ -0,0 +1,461 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import date, datetime, time as midnight, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Portfolio, PortfolioSnapshot, Transaction
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+BOARDS = ('all', 'month', 'week', 'day')
+
+
+def score(base, total):
+    """Return on the base, or None when there is no positive base to rank by"""
+    return (total - base) / base if base > 0 else None
+
+
+class MemoryLeaderboardBackend:
+    """
+    In-process boards, each a list of (-score, portfolio_id) kept sorted with
+    bisect: ranks and top-N slices are found in O(log n), and an update
+    shifts the list in one memmove. Each worker process holds its own copy,
+    built from the database on first use. Writes in one process can't reach
+    the others' copies, so it is only rescored through rebuilds: once it is
+    older than LEADERBOARD_REBUILD_MINUTES or a new day has started, the
+    current boards are served while a background thread rebuilds them.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bases = {board: {} for board in BOARDS}
+        self._scores = {board: {} for board in BOARDS}
+        self._ranked = {board: [] for board in BOARDS}
+        self._built = None
+        self._refreshing = False
+
+    def built(self):
+        return self._built is not None
+
+    def stale(self):
+        if self._built is None:
+            return True
+        day, built_at = self._built
+        max_age = settings.LEADERBOARD_REBUILD_MINUTES * 60
+        return day != date.today() or bool(max_age and time.monotonic() - built_at > max_age)
+
+    def refresh(self):
+        """Rebuild in a background thread, unless a rebuild is already running"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='leaderboard-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            LeaderboardService.rebuild()
+        except Exception as e:
+            logger.warning("Could not rebuild the leaderboards: %s", e)
+        finally:
+            self._refreshing = False
+            # The thread's own database connection
+            connection.close()
+
+    def _rescore(self, board, portfolio_id, value):
+        scores, ranked = self._scores[board], self._ranked[board]
+        old = scores.pop(portfolio_id, None)
+        if old is not None:
+            del ranked[bisect.bisect_left(ranked, (-old, portfolio_id))]
+        if value is not None:
+            scores[portfolio_id] = value
+            bisect.insort(ranked, (-value, portfolio_id))
+
+    def set_totals(self, totals):
+        with self._lock:
+            for board in BOARDS:
+                bases = self._bases[board]
+                for portfolio_id, total in totals.items():
+                    if portfolio_id in bases:
+                        self._rescore(board, portfolio_id, score(bases[portfolio_id], total))
+
+    def add_flow(self, portfolio_id, amount):
+        with self._lock:
+            for board in BOARDS:
+                bases = self._bases[board]
+                bases[portfolio_id] = bases.get(portfolio_id, 0.0) + amount
+
+    def set_entries(self, entries):
+        with self._lock:
+            for board, board_entries in entries.items():
+                for portfolio_id, (base, total) in board_entries.items():
+                    self._bases[board][portfolio_id] = base
+                    self._rescore(board, portfolio_id, score(base, total))
+
+    def remove(self, portfolio_ids):
+        with self._lock:
+            for board in BOARDS:
+                for portfolio_id in portfolio_ids:
+                    self._bases[board].pop(portfolio_id, None)
+                    self._rescore(board, portfolio_id, None)
+
+    def top(self, board, offset, limit):
+        with self._lock:
+            return [(portfolio_id, -negated) for negated, portfolio_id in self._ranked[board][offset:offset + limit]]
+
+    def rank(self, board, portfolio_id):
+        with self._lock:
+            value = self._scores[board].get(portfolio_id)
+            if value is None:
+                return None
+            return bisect.bisect_left(self._ranked[board], (-value, portfolio_id)) + 1, value
+
+    def count(self, board):
+        return len(self._scores[board])
+
+    def load(self, entries):
+        bases = {board: {} for board in BOARDS}
+        scores = {board: {} for board in BOARDS}
+        for board, board_entries in entries.items():
+            for portfolio_id, (base, total) in board_entries.items():
+                bases[board][portfolio_id] = base
+                value = score(base, total)
+                if value is not None:
+                    scores[board][portfolio_id] = value
+        ranked = {
+            board: sorted((-value, portfolio_id) for portfolio_id, value in scores[board].items())
+            for board in BOARDS
+        }
+        with self._lock:
+            self._bases, self._scores, self._ranked = bases, scores, ranked
+            self._built = (date.today(), time.monotonic())
+        return len(scores['all'])
+
+    def rebuild(self):
+        return self.load(LeaderboardService.entries())
+
+
+class RedisLeaderboardBackend:
+    """
+    Shared boards: per board, a sorted set of portfolio scores and a hash of
+    the bases they are computed from. ZREVRANK and ZREVRANGE serve ranks and
+    top-N slices in O(log n).
+    """
+    name = 'redis'
+    KEY_PREFIX = 'leaderboard:'
+    CHUNK_SIZE = 10000
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._built = False
+
+    def _key(self, board, kind='scores'):
+        return f"{self.KEY_PREFIX}{board}:{kind}"
+
+    def built(self):
+        if not self._built:
+            self._built = bool(self._redis.exists(f"{self.KEY_PREFIX}built"))
+        return self._built
+
+    def stale(self):
+        # Scheduled rebuilds keep the shared boards consistent
+        return False
+
+    def refresh(self):
+        pass
+
+    def set_totals(self, totals):
+        portfolio_ids = list(totals)
+        pipe = self._redis.pipeline(transaction=False)
+        for board in BOARDS:
+            pipe.hmget(self._key(board, 'bases'), portfolio_ids)
+        bases = pipe.execute()
+
+        pipe = self._redis.pipeline(transaction=True)
+        for board, board_bases in zip(BOARDS, bases):
+            scores, unranked = {}, []
+            for portfolio_id, base in zip(portfolio_ids, board_bases):
+                if base is None:
+                    continue
+                value = score(float(base), totals[portfolio_id])
+                if value is None:
+                    unranked.append(portfolio_id)
+                else:
+                    scores[portfolio_id] = value
+            if scores:
+                pipe.zadd(self._key(board), scores)
+            if unranked:
+                pipe.zrem(self._key(board), *unranked)
+        pipe.execute()
+
+    def add_flow(self, portfolio_id, amount):
+        pipe = self._redis.pipeline(transaction=True)
+        for board in BOARDS:
+            pipe.hincrbyfloat(self._key(board, 'bases'), portfolio_id, amount)
+        pipe.execute()
+
+    def _write(self, pipe, entries):
+        for board, board_entries in entries.items():
+            items = list(board_entries.items())
+            for start in range(0, len(items), self.CHUNK_SIZE):
+                chunk = items[start:start + self.CHUNK_SIZE]
+                pipe.hset(self._key(board, 'bases'), mapping={portfolio_id: base for portfolio_id, (base, _) in chunk})
+                scores = {portfolio_id: score(base, total) for portfolio_id, (base, total) in chunk}
+                ranked = {portfolio_id: value for portfolio_id, value in scores.items() if value is not None}
+                if ranked:
+                    pipe.zadd(self._key(board), ranked)
+                if len(ranked) < len(scores):
+                    pipe.zrem(self._key(board), *(portfolio_id for portfolio_id in scores if portfolio_id not in ranked))
+
+    def set_entries(self, entries):
+        pipe = self._redis.pipeline(transaction=True)
+        self._write(pipe, entries)
+        pipe.execute()
+
+    def remove(self, portfolio_ids):
+        portfolio_ids = list(portfolio_ids)
+        pipe = self._redis.pipeline(transaction=True)
+        for board in BOARDS:
+            pipe.zrem(self._key(board), *portfolio_ids)
+            pipe.hdel(self._key(board, 'bases'), *portfolio_ids)
+        pipe.execute()
+
+    def top(self, board, offset, limit):
+        return [
+            (int(portfolio_id), value)
+            for portfolio_id, value in self._redis.zrevrange(self._key(board), offset, offset + limit - 1, withscores=True)
+        ]
+
+    def rank(self, board, portfolio_id):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zrevrank(self._key(board), portfolio_id)
+        pipe.zscore(self._key(board), portfolio_id)
+        rank, value = pipe.execute()
+        return None if rank is None else (rank + 1, value)
+
+    def count(self, board):
+        return self._redis.zcard(self._key(board))
+
+    def load(self, entries):
+        pipe = self._redis.pipeline(transaction=True)
+        for board in BOARDS:
+            pipe.delete(self._key(board), self._key(board, 'bases'))
+        self._write(pipe, entries)
+        pipe.set(f"{self.KEY_PREFIX}built", date.today().isoformat())
+        pipe.execute()
+        self._built = True
+        return sum(1 for base, total in entries['all'].values() if score(base, total) is not None)
+
+    def rebuild(self):
+        return self.load(LeaderboardService.entries())
+
+
+class LeaderboardService:
+    """
+    Ranks portfolios by their return over each board's period: 'all' since
+    they were opened, and the current 'month', 'week' and 'day'.
+
+    A portfolio's return is its total value over its base, less one. The
+    base is its value at the start of the period (its latest snapshot on or
+    before that day, or 0 for a portfolio without one) plus the cash
+    deposited less withdrawn since, so moving cash in or out is not a gain.
+    Bases only change with cash movements and at period starts, so trades,
+    deposits and price changes rescore just the portfolios they touch.
+    rebuild() recomputes every board from the database; it runs after the
+    nightly snapshots, which start the new periods, and every
+    LEADERBOARD_REBUILD_MINUTES. Neither writes nor reads rebuild boards
+    that have been built once: stale boards are served until then.
+
+    The backend is chosen by settings.LEADERBOARD_URL: a redis:// URL
+    selects shared Redis sorted sets, otherwise each process ranks in memory
+    and, as its copy can't see other processes' writes, only rebuilds it.
+    """
+    BOARDS = BOARDS
+
+    _backend = None
+    _backend_lock = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            with cls._backend_lock:
+                if cls._backend is None:
+                    url = getattr(settings, 'LEADERBOARD_URL', '')
+                    if url.startswith(('redis://', 'rediss://')):
+                        cls._backend = RedisLeaderboardBackend(url)
+                    else:
+                        cls._backend = MemoryLeaderboardBackend()
+        return cls._backend
+
+    @classmethod
+    def shared(cls):
+        """
+        Whether every process sees the same boards. Per-process boards can
+        only be rescored by the writes of their own process, so they are
+        rebuilt from the database instead and would disagree otherwise.
+        """
+        return cls.backend().name == 'redis'
+
+    @classmethod
+    def period_start(cls, board, today=None):
+        """First day of the board's current period; None for the 'all' board"""
+        today = today or date.today()
+        if board == 'day':
+            return today
+        if board == 'week':
+            return today - timedelta(days=today.weekday())
+        if board == 'month':
+            return today.replace(day=1)
+        return None
+
+    @classmethod
+    def entries(cls, portfolio_ids=None):
+        """
+        Return {board: {portfolio_id: (base, total value)}} for the given
+        portfolios (default: all), computed from the database in one query.
+        """
+        today = date.today()
+        flow = Case(
+            When(transaction_type=Transaction.DEPOSIT, then=F('price') * F('quantity')),
+            When(transaction_type=Transaction.WITHDRAW, then=-F('price') * F('quantity')),
+            output_field=MONEY,
+        )
+
+        def flows(since=None):
+            events = Transaction.objects.filter(
+                portfolio=OuterRef('pk'), transaction_type__in=(Transaction.DEPOSIT, Transaction.WITHDRAW),
+            )
+            if since is not None:
+                events = events.filter(timestamp__gte=timezone.make_aware(datetime.combine(since, midnight.min)))
+            total = events.order_by().values('portfolio').annotate(total=Sum(flow)).values('total')
+            return Coalesce(Subquery(total), Value(ZERO), output_field=MONEY)
+
+        periods = {board: cls.period_start(board, today) for board in BOARDS if board != 'all'}
+        annotations = {'flows': flows()}
+        for board, start in periods.items():
+            start_value = PortfolioSnapshot.objects.filter(
+                portfolio=OuterRef('pk'), date__lte=start,
+            ).order_by('-date').values('total_value')[:1]
+            annotations[f'{board}_start'] = Subquery(start_value, output_field=MONEY)
+            annotations[f'{board}_flows'] = flows(start)
+
+        portfolios = Portfolio.objects.all()
+        if portfolio_ids is not None:
+            portfolios = portfolios.filter(pk__in=portfolio_ids)
+        rows = portfolios.annotate(**annotations).values('id', 'cached_total_value', *annotations)
+
+        entries = {board: {} for board in BOARDS}
+        for row in rows.iterator(chunk_size=5000):
+            total = float(row['cached_total_value'])
+            entries['all'][row['id']] = (float(row['flows']), total)
+            for board in periods:
+                start = row[f'{board}_start']
+                # Without a snapshot from the period's start, the portfolio
+                # is treated as opened with its first deposit
+                base = row['flows'] if start is None else start + row[f'{board}_flows']
+                entries[board][row['id']] = (float(base), total)
+        return entries
+
+    @classmethod
+    def update(cls, portfolio_ids):
+        """Rescore these portfolios from their total values once the current transaction commits"""
+        portfolio_ids = set(portfolio_ids)
+        if portfolio_ids:
+            transaction.on_commit(lambda: cls._apply(portfolio_ids))
+
+    @classmethod
+    def add_flow(cls, portfolio_id, amount):
+        """
+        Add cash deposited (negative when withdrawn) to the portfolio's bases
+        and rescore it once the current transaction commits.
+        """
+        transaction.on_commit(lambda: cls._apply({portfolio_id}, {portfolio_id: float(amount)}))
+
+    @classmethod
+    def reset(cls, portfolio_ids):
+        """Recompute these portfolios' bases and scores, e.g. after a bulk import, once the transaction commits"""
+        portfolio_ids = set(portfolio_ids)
+        if portfolio_ids:
+            transaction.on_commit(lambda: cls._apply(portfolio_ids, reset=True))
+
+    @classmethod
+    def _apply(cls, portfolio_ids, flows=None, reset=False):
+        try:
+            backend = cls.backend()
+            # Unbuilt boards will read the committed change when built
+            if not cls.shared() or not backend.built():
+                return
+            if reset:
+                entries = cls.entries(portfolio_ids)
+                backend.set_entries(entries)
+                existing = set(entries['all'])
+            else:
+                for portfolio_id, amount in (flows or {}).items():
+                    backend.add_flow(portfolio_id, amount)
+                totals = {
+                    portfolio_id: float(total) for portfolio_id, total in
+                    Portfolio.objects.filter(pk__in=portfolio_ids).values_list('id', 'cached_total_value')
+                }
+                if totals:
+                    backend.set_totals(totals)
+                existing = set(totals)
+            # Deleted portfolios drop off the boards
+            if portfolio_ids - existing:
+                backend.remove(portfolio_ids - existing)
+        except Exception as e:
+            # The write has committed; the next rebuild brings the boards back in line
+            logger.warning("Could not update the leaderboards for %d portfolios: %s", len(portfolio_ids), e)
+
+    @classmethod
+    def _board(cls, board):
+        if board not in BOARDS:
+            raise ValueError(f"Unknown leaderboard: {board}. Choose from {', '.join(BOARDS)}")
+        backend = cls.backend()
+        if not backend.built():
+            # Nothing to serve yet: built once, on first use
+            cls.rebuild()
+        elif backend.stale():
+            backend.refresh()
+        return backend
+
+    @classmethod
+    def top(cls, board='all', limit=10, offset=0):
+        """Return [(rank, portfolio_id, return)] for `limit` portfolios from rank offset + 1"""
+        ranked = cls._board(board).top(board, offset, limit)
+        return [(offset + index + 1, portfolio_id, value) for index, (portfolio_id, value) in enumerate(ranked)]
+
+    @classmethod
+    def rank(cls, portfolio_id, board='all'):
+        """Return (rank, return) of the portfolio, or None if it is not ranked"""
+        return cls._board(board).rank(board, portfolio_id)
+
+    @classmethod
+    def count(cls, board='all'):
+        """Number of portfolios ranked on the board"""
+        return cls._board(board).count(board)
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuild every board from the database; returns the number of portfolios ranked overall"""
+        started = time.perf_counter()
+        count = cls.backend().rebuild()
+        logger.info(
+            f"Rebuilt {cls.backend().name} leaderboards with {count} portfolios "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+        return count
+
+    @classmethod
+    def stats(cls):
+        backend = cls.backend()
+        return {'backend': backend.name, 'boards': {board: backend.count(board) for board in BOARDS}}
@@ -0,0 +1,295 @@
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from ..models import Portfolio, PortfolioCheckpoint, Position, Transaction
+from .leaderboard_service import LeaderboardService
+from .page_cache import PageCacheService
+from .valuation_service import ValuationService
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal('0.01')
+
+
+class LedgerState:
+    """
+    Cash and positions of a portfolio as derived from its ledger.
+    positions maps stock id -> (quantity, average buy price).
+    """
+
+    def __init__(self, cash=Decimal('0.00'), positions=None):
+        self.cash = Decimal(cash)
+        self.positions = dict(positions or {})
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        if checkpoint is None:
+            return cls()
+        return cls(checkpoint.cash_balance, {
+            int(stock_id): (quantity, Decimal(avg_price))
+            for stock_id, (quantity, avg_price) in checkpoint.positions.items()
+        })
+
+    def to_json(self):
+        return {
+            str(stock_id): [quantity, str(avg_price)]
+            for stock_id, (quantity, avg_price) in self.positions.items()
+        }
+
+    def apply(self, transaction_type, stock_id, quantity, price, strict=True):
+        """
+        Apply one ledger event. Every event moves price * quantity of cash;
+        deposits and withdrawals carry their amount in price with quantity 1.
+
+        With strict=True an overdraft or oversell raises ValueError; replay
+        uses strict=False so a bad historical event is logged, not fatal.
+        """
+        amount = price * quantity
+        held, avg_price = self.positions.get(stock_id, (0, Decimal('0.00')))
+
+        if transaction_type in (Transaction.BUY, Transaction.WITHDRAW) and amount > self.cash:
+            if transaction_type == Transaction.BUY:
+                message = f"Insufficient funds. You need ${amount} to complete this purchase."
+            else:
+                message = f"Insufficient funds. Your available cash balance is ${self.cash:.2f}."
+            if strict:
+                raise ValueError(message)
+            logger.warning(f"Ledger replay: {message}")
+        if transaction_type == Transaction.SELL and quantity > held:
+            message = f"You only have {held} shares to sell"
+            if strict:
+                raise ValueError(message)
+            logger.warning(f"Ledger replay: {message}")
+            quantity = held
+            amount = price * quantity
+
+        if transaction_type == Transaction.BUY:
+            total_shares = held + quantity
+            # Average prices are stored with two decimal places
+            avg_price = ((avg_price * held + amount) / total_shares).quantize(CENTS)
+            self.positions[stock_id] = (total_shares, avg_price)
+            self.cash -= amount
+        elif transaction_type == Transaction.SELL:
+            if held - quantity > 0:
+                self.positions[stock_id] = (held - quantity, avg_price)
+            else:
+                self.positions.pop(stock_id, None)
+            self.cash += amount
+        elif transaction_type == Transaction.DEPOSIT:
+            self.cash += amount
+        elif transaction_type == Transaction.WITHDRAW:
+            self.cash -= amount
+        else:
+            raise ValueError(f"Unknown transaction type: {transaction_type}")
+
+
+class LedgerService:
+    """
+    Transaction is an append-only ledger and the source of truth for each
+    portfolio's cash and positions; Portfolio.cash_balance and Position are
+    materialized from it as events are recorded.
+
+    Events are ordered by id (append order). A PortfolioCheckpoint stores
+    the state after every event up to last_transaction_id, so the state at
+    any moment is rebuilt from the nearest earlier checkpoint plus the
+    events appended after it.
+    """
+
+    # Minimum number of new events before the nightly job writes a checkpoint
+    CHECKPOINT_INTERVAL = 500
+
+    @classmethod
+    def record(cls, portfolio, transaction_type, quantity, price, stock=None, notes=None, timestamp=None):
+        """
+        Append an event to the portfolio's ledger and apply it to the
+        materialized cash balance and position.
+
+        Returns the new Transaction.
+
+        Raises:
+            ValueError: If the event is invalid or would overdraw cash or
+                sell more shares than are held.
+        """
+        quantity = int(quantity)
+        price = Decimal(str(price)).quantize(CENTS)
+        if quantity <= 0:
+            raise ValueError("Quantity must be a positive integer")
+        if price < 0:
+            raise ValueError("Price cannot be negative")
+        if transaction_type in (Transaction.BUY, Transaction.SELL) and stock is None:
+            raise ValueError("A stock is required for buy and sell transactions")
+
+        with transaction.atomic():
+            # Lock the portfolio row so concurrent orders apply one at a time
+            locked = Portfolio.objects.select_for_update().get(pk=portfolio.pk)
+            position = None
+            if stock is not None:
+                position = Position.objects.filter(portfolio=locked, stock=stock).first()
+
+            state = LedgerState(locked.cash_balance)
+            if position is not None:
+                state.positions[stock.pk] = (position.quantity, position.average_buy_price)
+            if transaction_type == Transaction.SELL and position is None:
+                raise ValueError(f"You don't own any shares of {stock.symbol}")
+            state.apply(transaction_type, stock.pk if stock else None, quantity, price)
+
+            entry = Transaction.objects.create(
+                portfolio=locked,
+                stock=stock if transaction_type in (Transaction.BUY, Transaction.SELL) else None,
+                transaction_type=transaction_type,
+                quantity=quantity,
+                price=price,
+                notes=notes or None,
+                timestamp=timestamp or timezone.now(),
+            )
+
+            locked.cash_balance = state.cash
+            locked.save(update_fields=['cash_balance', 'updated_at'])
+
+            if transaction_type in (Transaction.BUY, Transaction.SELL):
+                new_quantity, avg_price = state.positions.get(stock.pk, (0, None))
+                if new_quantity == 0:
+                    position.delete()
+                elif position is None:
+                    Position.objects.create(
+                        portfolio=locked, stock=stock, quantity=new_quantity, average_buy_price=avg_price
+                    )
+                else:
+                    position.quantity = new_quantity
+                    position.average_buy_price = avg_price
+                    position.save()
+                delta = quantity if transaction_type == Transaction.BUY else -quantity
+                ValuationService.apply_position_change(locked, stock, delta)
+
+            # Cached portfolio pages are re-rendered once this event commits
+            PageCacheService.invalidate(portfolio_ids=[locked.pk], user_ids=[locked.user_id])
+            # and leaderboard scores follow; cash moved in or out is not a gain
+            if transaction_type == Transaction.DEPOSIT:
+                LeaderboardService.add_flow(locked.pk, price * quantity)
+            elif transaction_type == Transaction.WITHDRAW:
+                LeaderboardService.add_flow(locked.pk, -price * quantity)
+            else:
+                LeaderboardService.update([locked.pk])
+
+        # Keep the caller's instance in step with what was written
+        portfolio.cash_balance = locked.cash_balance
+        portfolio.refresh_from_db(fields=Portfolio.VALUATION_FIELDS)
+        return entry
+
+    @classmethod
+    def open_portfolio(cls, portfolio, opening_balance):
+        """Record a new portfolio's starting cash as its first ledger event"""
+        if opening_balance:
+            cls.record(portfolio, Transaction.DEPOSIT, 1, opening_balance, notes='Opening balance')
+        return portfolio
+
+    @classmethod
+    def latest_checkpoint(cls, portfolio, at=None):
+        checkpoints = PortfolioCheckpoint.objects.filter(portfolio=portfolio)
+        if at is not None:
+            checkpoints = checkpoints.filter(timestamp__lte=at)
+        return checkpoints.order_by('-timestamp', '-last_transaction_id').first()
+
+    @classmethod
+    def state_at(cls, portfolio, at=None):
+        """
+        Rebuild a portfolio's cash and positions as of `at` (default: now)
+        by replaying only the events after the nearest earlier checkpoint.
+
+        Returns (LedgerState, number of events replayed).
+        """
+        checkpoint = cls.latest_checkpoint(portfolio, at)
+        state = LedgerState.from_checkpoint(checkpoint)
+
+        events = Transaction.objects.filter(portfolio=portfolio)
+        if checkpoint is not None:
+            events = events.filter(id__gt=checkpoint.last_transaction_id)
+        if at is not None:
+            events = events.filter(timestamp__lte=at)
+
+        replayed = 0
+        rows = events.order_by('id').values_list('transaction_type', 'stock_id', 'quantity', 'price')
+        for transaction_type, stock_id, quantity, price in rows.iterator(chunk_size=5000):
+            state.apply(transaction_type, stock_id, quantity, price, strict=False)
+            replayed += 1
+        return state, replayed
+
+    @classmethod
+    def create_checkpoint(cls, portfolio, from_current_state=False):
+        """
+        Store the portfolio's state after its latest event.
+
+        By default the state is derived by replaying the ledger. With
+        from_current_state=True the materialized cash and positions are
+        recorded instead, e.g. after a bulk import computed them directly.
+        """
+        with transaction.atomic():
+            locked = Portfolio.objects.select_for_update().get(pk=portfolio.pk)
+            last_id = Transaction.objects.filter(portfolio=locked).aggregate(last=Max('id'))['last'] or 0
+            if from_current_state:
+                state = cls.current_state(locked)
+            else:
+                state, _ = cls.state_at(locked)
+            return PortfolioCheckpoint.objects.create(
+                portfolio=locked,
+                timestamp=timezone.now(),
+                last_transaction_id=last_id,
+                cash_balance=state.cash,
+                positions=state.to_json(),
+            )
+
+    @classmethod
+    def current_state(cls, portfolio):
+        """Return the materialized cash and positions as a LedgerState"""
+        return LedgerState(portfolio.cash_balance, {
+            stock_id: (quantity, avg_price)
+            for stock_id, quantity, avg_price in Position.objects.filter(portfolio=portfolio)
+            .values_list('stock_id', 'quantity', 'average_buy_price')
+        })
+
+    @classmethod
+    def audit(cls, portfolio):
+        """
+        Compare the materialized cash and positions with the ledger.
+        Returns a list of human-readable differences (empty when consistent).
+        """
+        portfolio.refresh_from_db(fields=['cash_balance'])
+        expected, _ = cls.state_at(portfolio)
+        actual = cls.current_state(portfolio)
+
+        differences = []
+        if expected.cash != actual.cash:
+            differences.append(f"cash: ledger {expected.cash}, stored {actual.cash}")
+        for stock_id in sorted(set(expected.positions) | set(actual.positions)):
+            if expected.positions.get(stock_id) != actual.positions.get(stock_id):
+                differences.append(
+                    f"stock {stock_id}: ledger {expected.positions.get(stock_id)}, "
+                    f"stored {actual.positions.get(stock_id)}"
+                )
+        return differences
+
+    @classmethod
+    def create_due_checkpoints(cls, min_events=None):
+        """
+        Checkpoint every portfolio with at least min_events events since its
+        last checkpoint, auditing it against the materialized state first.
+        Returns the number of checkpoints written.
+        """
+        min_events = min_events or cls.CHECKPOINT_INTERVAL
+        created = 0
+        for portfolio in Portfolio.objects.all().iterator():
+            checkpoint = cls.latest_checkpoint(portfolio)
+            pending = Transaction.objects.filter(portfolio=portfolio)
+            if checkpoint is not None:
+                pending = pending.filter(id__gt=checkpoint.last_transaction_id)
+            if pending.count() < min_events:
+                continue
+
+            differences = cls.audit(portfolio)
+            if differences:
+                logger.warning(f"Ledger audit for portfolio {portfolio.id}: {'; '.join(differences)}")
+            cls.create_checkpoint(portfolio)
+            created += 1
+        return created
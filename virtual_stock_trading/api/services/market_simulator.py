@@ -0,0 +1,201 @@
+import functools
+import math
+import threading
+import zlib
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+
+# Parameters for symbols the universe does not list
+DEFAULT_DRIFT = 0.07
+DEFAULT_VOLATILITY = 0.3
+SECONDS_PER_YEAR = 365.25 * 24 * 60 * 60
+
+# Random stream kinds, part of every stream's seed
+_TOTALS, _WALK = 0, 1
+
+
+class MarketSimulator:
+    """
+    Simulated market: correlated geometric Brownian motion price paths on a
+    grid of ticks `tick_seconds` apart, starting at `epoch`.
+
+    Each symbol's shocks load on one market factor, so the correlation of
+    two symbols' returns is beta_a * beta_b. The factors' Brownian paths
+    are generated in chunks of CHUNK ticks: the value at every chunk
+    boundary first, then each chunk's path as a Brownian bridge between
+    its boundaries. Every chunk is seeded from (seed, factor, chunk), so
+    the price of a symbol at a given tick depends only on the seed, never
+    on what was generated before. Processes with the same settings serve
+    the same price at the same moment without sharing any state, and any
+    point in time can be priced without simulating the path up to it.
+
+    `universe` maps symbols to dicts of base_price, and optionally drift,
+    volatility (both annualised) and beta. Unlisted symbols get a stable
+    base price derived from the symbol and the default parameters.
+
+    NumPy is imported only when prices are first generated.
+    """
+    CHUNK = 4096
+    # Chunk boundary values are generated this many at a time
+    TOTALS_BLOCK = 1024
+    CACHE_CHUNKS = 512
+
+    def __init__(self, universe=None, seed=0, epoch=None, tick_seconds=5.0, beta=0.6):
+        self.universe = {symbol.upper(): params for symbol, params in (universe or {}).items()}
+        self.seed = seed
+        self.epoch = epoch or datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.tick_seconds = tick_seconds
+        self.beta = beta
+        self.dt = tick_seconds / SECONDS_PER_YEAR
+        self._starts = {}
+        self._starts_lock = threading.Lock()
+        self._bridge = functools.lru_cache(maxsize=self.CACHE_CHUNKS)(self._compute_bridge)
+
+    @classmethod
+    def from_settings(cls, universe=None):
+        """A simulator configured by the MARKET_SIM_* settings"""
+        epoch = datetime.fromisoformat(settings.MARKET_SIM_EPOCH)
+        if timezone.is_naive(epoch):
+            epoch = epoch.replace(tzinfo=dt_timezone.utc)
+        return cls(
+            universe,
+            seed=settings.MARKET_SIM_SEED,
+            epoch=epoch,
+            tick_seconds=settings.MARKET_SIM_TICK_SECONDS,
+            beta=settings.MARKET_SIM_BETA,
+        )
+
+    # Time index
+
+    def tick_at(self, when):
+        """The last tick at or before a datetime (0 before the epoch)"""
+        return max(int((when - self.epoch).total_seconds() // self.tick_seconds), 0)
+
+    def time_at(self, tick):
+        return self.epoch + timedelta(seconds=tick * self.tick_seconds)
+
+    # Parameters
+
+    def params(self, symbol):
+        """(base price, drift, volatility, beta) for a symbol"""
+        params = self.universe.get(symbol, {})
+        base_price = params.get('base_price') or 20 + zlib.crc32(symbol.encode()) % 48000 / 100
+        return (
+            float(base_price),
+            params.get('drift', DEFAULT_DRIFT),
+            params.get('volatility', DEFAULT_VOLATILITY),
+            params.get('beta', self.beta),
+        )
+
+    @staticmethod
+    def _factor(symbol):
+        """Stream id of a symbol's own shocks; 0 is the market factor"""
+        return zlib.crc32(symbol.encode()) + 1
+
+    def correlation(self, symbols):
+        """The correlation matrix of the symbols' log returns"""
+        import numpy as np
+
+        betas = np.array([self.params(symbol)[3] for symbol in symbols])
+        correlation = np.outer(betas, betas)
+        np.fill_diagonal(correlation, 1.0)
+        return correlation
+
+    # Standard Brownian paths of the factors, one unit of variance per tick
+
+    def _rng(self, kind, factor, index):
+        import numpy as np
+
+        return np.random.default_rng([self.seed, kind, factor, index])
+
+    def _chunk_starts(self, factor, chunk):
+        """The factor's value at the start of chunks 0..chunk"""
+        import numpy as np
+
+        with self._starts_lock:
+            starts = self._starts.get(factor, np.zeros(1))
+            for block in range((len(starts) - 1) // self.TOTALS_BLOCK, chunk // self.TOTALS_BLOCK + 1):
+                totals = self._rng(_TOTALS, factor, block).standard_normal(self.TOTALS_BLOCK) * math.sqrt(self.CHUNK)
+                # Summed in sequence from the last boundary, so the values do
+                # not depend on how far the cache had been extended
+                totals[0] += starts[-1]
+                starts = np.concatenate([starts, np.cumsum(totals)])
+            self._starts[factor] = starts
+            return starts
+
+    def _compute_bridge(self, factor, chunk):
+        """The factor's path through a chunk, relative to its start: CHUNK + 1 values"""
+        import numpy as np
+
+        starts = self._chunk_starts(factor, chunk + 1)
+        total = starts[chunk + 1] - starts[chunk]
+        walk = np.empty(self.CHUNK + 1)
+        walk[0] = 0.0
+        np.cumsum(self._rng(_WALK, factor, chunk).standard_normal(self.CHUNK), out=walk[1:])
+        # Pin the free walk's end to the chunk total
+        walk -= np.linspace(0.0, 1.0, self.CHUNK + 1) * (walk[-1] - total)
+        walk.flags.writeable = False
+        return walk
+
+    def _factor_path(self, factor, start, steps):
+        import numpy as np
+
+        path = np.empty(steps)
+        filled = 0
+        while filled < steps:
+            tick = start + filled
+            chunk, offset = divmod(tick, self.CHUNK)
+            count = min(self.CHUNK - offset, steps - filled)
+            start_value = self._chunk_starts(factor, chunk)[chunk]
+            path[filled:filled + count] = start_value + self._bridge(factor, chunk)[offset:offset + count]
+            filled += count
+        return path
+
+    # Prices
+
+    def path(self, symbols, start, steps):
+        """
+        Prices of the symbols at ticks start .. start + steps - 1, as an
+        array of shape (steps, len(symbols)).
+        """
+        import numpy as np
+
+        symbols = [symbol.upper() for symbol in symbols]
+        market = self._factor_path(0, start, steps)
+        elapsed = np.arange(start, start + steps) * self.dt
+        prices = np.empty((steps, len(symbols)))
+        for column, symbol in enumerate(symbols):
+            base_price, drift, volatility, beta = self.params(symbol)
+            shocks = beta * market + math.sqrt(1 - beta * beta) * self._factor_path(self._factor(symbol), start, steps)
+            log_price = (drift - volatility * volatility / 2) * elapsed + volatility * math.sqrt(self.dt) * shocks
+            np.exp(log_price, out=prices[:, column])
+            prices[:, column] *= base_price
+        return prices
+
+    def price(self, symbol, when=None):
+        when = when or timezone.now()
+        return float(self.path([symbol], self.tick_at(when), 1)[0, 0])
+
+    def quote(self, symbol, when=None):
+        """
+        A quote in the shape StockService returns: the price at `when`
+        (default now), with the change, high and low since the UTC day's open.
+        """
+        symbol = symbol.upper()
+        when = when or timezone.now()
+        tick = self.tick_at(when)
+        midnight = datetime.combine(when.astimezone(dt_timezone.utc).date(), dt_time.min, tzinfo=dt_timezone.utc)
+        day_start = min(self.tick_at(midnight), tick)
+        day = self.path([symbol], day_start, tick - day_start + 1)[:, 0]
+        price, day_open = round(float(day[-1]), 2), float(day[0])
+        change = round(price - day_open, 2)
+        return {
+            'symbol': symbol,
+            'price': price,
+            'change': change,
+            'percent_change': round(change / day_open * 100, 2),
+            'high': round(float(day.max()), 2),
+            'low': round(float(day.min()), 2),
+            'timestamp': self.time_at(tick).isoformat(),
+        }
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import time
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from .. import instrumentation
+from ..db_router import use_primary
+from ..models import Portfolio
+
+logger = logging.getLogger(__name__)
+
+
+class PageCacheService:
+    """
+    Caches the rendered portfolio pages per user, and fragments of them per
+    portfolio, under version numbers kept in the cache. Everything that
+    changes what the pages show bumps the versions of the portfolios
+    involved and of their owners once its transaction commits: ledger
+    events (trades, cash movements), price changes of held stocks,
+    recomputed valuations and portfolio edits. Entries under old versions
+    are never looked up again and expire after PAGE_CACHE_SECONDS.
+    """
+    KEY_PREFIX = 'pages'
+
+    @classmethod
+    def enabled(cls):
+        return settings.PAGE_CACHE_ENABLED
+
+    @classmethod
+    def timeout(cls):
+        """Fragment timeout for templates; 0 stores nothing when caching is off"""
+        return settings.PAGE_CACHE_SECONDS if cls.enabled() else 0
+
+    @classmethod
+    def _user_key(cls, user_id):
+        return f"{cls.KEY_PREFIX}:version:user:{user_id}"
+
+    @classmethod
+    def _portfolio_key(cls, portfolio_id):
+        return f"{cls.KEY_PREFIX}:version:portfolio:{portfolio_id}"
+
+    @classmethod
+    def versions(cls, user_id, portfolio_id=None):
+        """The user's version, followed by the portfolio's if one is given"""
+        keys = [cls._user_key(user_id)]
+        if portfolio_id is not None:
+            keys.append(cls._portfolio_key(portfolio_id))
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # Start from the clock, so a version evicted from the cache
+                # never comes back with a value that old entries were stored under
+                cache.add(key, time.time_ns(), timeout=None)
+                found[key] = cache.get(key)
+        return tuple(found[key] for key in keys)
+
+    @classmethod
+    def invalidate(cls, portfolio_ids=(), user_ids=()):
+        """Bump the versions of these portfolios and users when the current transaction commits"""
+        keys = [cls._portfolio_key(portfolio_id) for portfolio_id in set(portfolio_ids)]
+        keys += [cls._user_key(user_id) for user_id in set(user_ids)]
+        if keys and cls.enabled():
+            transaction.on_commit(lambda: cls._bump(keys))
+
+    @classmethod
+    def invalidate_portfolios(cls, portfolio_ids):
+        """Bump the versions of these portfolios and of their owners"""
+        portfolio_ids = set(portfolio_ids)
+        if not portfolio_ids or not cls.enabled():
+            return
+        user_ids = Portfolio.objects.filter(pk__in=portfolio_ids).values_list('user_id', flat=True).distinct()
+        cls.invalidate(portfolio_ids, user_ids)
+
+    @classmethod
+    def _bump(cls, keys):
+        version = time.time_ns()
+        try:
+            cache.set_many({key: version for key in keys}, timeout=None)
+        except Exception as e:
+            # The write has committed; the pages catch up when their entries expire
+            logger.warning("Could not invalidate %d cached page versions: %s", len(keys), e)
+
+    @classmethod
+    def page_key(cls, request, page, versions):
+        """
+        Cache key for a page render, or None when this request's render
+        cannot be shared with a later one.
+        """
+        if request.method != 'GET' or request.GET:
+            return None
+        # The page embeds a CSRF token derived from the client's secret; with
+        # no secret yet the render creates one, so there is nothing to reuse
+        csrf_secret = request.META.get('CSRF_COOKIE')
+        if not csrf_secret:
+            return None
+        # Flash messages are shown once, so a page showing them is not reused
+        if len(messages.get_messages(request)):
+            return None
+        csrf_hash = hashlib.sha256(csrf_secret.encode()).hexdigest()[:16]
+        return f"{cls.KEY_PREFIX}:{page}:{request.user.pk}:{':'.join(map(str, versions))}:{csrf_hash}"
+
+    @classmethod
+    def cached_page(cls, request, page, render, portfolio_id=None):
+        """
+        Serve a page from the cache, or call render(versions) and cache the
+        response it returns. render receives the current versions, or None
+        when caching is disabled, to key the fragments it caches on.
+        """
+        if not cls.enabled():
+            return render(None)
+        versions = cls.versions(request.user.pk, portfolio_id)
+        key = cls.page_key(request, page, versions)
+        if key is None:
+            return cls._render(render, versions)
+
+        cached = cache.get(key)
+        instrumentation.record_cache('pages', cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            # Have the CSRF middleware refresh the cookie, as a render would
+            get_token(request)
+            return HttpResponse(content, content_type=content_type)
+
+        response = cls._render(render, versions)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_SECONDS)
+        return response
+
+    @classmethod
+    def _render(cls, render, versions):
+        # What is cached under these versions must include the writes that
+        # bumped them, which a lagging replica may not have applied yet
+        with use_primary():
+            return render(versions)
@@ -12,24 +12,14 @@ class PortfolioService:
         This can be scheduled to run once per day.
         """
         today = date.today()
-        portfolios = Portfolio.objects.all()
-        snapshot_count = 0
+        # Skip portfolios that already have a snapshot for today
+        portfolios = Portfolio.objects.exclude(snapshots__date=today).values_list('id', 'cached_total_value')
         
-        for portfolio in portfolios:
-            # Skip if a snapshot already exists for today
-            if portfolio.snapshots.filter(date=today).exists():
-                continue
-            
-            try:
-                # Create a new snapshot
-                total_value = portfolio.total_value()
-                PortfolioSnapshot.objects.create(
-                    portfolio=portfolio,
-                    date=today,
-                    total_value=total_value
-                )
-                snapshot_count += 1
-            except Exception as e:
-                logger.error(f"Error creating snapshot for portfolio {portfolio.id}: {str(e)}")
+        # Valuations are cached on the portfolio, so no positions need loading
+        snapshots = [
+            PortfolioSnapshot(portfolio_id=portfolio_id, date=today, total_value=total_value)
+            for portfolio_id, total_value in portfolios.iterator()
+        ]
+        PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
         
-        return snapshot_count
\ No newline at end of file
+        return len(snapshots)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from ..models import DailyPrice, Stock, Transaction
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+
+class PriceHistoryService:
+    """
+    Stores daily closing prices and builds day-by-stock price matrices
+    from them for valuing portfolios in the past.
+    """
+    BATCH_SIZE = 5000
+    # How far before a range to look for a price to carry forward
+    LOOKBACK_DAYS = 30
+
+    @classmethod
+    def save_closes(cls, rows):
+        """
+        Upsert (stock_id, date, close) rows. Returns the number written.
+        """
+        prices = [
+            DailyPrice(stock_id=stock_id, date=day, close=Decimal(f"{close:.2f}"))
+            for stock_id, day, close in rows
+        ]
+        DailyPrice.objects.bulk_create(
+            prices,
+            batch_size=cls.BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['stock', 'date'],
+            update_fields=['close'],
+        )
+        return len(prices)
+
+    @classmethod
+    def record_closes(cls, day=None):
+        """
+        Record each stock's last known price as its close for the day. The
+        job runs just after midnight, so the day defaults to yesterday.
+        """
+        day = day or date.today() - timedelta(days=1)
+        rows = Stock.objects.filter(last_price__isnull=False).values_list('id', 'last_price')
+        return cls.save_closes((stock_id, day, float(price)) for stock_id, price in rows)
+
+    @classmethod
+    def load_csv(cls, source):
+        """
+        Load closes from a CSV with date, symbol and close columns.
+        Unknown symbols are created. Returns the number of rows written.
+
+        Raises:
+            ValueError: If columns are missing or a row is malformed.
+        """
+        import pandas as pd
+
+        frame = pd.read_csv(source, dtype={'symbol': 'string'})
+        missing = [column for column in ('date', 'symbol', 'close') if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        frame['date'] = pd.to_datetime(frame['date'], errors='coerce').dt.date
+        frame['symbol'] = frame['symbol'].str.strip().str.upper()
+        frame['close'] = pd.to_numeric(frame['close'], errors='coerce')
+        invalid = frame['date'].isna() | frame['symbol'].isna() | frame['close'].isna() | (frame['close'] < 0)
+        if invalid.any():
+            raise ValueError(f"Row {invalid.to_numpy().argmax() + 2}: invalid date, symbol or close")
+
+        symbols = frame['symbol'].unique().tolist()
+        Stock.objects.bulk_create([
+            Stock(symbol=symbol, company_name=symbol) for symbol in symbols
+        ], ignore_conflicts=True)
+        stock_ids = dict(Stock.objects.filter(symbol__in=symbols).values_list('symbol', 'id'))
+        return cls.save_closes(zip(frame['symbol'].map(stock_ids), frame['date'], frame['close']))
+
+    @classmethod
+    def fetch(cls, symbols, start, end):
+        """Fetch and store closes for the given symbols from the quote provider"""
+        written = 0
+        for stock in Stock.objects.filter(symbol__in=[symbol.upper() for symbol in symbols]):
+            closes = StockService.get_daily_closes(stock.symbol, start, end)
+            written += cls.save_closes((stock.id, day, close) for day, close in closes)
+        return written
+
+    @classmethod
+    def price_matrix(cls, days, stock_ids):
+        """
+        Return a (stocks x days) float array of prices for the given
+        pandas DatetimeIndex of days, rows in stock_ids order.
+
+        Stored closes are used where available, then the volume-weighted
+        price of the day's trades; the last known price is carried forward
+        over weekends and gaps. Prices still unknown are NaN.
+        """
+        import pandas as pd
+
+        first_day = (days[0] - pd.Timedelta(days=cls.LOOKBACK_DAYS)).date()
+        last_day = days[-1].date()
+
+        closes = pd.DataFrame.from_records(
+            DailyPrice.objects.filter(stock_id__in=stock_ids, date__range=(first_day, last_day))
+            .values_list('stock_id', 'date', 'close'),
+            columns=['stock_id', 'day', 'price'],
+        )
+        trades = pd.DataFrame.from_records(
+            Transaction.objects.filter(
+                stock_id__in=stock_ids,
+                transaction_type__in=[Transaction.BUY, Transaction.SELL],
+                timestamp__gte=timezone.make_aware(pd.Timestamp(first_day).to_pydatetime()),
+                timestamp__lt=timezone.make_aware(pd.Timestamp(last_day + timedelta(days=1)).to_pydatetime()),
+            )
+            .annotate(day=TruncDate('timestamp'))
+            .values('stock_id', 'day')
+            .annotate(notional=Sum(F('price') * F('quantity')), shares=Sum('quantity'))
+            .values_list('stock_id', 'day', 'notional', 'shares'),
+            columns=['stock_id', 'day', 'notional', 'shares'],
+        )
+        trades['price'] = trades['notional'].astype(float) / trades['shares'].astype(float)
+
+        calendar = pd.date_range(first_day, last_day, freq='D')
+
+        def pivot(frame):
+            frame = frame.assign(day=pd.to_datetime(frame['day']), price=frame['price'].astype(float))
+            return frame.pivot_table(index='day', columns='stock_id', values='price', aggfunc='last') \
+                .reindex(index=calendar, columns=stock_ids)
+
+        prices = pivot(closes).combine_first(pivot(trades[['stock_id', 'day', 'price']]))
+        prices = prices.reindex(columns=stock_ids).ffill().reindex(days)
+        return prices.to_numpy(dtype=float).T
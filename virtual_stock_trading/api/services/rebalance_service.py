@@ -0,0 +1,212 @@
+import heapq
+import logging
+import math
+from decimal import Decimal
+from django.db import transaction
+from ..models import Portfolio, Position, Stock, Transaction
+from .ledger_service import LedgerService
+from .stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal('0.01')
+
+
+class RebalanceService:
+    """
+    Turns a map of target weights into the smallest basket of orders that
+    brings a portfolio to them in whole shares without overdrawing cash.
+
+    Each stock's target is the whole number of shares closest below its
+    target value. A holding is left alone when it is already within one
+    share above that, or when its weight is within `tolerance` of the
+    target, so no order is placed that does not move a stock toward its
+    target. If what is kept would cost more than the cash available, the
+    most overweight holdings give up one share at a time until it fits.
+    Weights need not add up to 1; the remainder stays in cash.
+    """
+    WEIGHT_PRECISION = Decimal('0.000001')
+
+    @classmethod
+    def solve(cls, holdings, prices, cash, targets, tolerance=0):
+        """
+        Compute target share counts.
+
+        Args:
+            holdings: {symbol: shares held}
+            prices: {symbol: Decimal price} for every held and targeted symbol
+            cash: Decimal cash balance
+            targets: {symbol: target weight of the total value}
+            tolerance: weight drift left untraded
+
+        Returns:
+            {symbol: target shares} for every held and targeted symbol.
+
+        Raises:
+            ValueError: For negative weights, weights adding up to more
+                than 1, or a symbol without a positive price.
+        """
+        try:
+            targets = {symbol: Decimal(str(weight)) for symbol, weight in targets.items()}
+            tolerance = Decimal(str(tolerance))
+            if not tolerance.is_finite() or not all(weight.is_finite() for weight in targets.values()):
+                raise ArithmeticError
+        except ArithmeticError:
+            raise ValueError("Target weights and the tolerance must be finite numbers")
+        if any(weight < 0 for weight in targets.values()):
+            raise ValueError("Target weights cannot be negative")
+        if sum(targets.values()) > 1 + cls.WEIGHT_PRECISION:
+            raise ValueError("Target weights add up to more than 1")
+        symbols = set(holdings) | set(targets)
+        unpriced = sorted(symbol for symbol in symbols if not prices.get(symbol) or prices[symbol] <= 0)
+        if unpriced:
+            raise ValueError(f"No price for: {', '.join(unpriced)}")
+
+        total = cash + sum(holdings[symbol] * prices[symbol] for symbol in holdings)
+        if total <= 0:
+            raise ValueError("The portfolio has no value to rebalance")
+
+        wanted = {}
+        for symbol in symbols:
+            held, price, weight = holdings.get(symbol, 0), prices[symbol], targets.get(symbol, Decimal('0'))
+            target_shares = weight * total / price
+            within_a_share = int(target_shares) <= held <= math.ceil(target_shares)
+            within_tolerance = abs(held * price / total - weight) <= tolerance
+            wanted[symbol] = held if within_a_share or within_tolerance else int(target_shares)
+
+        # Holdings kept above their floor can cost more than there is cash
+        overdraft = sum(wanted[symbol] * prices[symbol] for symbol in symbols) - total
+        if overdraft > 0:
+            overweight = [
+                (targets.get(symbol, 0) * total - wanted[symbol] * prices[symbol], symbol)
+                for symbol in symbols if wanted[symbol] > 0
+            ]
+            heapq.heapify(overweight)
+            while overdraft > 0 and overweight:
+                _, symbol = heapq.heappop(overweight)
+                wanted[symbol] -= 1
+                overdraft -= prices[symbol]
+                if wanted[symbol] > 0:
+                    heapq.heappush(overweight, (targets.get(symbol, 0) * total - wanted[symbol] * prices[symbol], symbol))
+        return wanted
+
+    @classmethod
+    def orders(cls, holdings, wanted, prices):
+        """The sells, then the buys, that take holdings to wanted shares"""
+        orders = []
+        for side, direction in ((Transaction.SELL, -1), (Transaction.BUY, 1)):
+            for symbol in sorted(wanted):
+                quantity = (wanted[symbol] - holdings.get(symbol, 0)) * direction
+                if quantity > 0:
+                    orders.append({
+                        'symbol': symbol,
+                        'side': side,
+                        'quantity': quantity,
+                        'price': prices[symbol],
+                        'amount': prices[symbol] * quantity,
+                    })
+        return orders
+
+    @classmethod
+    def prices(cls, symbols, requote=False):
+        """
+        Last prices of the symbols; symbols without a stored price, or every
+        symbol with requote=True, are quoted. A symbol that cannot be quoted
+        is left out. Returns ({symbol: price}, {symbol: Stock}).
+        """
+        stocks = {} if requote else {stock.symbol: stock for stock in Stock.objects.filter(symbol__in=symbols)}
+        for symbol in symbols:
+            if symbol not in stocks or not stocks[symbol].last_price:
+                stock = StockService.get_stock_data(symbol)
+                if stock is not None:
+                    stocks[symbol] = stock
+        prices = {
+            symbol: Decimal(str(stock.last_price)).quantize(CENTS)
+            for symbol, stock in stocks.items() if stock.last_price
+        }
+        return prices, stocks
+
+    @classmethod
+    def holdings(cls, portfolio):
+        return dict(
+            Position.objects.filter(portfolio=portfolio, quantity__gt=0).values_list('stock__symbol', 'quantity')
+        )
+
+    @classmethod
+    def plan(cls, portfolio, targets, tolerance=0, holdings=None, prices=None):
+        """
+        Preview a rebalance: the orders, and the portfolio's weights before
+        and after. Nothing is traded.
+
+        Raises:
+            ValueError: If the targets are invalid or a price is missing.
+        """
+        targets = {symbol.upper(): weight for symbol, weight in targets.items()}
+        holdings = cls.holdings(portfolio) if holdings is None else holdings
+        if prices is None:
+            prices, _ = cls.prices(sorted(set(holdings) | set(targets)))
+        cash = portfolio.cash_balance
+
+        wanted = cls.solve(holdings, prices, cash, targets, tolerance)
+        orders = cls.orders(holdings, wanted, prices)
+        total = cash + sum(holdings[symbol] * prices[symbol] for symbol in holdings)
+        cash_after = cash + sum(
+            order['amount'] if order['side'] == Transaction.SELL else -order['amount'] for order in orders
+        )
+
+        def weight(value):
+            return (value / total).quantize(cls.WEIGHT_PRECISION)
+
+        return {
+            'total_value': total,
+            'cash_balance': cash,
+            'cash_after': cash_after,
+            'turnover': sum(order['amount'] for order in orders),
+            'orders': orders,
+            'weights': [
+                {
+                    'symbol': symbol,
+                    'current': weight(holdings.get(symbol, 0) * prices[symbol]),
+                    'target': Decimal(str(targets.get(symbol, 0))),
+                    'after': weight(wanted[symbol] * prices[symbol]),
+                    'shares': wanted[symbol],
+                }
+                for symbol in sorted(wanted)
+            ],
+        }
+
+    @classmethod
+    def execute(cls, portfolio, targets, tolerance=0):
+        """
+        Rebalance the portfolio as one database transaction: the plan is
+        recomputed with the portfolio locked and every order is recorded in
+        the ledger, or none is. Returns the plan with the transaction ids.
+
+        Raises:
+            ValueError: If the targets are invalid, a price is missing or
+                an order fails.
+        """
+        symbols = {symbol.upper() for symbol in targets} | set(cls.holdings(portfolio))
+        # Orders are placed at current quotes, fetched before the portfolio
+        # is locked, as TradingService does for single orders
+        prices, stocks = cls.prices(sorted(symbols), requote=True)
+
+        with transaction.atomic():
+            locked = Portfolio.objects.select_for_update().get(pk=portfolio.pk)
+            holdings = cls.holdings(locked)
+            missing = set(holdings) - set(prices)
+            if missing:
+                more_prices, more_stocks = cls.prices(sorted(missing), requote=True)
+                prices.update(more_prices)
+                stocks.update(more_stocks)
+
+            plan = cls.plan(locked, targets, tolerance, holdings=holdings, prices=prices)
+            plan['transactions'] = [
+                LedgerService.record(
+                    locked, order['side'], order['quantity'], order['price'],
+                    stock=stocks[order['symbol']], notes="Rebalance",
+                ).id
+                for order in plan['orders']
+            ]
+        logger.info(f"Rebalanced portfolio {portfolio.pk} with {len(plan['orders'])} orders")
+        return plan
@@ -0,0 +1,191 @@
+import logging
+import math
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from ..models import Portfolio, PortfolioRisk, Position
+from .price_history_service import PriceHistoryService
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal('0.01')
+HORIZONS = (1, 10)
+
+
+class RiskService:
+    """
+    Monte Carlo value at risk of portfolios' positions.
+
+    Daily log returns of the held stocks over the last RISK_LOOKBACK_DAYS
+    trading days give a covariance matrix. Correlated scenarios of the next
+    day's returns are drawn as standard normals times its Cholesky factor
+    (zero mean, as is usual over short horizons) and every portfolio is
+    fully revalued in each scenario; 10-day returns scale the same draws by
+    sqrt(10). Cash carries no risk.
+
+    Portfolios are grouped into batches whose stocks together number at
+    most MAX_SYMBOLS, ordered so portfolios holding the same stocks share a
+    batch, and one scenario matrix is drawn per batch for all of them.
+    Stocks with too little price history are left out and reported.
+    """
+    # A batch's scenarios take RISK_SCENARIOS x MAX_SYMBOLS floats twice
+    # (returns and one horizon's growth), its losses RISK_SCENARIOS x
+    # PORTFOLIO_BLOCK. Requests are capped at MAX_REQUEST_SCENARIOS, about
+    # 100 MB at MAX_SYMBOLS, since they are simulated synchronously.
+    MAX_SYMBOLS = 250
+    PORTFOLIO_BLOCK = 200
+    MAX_REQUEST_SCENARIOS = 25000
+    MIN_OBSERVATIONS = 20
+
+    @classmethod
+    def assess(cls, portfolios, scenarios=None, confidence=None, lookback_days=None, seed=None):
+        """
+        Return {portfolio_id: report} for the given portfolios, where a
+        report has the total value, confidence, scenario count, 1- and
+        10-day VaR and CVaR as positive losses, and the symbols left out
+        for lack of history.
+        """
+        import numpy as np
+
+        scenarios = settings.RISK_SCENARIOS if scenarios is None else scenarios
+        confidence = settings.RISK_CONFIDENCE if confidence is None else confidence
+        lookback_days = settings.RISK_LOOKBACK_DAYS if lookback_days is None else lookback_days
+        if not 0.5 <= confidence < 1:
+            raise ValueError("The confidence must be between 0.5 and 1")
+        if scenarios < 100:
+            raise ValueError("At least 100 scenarios are needed")
+        rng = np.random.default_rng(settings.RISK_SEED if seed is None else seed)
+
+        portfolios = {portfolio.id: portfolio for portfolio in portfolios}
+        holdings = {portfolio_id: {} for portfolio_id in portfolios}
+        symbols = {}
+        for portfolio_id, stock_id, symbol, quantity, price in Position.objects.filter(
+            portfolio_id__in=portfolios, quantity__gt=0,
+        ).values_list('portfolio_id', 'stock_id', 'stock__symbol', 'quantity', 'stock__last_price'):
+            holdings[portfolio_id][stock_id] = quantity * float(price or 0)
+            symbols[stock_id] = symbol
+
+        reports = {}
+        for batch in cls.batches(holdings):
+            stock_ids = sorted({stock_id for portfolio_id in batch for stock_id in holdings[portfolio_id]})
+            factor, missing = cls.covariance_factor(stock_ids, lookback_days)
+            values = np.array([[holdings[portfolio_id].get(stock_id, 0.0) for stock_id in stock_ids]
+                               for portfolio_id in batch])
+            values[:, missing] = 0.0
+            risk = cls.simulate(values, factor, scenarios, confidence, rng)
+
+            for row, portfolio_id in enumerate(batch):
+                portfolio = portfolios[portfolio_id]
+                reports[portfolio_id] = {
+                    'total_value': float(portfolio.cash_balance) + sum(holdings[portfolio_id].values()),
+                    'confidence': confidence,
+                    'scenarios': scenarios,
+                    **{key: float(losses[row]) for key, losses in risk.items()},
+                    'missing_history': sorted(
+                        symbols[stock_ids[column]] for column in np.flatnonzero(missing)
+                        if stock_ids[column] in holdings[portfolio_id]
+                    ),
+                }
+        return reports
+
+    @classmethod
+    def batches(cls, holdings):
+        """
+        Group portfolio ids so each group's stocks number at most MAX_SYMBOLS.
+        Portfolios are taken in order of their holdings, so those holding the
+        same stocks end up next to each other.
+        """
+        batches, batch, batch_stocks = [], [], set()
+        for portfolio_id in sorted(holdings, key=lambda portfolio_id: sorted(holdings[portfolio_id])):
+            stocks = set(holdings[portfolio_id])
+            if batch and len(batch_stocks | stocks) > cls.MAX_SYMBOLS:
+                batches.append(batch)
+                batch, batch_stocks = [], set()
+            batch.append(portfolio_id)
+            batch_stocks |= stocks
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @classmethod
+    def covariance_factor(cls, stock_ids, lookback_days):
+        """
+        Return (factor, missing): a matrix whose product with its transpose
+        is the covariance of the stocks' daily log returns, and a boolean
+        mask of the stocks with fewer than MIN_OBSERVATIONS returns, whose
+        rows and columns are zero.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not stock_ids:
+            return np.zeros((0, 0)), np.zeros(0, dtype=bool)
+        end = date.today()
+        # Trading days only: prices carried over weekends would add zero returns
+        days = pd.bdate_range(end - timedelta(days=math.ceil(lookback_days * 7 / 5)), end)[-lookback_days - 1:]
+        prices = PriceHistoryService.price_matrix(days, stock_ids).T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = np.diff(np.log(np.where(prices > 0, prices, np.nan)), axis=0)
+        observed = ~np.isnan(returns)
+        missing = observed.sum(axis=0) < cls.MIN_OBSERVATIONS
+
+        observed[:, missing] = False
+        counts = observed.sum(axis=0)
+        means = np.where(observed, returns, 0.0).sum(axis=0) / np.maximum(counts, 1)
+        demeaned = np.where(observed, returns - means, 0.0)
+        # Each pair of stocks over the days both have returns for
+        pairs = observed.T.astype(float) @ observed
+        covariance = demeaned.T @ demeaned / np.maximum(pairs - 1, 1)
+        try:
+            return np.linalg.cholesky(covariance + np.eye(len(stock_ids)) * 1e-12), missing
+        except np.linalg.LinAlgError:
+            # Not positive definite (e.g. identical price series): factor from
+            # the eigendecomposition with negative eigenvalues clipped
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+            return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None)), missing
+
+    @classmethod
+    def simulate(cls, values, factor, scenarios, confidence, rng):
+        """
+        Return {'var_1d', 'cvar_1d', 'var_10d', 'cvar_10d'}, each an array
+        of one loss per row of `values` (portfolios x stocks, market values).
+        """
+        import numpy as np
+
+        returns = rng.standard_normal((scenarios, values.shape[1])) @ factor.T
+        tail = math.ceil(confidence * scenarios) - 1
+        risk = {f'{measure}_{horizon}d': np.empty(len(values)) for measure in ('var', 'cvar') for horizon in HORIZONS}
+        # One horizon's growth at a time, in place, keeps a single extra scenario matrix alive
+        growth = np.empty_like(returns)
+        for horizon in HORIZONS:
+            np.expm1(np.multiply(returns, math.sqrt(horizon), out=growth), out=growth)
+            for start in range(0, len(values), cls.PORTFOLIO_BLOCK):
+                block = slice(start, start + cls.PORTFOLIO_BLOCK)
+                losses = -(growth @ values[block].T)
+                losses.sort(axis=0)
+                risk[f'var_{horizon}d'][block] = np.maximum(losses[tail], 0.0)
+                risk[f'cvar_{horizon}d'][block] = np.maximum(losses[tail:].mean(axis=0), 0.0)
+        return risk
+
+    @classmethod
+    def record_all(cls, day=None):
+        """Assess every portfolio with positions and store the reports for the day"""
+        day = day or date.today()
+        started = time.perf_counter()
+        portfolios = Portfolio.objects.filter(positions__quantity__gt=0).distinct()
+        reports = cls.assess(portfolios)
+        PortfolioRisk.objects.bulk_create([
+            PortfolioRisk(
+                portfolio_id=portfolio_id,
+                date=day,
+                total_value=Decimal(report['total_value']).quantize(CENTS),
+                confidence=Decimal(str(report['confidence'])),
+                scenarios=report['scenarios'],
+                **{key: Decimal(report[key]).quantize(CENTS) for key in ('var_1d', 'cvar_1d', 'var_10d', 'cvar_10d')},
+            )
+            for portfolio_id, report in reports.items()
+        ], batch_size=1000, update_conflicts=True, unique_fields=['portfolio', 'date'],
+            update_fields=['total_value', 'confidence', 'scenarios', 'var_1d', 'cvar_1d', 'var_10d', 'cvar_10d'])
+        logger.info(f"Recorded risk for {len(reports)} portfolios in {time.perf_counter() - started:.1f}s")
+        return len(reports)
@@ -1,23 +1,26 @@
-import os
 import requests
 import logging
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta, datetime
 from ..models import Stock
-from dotenv import load_dotenv
-import random
+from .valuation_service import ValuationService
+from .market_simulator import MarketSimulator
 import json
-from decimal import Decimal
-
-# Load environment variables
-load_dotenv()
+import time
+from .. import instrumentation
 
 logger = logging.getLogger(__name__)
+# Search and quote events fire on every keystroke and page load; settings
+# samples these two loggers. Messages use lazy %-formatting so dropped or
+# filtered records are never formatted.
+search_logger = logging.getLogger('api.search')
+quote_logger = logging.getLogger('api.quotes')
 
 class StockService:
     # Finnhub API configuration
     FINNHUB_BASE_URL = "https://finnhub.io/api/v1"
-    FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
+    FINNHUB_API_KEY = settings.FINNHUB_API_KEY
     
     # Mock data for development/testing or when API fails
     MOCK_STOCKS = {
@@ -36,6 +39,25 @@ class StockService:
         'IBM': {'symbol': 'IBM', 'name': 'International Business Machines', 'type': 'Equity', 'region': 'United States', 'base_price': 175.30}
     }
     
+    # Annualised volatility and market beta of the simulated mock prices;
+    # other symbols use the simulator's defaults
+    MOCK_MARKET = {
+        'AAPL': {'volatility': 0.25, 'beta': 0.7},
+        'MSFT': {'volatility': 0.24, 'beta': 0.7},
+        'GOOGL': {'volatility': 0.28, 'beta': 0.65},
+        'AMZN': {'volatility': 0.32, 'beta': 0.65},
+        'TSLA': {'volatility': 0.55, 'beta': 0.5},
+        'META': {'volatility': 0.35, 'beta': 0.6},
+        'FB': {'volatility': 0.35, 'beta': 0.6},
+        'NVDA': {'volatility': 0.5, 'beta': 0.6},
+        'JPM': {'volatility': 0.22, 'beta': 0.6},
+        'V': {'volatility': 0.2, 'beta': 0.6},
+        'JNJ': {'volatility': 0.15, 'beta': 0.4},
+        'WMT': {'volatility': 0.18, 'beta': 0.4},
+        'IBM': {'volatility': 0.22, 'beta': 0.5},
+    }
+    _simulator = None
+    
     # Common search terms mapped to ticker symbols
     SEARCH_ALIASES = {
         'NVIDIA': 'NVDA',
@@ -47,18 +69,47 @@ class StockService:
         'TESLA': 'TSLA',
     }
 
+    @classmethod
+    def simulator(cls):
+        """The market simulator that serves mock prices"""
+        if cls._simulator is None:
+            cls._simulator = MarketSimulator.from_settings({
+                symbol: {'base_price': data['base_price'], **cls.MOCK_MARKET.get(symbol, {})}
+                for symbol, data in cls.MOCK_STOCKS.items()
+            })
+        return cls._simulator
+
     @classmethod
     def use_mock_data(cls):
         """Determine whether to use mock data or real API"""
         # Use mock data if no API key or in testing mode
-        return not cls.FINNHUB_API_KEY or os.getenv('USE_MOCK_DATA', 'False').lower() == 'true'
+        return not cls.FINNHUB_API_KEY or settings.USE_MOCK_DATA
+
+    @classmethod
+    def _finnhub_get(cls, endpoint, params, timeout=None):
+        """
+        GET a Finnhub endpoint with the API key added. Every call is timed
+        and reported to the request instrumentation, whatever its outcome.
+        """
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = requests.get(
+                f"{cls.FINNHUB_BASE_URL}/{endpoint}",
+                params={**params, 'token': cls.FINNHUB_API_KEY},
+                timeout=timeout,
+            )
+            ok = response.ok
+            return response
+        finally:
+            instrumentation.record_upstream('finnhub', endpoint, time.perf_counter() - started, ok)
 
     @classmethod
     def search_stocks(cls, query):
         """
         Search for stocks using Finnhub API with fallback to mock data
         """
-        print(f"StockService.search_stocks called with query: {query}")
+        search_logger.debug("Stock search for %r", query)
         
         if not query:
             return {"results": []}
@@ -69,13 +120,7 @@ class StockService:
             
         try:
             # Make API request to Finnhub search endpoint
-            url = f"{cls.FINNHUB_BASE_URL}/search"
-            params = {
-                'q': query,
-                'token': cls.FINNHUB_API_KEY
-            }
-            
-            response = requests.get(url, params=params)
+            response = cls._finnhub_get('search', {'q': query})
             data = response.json()
             
             # Check if we got valid results
@@ -91,23 +136,20 @@ class StockService:
                             'region': item.get('exchange', 'United States')
                         })
                 
-                print(f"Finnhub API returned {len(results)} results for '{query}'")
+                search_logger.info("Finnhub returned %d results for %r", len(results), query)
                 return {"results": results[:10]}  # Limit to 10 results
             else:
-                print(f"No results from Finnhub for '{query}', falling back to mock data")
+                search_logger.info("No results from Finnhub for %r, falling back to mock data", query)
                 return cls._mock_search_stocks(query)
                 
         except Exception as e:
-            print(f"Error in Finnhub search: {str(e)}")
-            logger.exception(f"Finnhub API error: {str(e)}")
+            logger.exception("Finnhub search error: %s", e)
             # Fall back to mock data
             return cls._mock_search_stocks(query)
 
     @classmethod
     def _mock_search_stocks(cls, query):
         """Search for stocks using mock data"""
-        print(f"Using mock data search for '{query}'")
-        
         # Normalize the query
         query = query.strip().upper()
         results = []
@@ -131,7 +173,7 @@ class StockService:
                 elif query.lower() in data['name'].lower():
                     results.append(data)
         
-        print(f"Mock data returned {len(results)} results for query '{query}'")
+        search_logger.info("Mock data returned %d results for %r", len(results), query)
         return {"results": results}
 
     @classmethod
@@ -147,13 +189,7 @@ class StockService:
             
         try:
             # Make API request to Finnhub quote endpoint
-            url = f"{cls.FINNHUB_BASE_URL}/quote"
-            params = {
-                'symbol': symbol,
-                'token': cls.FINNHUB_API_KEY
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
+            response = cls._finnhub_get('quote', {'symbol': symbol}, timeout=5)
             data = response.json()
             
             # Check if we got valid results
@@ -169,53 +205,73 @@ class StockService:
                     'timestamp': datetime.fromtimestamp(data['t']).isoformat() 
                 }
             else:
-                print(f"No valid price data from Finnhub for {symbol}, using mock data")
+                quote_logger.info("No valid price data from Finnhub for %s, using mock data", symbol)
                 return cls._mock_stock_price(symbol)
                 
         except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            # Return mock data on connection error
-            price = Decimal(random.uniform(50, 500)).quantize(Decimal('0.01'))
-            print(f"Error connecting to Finnhub API for {symbol}: {e}")
-            return {
-                'symbol': symbol,
-                'price': float(price),
-                'change': float(Decimal(random.uniform(-5, 5)).quantize(Decimal('0.01'))),
-                'change_percent': float(Decimal(random.uniform(-3, 3)).quantize(Decimal('0.01'))),
-                'updated_at': datetime.now().isoformat()
-            }
+            logger.warning("Error connecting to Finnhub for %s: %s", symbol, e)
+            return cls._mock_stock_price(symbol)
         except Exception as e:
-            print(f"Error getting Finnhub price for {symbol}: {str(e)}")
-            logger.exception(f"Finnhub API error for {symbol}: {str(e)}")
+            logger.exception("Finnhub quote error for %s: %s", symbol, e)
             # Fall back to mock data
             return cls._mock_stock_price(symbol)
 
     @classmethod
-    def _mock_stock_price(cls, symbol):
-        """Generate mock stock price data"""
-        # Get the base price for this stock, or use a default
-        stock_data = cls.MOCK_STOCKS.get(symbol, None)
-        if stock_data:
-            base_price = stock_data.get('base_price', 100.0)
-        else:
-            base_price = 100.0
-        
-        # Add some random variation (±2%)
-        variation = base_price * random.uniform(-0.02, 0.02)
-        price = round(base_price + variation, 2)
+    def get_daily_closes(cls, symbol, start, end):
+        """
+        Get daily closing prices between two dates from the Finnhub candle API.
+        Returns a list of (date, close) tuples, empty if none are available.
+        """
+        symbol = symbol.upper()
+        if cls.use_mock_data():
+            return []
+
+        try:
+            params = {
+                'symbol': symbol,
+                'resolution': 'D',
+                'from': int(datetime.combine(start, datetime.min.time()).timestamp()),
+                'to': int(datetime.combine(end, datetime.max.time()).timestamp()),
+            }
+
+            response = cls._finnhub_get('stock/candle', params, timeout=10)
+            data = response.json()
+
+            if data.get('s') != 'ok':
+                logger.warning(f"No daily closes from Finnhub for {symbol}: {data.get('s')}")
+                return []
+            return [
+                (datetime.utcfromtimestamp(timestamp).date(), close)
+                for timestamp, close in zip(data['t'], data['c'])
+            ]
+        except Exception as e:
+            logger.exception(f"Finnhub candle API error for {symbol}: {str(e)}")
+            return []
+
+    @classmethod
+    def get_stock_data(cls, symbol):
+        """
+        Refresh the stored Stock record for a symbol from the current quote.
+        Holders of the stock are repriced through ValuationService.
+        Returns the Stock object, or None if no price could be fetched.
+        """
+        symbol = symbol.upper()
+        price_data = cls.get_stock_price(symbol)
+        if not price_data or not price_data.get('price'):
+            return None
         
-        # Generate mock change and percentage
-        change = round(random.uniform(-5, 5), 2)
-        percent_change = round(change / base_price * 100, 2)
+        stock = Stock.objects.filter(symbol=symbol).first()
+        if stock is None:
+            stock_info = cls.MOCK_STOCKS.get(symbol, {})
+            stock = Stock(symbol=symbol, company_name=stock_info.get('name', symbol))
         
-        return {
-            'symbol': symbol,
-            'price': price,
-            'change': change,
-            'percent_change': percent_change,
-            'high': round(price + random.uniform(0, 3), 2),
-            'low': round(price - random.uniform(0, 3), 2),
-            'timestamp': datetime.now().isoformat()
-        }
+        ValuationService.reprice(stock, price_data['price'])
+        return stock
+
+    @classmethod
+    def _mock_stock_price(cls, symbol):
+        """The simulated market's current quote for a symbol"""
+        return cls.simulator().quote(symbol)
 
     @classmethod
     def get_company_info(cls, symbol):
@@ -230,13 +286,7 @@ class StockService:
             
         try:
             # Make API request to Finnhub company profile endpoint
-            url = f"{cls.FINNHUB_BASE_URL}/stock/profile2"
-            params = {
-                'symbol': symbol,
-                'token': cls.FINNHUB_API_KEY
-            }
-            
-            response = requests.get(url, params=params)
+            response = cls._finnhub_get('stock/profile2', {'symbol': symbol})
             data = response.json()
             
             # Check if we got valid results
@@ -252,12 +302,11 @@ class StockService:
                     'country': data.get('country', '')
                 }
             else:
-                print(f"No company info from Finnhub for {symbol}, using mock data")
+                logger.info("No company info from Finnhub for %s, using mock data", symbol)
                 return cls._mock_company_info(symbol)
                 
         except Exception as e:
-            print(f"Error getting Finnhub company info for {symbol}: {str(e)}")
-            logger.exception(f"Finnhub API error for {symbol}: {str(e)}")
+            logger.exception("Finnhub company info error for %s: %s", symbol, e)
             # Fall back to mock data
             return cls._mock_company_info(symbol)
 
@@ -0,0 +1,109 @@
+import itertools
+import logging
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from .backtest_service import STRATEGIES, Backtester, PriceHistory
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _init_worker
+_worker = {}
+
+
+def _init_worker(directory, dates, symbols, backtester):
+    """Open the shared price arrays read-only; pages are shared through the OS page cache"""
+    import numpy as np
+
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        for name in ('close', 'open', 'volume')
+        if os.path.exists(os.path.join(directory, f"{name}.npy"))
+    }
+    _worker['history'] = PriceHistory(dates, symbols, **arrays)
+    _worker['backtester'] = backtester
+
+
+def _run_batch(strategy, batch):
+    """Backtest one batch of parameter combinations in a worker"""
+    results = []
+    for params in batch:
+        try:
+            result = _worker['backtester'].run(_worker['history'], STRATEGIES[strategy](**params))
+            results.append({'params': params, 'stats': result.stats()})
+        except (TypeError, ValueError) as e:
+            results.append({'params': params, 'error': str(e)})
+    return results
+
+
+class ParameterSweep:
+    """
+    Backtests a built-in strategy for every combination of parameters in
+    `grid` (name -> list of values) on a pool of worker processes.
+
+    The price history is written once to .npy files that every worker
+    memory-maps read-only, so it is neither pickled per task nor copied
+    per worker. Combinations are sent in batches; run() yields each
+    result as soon as its batch finishes, in completion order. Breaking
+    out of run() or calling cancel() (from any thread) drops the batches
+    that have not started; running batches are allowed to finish.
+    """
+
+    def __init__(self, history, strategy, grid, initial_cash=100000.0, commission=None, slippage=None,
+                 workers=None, batch_size=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}. Choose from {', '.join(sorted(STRATEGIES))}")
+        self.history = history
+        self.strategy = strategy
+        self.combinations = self.expand(grid)
+        self.backtester = Backtester(initial_cash, commission, slippage)
+        self.workers = workers or os.cpu_count() or 1
+        # A few batches per worker balance the load and keep results flowing
+        self.batch_size = batch_size or max(1, math.ceil(len(self.combinations) / (self.workers * 4)))
+        self._cancelled = threading.Event()
+
+    @staticmethod
+    def expand(grid):
+        """Every combination of the grid's values, as a list of dicts"""
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _share(self, directory):
+        import numpy as np
+
+        for name in ('close', 'open', 'volume'):
+            values = getattr(self.history, name)
+            if values is not None:
+                np.save(os.path.join(directory, f"{name}.npy"), values)
+
+    def run(self):
+        batches = [
+            self.combinations[offset:offset + self.batch_size]
+            for offset in range(0, len(self.combinations), self.batch_size)
+        ]
+        with tempfile.TemporaryDirectory(prefix='sweep-') as directory:
+            self._share(directory)
+            executor = ProcessPoolExecutor(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(directory, self.history.dates, self.history.symbols, self.backtester),
+            )
+            try:
+                pending = {executor.submit(_run_batch, self.strategy, batch) for batch in batches}
+                while pending and not self.cancelled:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                if pending:
+                    logger.info(f"Parameter sweep cancelled with {len(pending)} batches left")
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
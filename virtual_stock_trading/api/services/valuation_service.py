@@ -0,0 +1,187 @@
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Portfolio, Position, Stock
+from .holdings_index import HoldingsIndex
+from .leaderboard_service import LeaderboardService
+from .page_cache import PageCacheService
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+CENTS = Decimal('0.01')
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+class ValuationService:
+    """
+    Keeps the denormalized valuation columns on Portfolio in step with trades
+    and price changes, so reads never have to walk the positions. Price
+    changes fan out through the HoldingsIndex to the affected portfolios only
+    when the index is shared by every process; otherwise the holders are
+    found by joining Position.
+    """
+
+    # Drift below this amount is treated as rounding noise by the checker
+    DRIFT_TOLERANCE = Decimal('0.01')
+
+    # Number of portfolios repriced per UPDATE statement
+    REPRICE_BATCH_SIZE = 500
+
+    @classmethod
+    def apply_position_change(cls, portfolio, stock, quantity_delta):
+        """
+        Adjust a portfolio's cached valuation and the holdings index after a
+        trade changed its holding of stock by quantity_delta shares
+        (negative for sells).
+        """
+        # A rolled-back trade must not move the index
+        transaction.on_commit(lambda: HoldingsIndex.adjust(stock.symbol, portfolio.pk, quantity_delta))
+        if not quantity_delta or not stock.last_price:
+            return
+        value_delta = stock.last_price * quantity_delta
+        Portfolio.objects.filter(pk=portfolio.pk).update(
+            cached_stock_value=F('cached_stock_value') + value_delta,
+            cached_total_value=F('cash_balance') + F('cached_stock_value') + value_delta,
+            last_repriced_at=timezone.now(),
+        )
+
+    @classmethod
+    def reprice(cls, stock, new_price, updated_at=None):
+        """
+        Record a new price for a stock and move the cached valuation of every
+        portfolio holding it by quantity * price change.
+
+        Returns the number of portfolios that were repriced.
+        """
+        new_price = Decimal(str(new_price)).quantize(CENTS)
+        if stock.pk is None:
+            stock.last_price = new_price
+            stock.last_updated = updated_at or timezone.now()
+            stock.save()
+            return 0
+        with transaction.atomic():
+            # Concurrent quotes for the stock apply one at a time, each moving
+            # the holders from the price the previous one stored
+            old_price = Stock.objects.select_for_update().values_list('last_price', flat=True).get(pk=stock.pk)
+            stock.last_price = new_price
+            stock.last_updated = updated_at or timezone.now()
+            stock.save(update_fields=['last_price', 'last_updated'])
+            price_delta = new_price - (old_price or ZERO)
+            if not price_delta:
+                return 0
+            return cls._fan_out(stock, price_delta)
+
+    @classmethod
+    def _fan_out(cls, stock, price_delta):
+        """Move every holder's cached valuation by its quantity * price_delta"""
+        if HoldingsIndex.shared():
+            holder_ids, repriced = cls._reprice_indexed(stock, price_delta)
+        else:
+            # A per-process index misses positions opened by other processes
+            holder_ids = list(
+                Position.objects.filter(stock=stock, quantity__gt=0).values_list('portfolio_id', flat=True)
+            )
+            holding = Position.objects.filter(portfolio=OuterRef('pk'), stock=stock).values('quantity')[:1]
+            value_delta = ExpressionWrapper(Subquery(holding) * Value(price_delta), output_field=MONEY)
+            repriced = Portfolio.objects.filter(positions__stock=stock, positions__quantity__gt=0).update(
+                cached_stock_value=F('cached_stock_value') + value_delta,
+                cached_total_value=F('cash_balance') + F('cached_stock_value') + value_delta,
+                last_repriced_at=stock.last_updated,
+            )
+        PageCacheService.invalidate_portfolios(holder_ids)
+        LeaderboardService.update(holder_ids)
+        logger.debug(f"Repriced {repriced} portfolios holding {stock.symbol}")
+        return repriced
+
+    @classmethod
+    def _reprice_indexed(cls, stock, price_delta):
+        """Reprice the holders listed in the shared index; returns (holder ids, portfolios updated)"""
+        holders = list(HoldingsIndex.holders(stock.symbol).items())
+        repriced = 0
+        for start in range(0, len(holders), cls.REPRICE_BATCH_SIZE):
+            batch = holders[start:start + cls.REPRICE_BATCH_SIZE]
+            value_delta = Case(
+                *[When(pk=portfolio_id, then=Value(quantity * price_delta)) for portfolio_id, quantity in batch],
+                output_field=MONEY,
+            )
+            repriced += Portfolio.objects.filter(pk__in=[portfolio_id for portfolio_id, _ in batch]).update(
+                cached_stock_value=F('cached_stock_value') + value_delta,
+                cached_total_value=F('cash_balance') + F('cached_stock_value') + value_delta,
+                last_repriced_at=stock.last_updated,
+            )
+        return [portfolio_id for portfolio_id, _ in holders], repriced
+
+    @classmethod
+    def with_computed_stock_value(cls, queryset=None):
+        """Annotate portfolios with their stock value computed from positions"""
+        if queryset is None:
+            queryset = Portfolio.objects.all()
+        position_value = ExpressionWrapper(
+            F('positions__quantity') * F('positions__stock__last_price'), output_field=MONEY
+        )
+        return queryset.annotate(
+            computed_stock_value=Coalesce(Sum(position_value), Value(ZERO), output_field=MONEY)
+        )
+
+    @classmethod
+    def recompute(cls, portfolio):
+        """Recompute a portfolio's cached valuation from its positions"""
+        computed = cls._recompute(portfolio.pk)
+        portfolio.refresh_from_db(fields=Portfolio.VALUATION_FIELDS)
+        PageCacheService.invalidate_portfolios([portfolio.pk])
+        LeaderboardService.update([portfolio.pk])
+        return computed
+
+    @classmethod
+    def _recompute(cls, portfolio_id):
+        """Recompute and store a portfolio's stock value with its row locked; None if it is gone"""
+        with transaction.atomic():
+            # Trades hold this lock and a reprice's UPDATE waits for it, so
+            # nothing lands between reading the positions and the write
+            if not Portfolio.objects.select_for_update().filter(pk=portfolio_id).values_list('pk', flat=True):
+                return None
+            computed = cls.with_computed_stock_value(
+                Portfolio.objects.filter(pk=portfolio_id)
+            ).values_list('computed_stock_value', flat=True).get().quantize(CENTS)
+            Portfolio.objects.filter(pk=portfolio_id).update(
+                cached_stock_value=computed,
+                cached_total_value=F('cash_balance') + computed,
+                last_repriced_at=timezone.now(),
+            )
+        return computed
+
+    @classmethod
+    def check_consistency(cls, fix=False):
+        """
+        Compare every portfolio's cached valuation against a full recompute.
+
+        Returns a list of (portfolio_id, cached, computed) tuples for the
+        portfolios that drifted; with fix=True they are also recomputed,
+        each under its row lock.
+        """
+        drifted = []
+        corrections = []
+        rows = cls.with_computed_stock_value().values_list(
+            'id', 'cash_balance', 'cached_stock_value', 'cached_total_value', 'computed_stock_value'
+        )
+        for portfolio_id, cash, cached_stock, cached_total, computed in rows.iterator():
+            computed = computed.quantize(CENTS)
+            if (abs(cached_stock - computed) >= cls.DRIFT_TOLERANCE
+                    or abs(cached_total - (cash + computed)) >= cls.DRIFT_TOLERANCE):
+                drifted.append((portfolio_id, cached_total, cash + computed))
+                logger.warning(
+                    f"Valuation drift on portfolio {portfolio_id}: "
+                    f"cached {cached_total}, computed {cash + computed}"
+                )
+                corrections.append(portfolio_id)
+
+        if fix:
+            for portfolio_id in corrections:
+                cls._recompute(portfolio_id)
+            PageCacheService.invalidate_portfolios(corrections)
+            LeaderboardService.update(corrections)
+        return drifted
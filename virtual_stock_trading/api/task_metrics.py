@@ -0,0 +1,107 @@
+"""
+Per-queue Celery task metrics: tasks run by outcome, run time and the time
+tasks waited in their queue before a worker started them.
+
+Celery's prefork pool runs tasks in child processes that serve no HTTP, so
+unlike the request metrics these are not kept in the process. Workers add
+them to the shared cache (set CACHE_URL) and /metrics reads them from
+there. Only the tasks routed in CELERY_TASK_ROUTES are tracked.
+"""
+import logging
+import math
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import DEFAULT_BUCKETS, _format_labels, _format_value
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'taskmetrics'
+# Tasks run from well under a second (quotes) to many minutes (snapshots)
+RUNTIME_BUCKETS = DEFAULT_BUCKETS + (30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+WAIT_BUCKETS = DEFAULT_BUCKETS + (30.0, 60.0, 300.0)
+OUTCOMES = ('success', 'failure', 'retry')
+# Sums are stored as integer microseconds so cache.incr can add them
+SCALE = 1_000_000
+
+HISTOGRAMS = {
+    'celery_task_runtime_seconds': ('Task run time by queue and task', RUNTIME_BUCKETS),
+    'celery_task_queue_wait_seconds': ('Time from publishing to a worker starting the task', WAIT_BUCKETS),
+}
+
+
+def tracked_tasks():
+    """(queue, task name) for every routed task"""
+    return sorted((route['queue'], name) for name, route in settings.CELERY_TASK_ROUTES.items())
+
+
+def queue_for(task_name):
+    route = settings.CELERY_TASK_ROUTES.get(task_name)
+    return route['queue'] if route else None
+
+
+def _key(*parts):
+    return ':'.join((KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+
+def _incr(key, amount=1):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # First observation for this key; a concurrent add() may win the race
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+
+
+def _observe(metric, queue, task, seconds):
+    buckets = HISTOGRAMS[metric][1]
+    bound = next((bound for bound in buckets if seconds <= bound), math.inf)
+    _incr(_key(metric, queue, task, 'bucket', bound))
+    _incr(_key(metric, queue, task, 'sum'), round(seconds * SCALE))
+
+
+def record(task_name, outcome, runtime=None, wait=None):
+    """Record one finished task run; a cache failure must never fail the task"""
+    queue = queue_for(task_name)
+    if queue is None:
+        return
+    try:
+        _incr(_key('celery_tasks', queue, task_name, outcome))
+        if runtime is not None:
+            _observe('celery_task_runtime_seconds', queue, task_name, runtime)
+        if wait is not None:
+            _observe('celery_task_queue_wait_seconds', queue, task_name, max(wait, 0.0))
+    except Exception as e:
+        logger.warning("Could not record metrics for task %s: %s", task_name, e)
+
+
+def render():
+    """The task metrics in the Prometheus text format"""
+    tasks = tracked_tasks()
+    keys = []
+    for queue, task in tasks:
+        keys += [_key('celery_tasks', queue, task, outcome) for outcome in OUTCOMES]
+        for metric, (_, buckets) in HISTOGRAMS.items():
+            keys += [_key(metric, queue, task, 'bucket', bound) for bound in buckets + (math.inf,)]
+            keys.append(_key(metric, queue, task, 'sum'))
+    values = cache.get_many(keys)
+    labels = ('queue', 'task')
+
+    lines = ["# HELP celery_tasks_total Tasks run by queue, task and outcome", "# TYPE celery_tasks_total counter"]
+    for queue, task in tasks:
+        for outcome in OUTCOMES:
+            count = values.get(_key('celery_tasks', queue, task, outcome), 0)
+            lines.append(f"celery_tasks_total{_format_labels(labels + ('outcome',), (queue, task, outcome))} "
+                         f"{_format_value(count)}")
+
+    for metric, (documentation, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} histogram"]
+        for queue, task in tasks:
+            cumulative = 0
+            for bound in buckets + (math.inf,):
+                cumulative += values.get(_key(metric, queue, task, 'bucket', bound), 0)
+                lines.append(f"{metric}_bucket{_format_labels(labels, (queue, task), [('le', _format_value(bound))])} "
+                             f"{cumulative}")
+            total = values.get(_key(metric, queue, task, 'sum'), 0) / SCALE
+            lines.append(f"{metric}_sum{_format_labels(labels, (queue, task))} {_format_value(total)}")
+            lines.append(f"{metric}_count{_format_labels(labels, (queue, task))} {cumulative}")
+    return '\n'.join(lines) + '\n'
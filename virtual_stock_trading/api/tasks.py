@@ -1,18 +1,136 @@
 from celery import shared_task
+from .models import Portfolio, Stock, Transaction
 from .services.portfolio_service import PortfolioService
+from .services.valuation_service import ValuationService
+from .services.holdings_index import HoldingsIndex
+from .services.leaderboard_service import LeaderboardService
+from .services.ledger_service import LedgerService
+from .services.price_history_service import PriceHistoryService
+from .services.backfill_service import SnapshotBackfillService
+from .services.risk_service import RiskService
+from .services.stock_service import StockService
+from .services.trading_service import TradingService
+from .db_router import use_replica
+from datetime import date, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
-@shared_task
+# Queues are assigned in settings.CELERY_TASK_ROUTES. Jobs that can safely
+# run twice are acked only after they finish (acks_late), so a job lost with
+# its worker is redelivered; order execution is acked on receipt instead.
+# Soft time limits raise SoftTimeLimitExceeded in the task, hard limits
+# kill the worker process.
+
+@shared_task(acks_late=True, soft_time_limit=120, time_limit=150)
+def refresh_stock_prices(symbols=None):
+    """
+    Celery task to refresh the quotes of the given symbols, or of every
+    held stock, repricing the portfolios that hold them.
+    """
+    if symbols is None:
+        symbols = Stock.objects.filter(positions__isnull=False).distinct().values_list('symbol', flat=True)
+    refreshed = sum(1 for symbol in symbols if StockService.get_stock_data(symbol) is not None)
+    logger.info(f"Refreshed {refreshed} stock prices")
+    return refreshed
+
+
+@shared_task(soft_time_limit=20, time_limit=30)
+def execute_order(portfolio_id, stock_symbol, transaction_type, quantity):
+    """
+    Celery task to execute a market order at the current price.
+    Returns the id of the recorded transaction.
+    """
+    portfolio = Portfolio.objects.get(pk=portfolio_id)
+    if transaction_type == Transaction.BUY:
+        return TradingService.execute_buy(portfolio, stock_symbol, quantity).id
+    if transaction_type == Transaction.SELL:
+        return TradingService.execute_sell(portfolio, stock_symbol, quantity).id
+    raise ValueError(f"Unsupported order type: {transaction_type}")
+
+
+@shared_task(acks_late=True, soft_time_limit=50 * 60, time_limit=55 * 60)
 def create_daily_portfolio_snapshots():
     """
     Celery task to create daily snapshots of all portfolios.
+    Reads come from a replica when one is configured.
     """
     try:
-        snapshot_count = PortfolioService.create_daily_snapshots()
+        with use_replica(read_your_writes=False):
+            # The last prices become yesterday's closes, which later backfills value portfolios with
+            PriceHistoryService.record_closes()
+            snapshot_count = PortfolioService.create_daily_snapshots()
         logger.info(f"Created {snapshot_count} portfolio snapshots")
+        # The snapshots are the new periods' starting values
+        rebuild_leaderboards.delay()
         return snapshot_count
     except Exception as e:
         logger.error(f"Error creating portfolio snapshots: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+@shared_task(acks_late=True, soft_time_limit=15 * 60, time_limit=20 * 60)
+def check_portfolio_valuations(fix=True):
+    """
+    Celery task to verify cached portfolio valuations against a full recompute.
+    """
+    drifted = ValuationService.check_consistency(fix=fix)
+    if drifted:
+        logger.warning(f"Found {len(drifted)} portfolios with valuation drift")
+    return len(drifted)
+
+
+@shared_task(acks_late=True, soft_time_limit=10 * 60, time_limit=15 * 60)
+def rebuild_holdings_index():
+    """
+    Celery task to rebuild the shared symbol -> holders index from positions.
+    A per-process index would only be rebuilt in this worker, so it is skipped.
+    """
+    if not HoldingsIndex.shared():
+        logger.info("No shared holdings index is configured; nothing to rebuild")
+        return 0
+    return HoldingsIndex.rebuild()
+
+
+@shared_task(acks_late=True, soft_time_limit=10 * 60, time_limit=15 * 60)
+def rebuild_leaderboards():
+    """
+    Celery task to rebuild the shared portfolio leaderboards from the database.
+    Per-process boards rebuild themselves in the processes serving them.
+    """
+    if not LeaderboardService.shared():
+        logger.info("No shared leaderboards are configured; nothing to rebuild")
+        return 0
+    return LeaderboardService.rebuild()
+
+
+@shared_task(acks_late=True, soft_time_limit=30 * 60, time_limit=35 * 60)
+def create_ledger_checkpoints(min_events=None):
+    """
+    Celery task to checkpoint portfolios whose ledgers have grown since
+    their last checkpoint, keeping point-in-time rebuilds short.
+    """
+    created = LedgerService.create_due_checkpoints(min_events)
+    logger.info(f"Created {created} ledger checkpoints")
+    return created
+
+
+@shared_task(acks_late=True, soft_time_limit=50 * 60, time_limit=55 * 60)
+def backfill_recent_snapshots(days=7):
+    """
+    Celery task to fill snapshot gaps left by missed daily runs.
+    Reads come from a replica when one is configured.
+    """
+    end = date.today() - timedelta(days=1)
+    with use_replica(read_your_writes=False):
+        summary = SnapshotBackfillService.backfill(end - timedelta(days=days - 1), end)
+    return summary['snapshots']
+
+
+@shared_task(acks_late=True, soft_time_limit=30 * 60, time_limit=35 * 60)
+def record_portfolio_risk():
+    """
+    Celery task to store each portfolio's Monte Carlo value at risk for the day.
+    Reads come from a replica when one is configured.
+    """
+    with use_replica(read_your_writes=False):
+        return RiskService.record_all()
@@ -1,3 +1,448 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .db_router import ReplicaRouter, use_replica
+from . import task_metrics
+from .benchmarks.runner import summarize
+from .metrics import MetricsRegistry
+from .models import DailyPrice, Portfolio, PortfolioCheckpoint, Position, Stock, Transaction
+from .services.backfill_service import SnapshotBackfillService
+from .services.holdings_index import HoldingsIndex, MemoryHoldingsBackend
+from .services.import_service import TradeImportService
+from .services.leaderboard_service import LeaderboardService, MemoryLeaderboardBackend
+from .services.ledger_service import LedgerService, LedgerState
+from .services.page_cache import PageCacheService
+from .services.rebalance_service import RebalanceService
+from .services.risk_service import RiskService
+from .services.valuation_service import ValuationService
 
-# Create your tests here.
+
+def open_portfolio(username, cash='10000.00'):
+    user = User.objects.create_user(username, password='x')
+    portfolio = Portfolio.objects.create(user=user, name='Main', cash_balance=0)
+    return LedgerService.open_portfolio(portfolio, Decimal(cash))
+
+
+class ValuationCacheTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('holder')
+        self.stock = Stock.objects.create(symbol='ABC', company_name='ABC Inc', last_price=Decimal('20.00'))
+        LedgerService.record(self.portfolio, Transaction.BUY, 10, '20.00', stock=self.stock)
+
+    def test_trades_and_reprices_move_the_cached_valuation(self):
+        self.assertEqual(self.portfolio.cached_stock_value, Decimal('200.00'))
+        self.assertEqual(self.portfolio.total_value(), Decimal('10000.00'))
+
+        ValuationService.reprice(self.stock, '25.50')
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cached_stock_value, Decimal('255.00'))
+        self.assertEqual(self.portfolio.total_value(), Decimal('10055.00'))
+        self.assertEqual(ValuationService.check_consistency(), [])
+
+    def test_overlapping_quotes_reprice_from_the_stored_price(self):
+        # Both loaded before either quote is applied, as by two concurrent requests
+        first, second = Stock.objects.get(pk=self.stock.pk), Stock.objects.get(pk=self.stock.pk)
+        ValuationService.reprice(first, '21.00')
+        ValuationService.reprice(second, '22.00')
+
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cached_stock_value, Decimal('220.00'))
+
+    def test_consistency_check_repairs_drift(self):
+        Portfolio.objects.filter(pk=self.portfolio.pk).update(cached_stock_value=Decimal('1.00'))
+        self.assertEqual(len(ValuationService.check_consistency(fix=True)), 1)
+
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cached_stock_value, Decimal('200.00'))
+        self.assertEqual(self.portfolio.total_value(), Decimal('10000.00'))
+        self.assertEqual(ValuationService.check_consistency(), [])
+
+    def test_saving_a_stale_instance_keeps_the_ledger_cash(self):
+        stale = Portfolio.objects.get(pk=self.portfolio.pk)
+        LedgerService.record(self.portfolio, Transaction.BUY, 5, '20.00', stock=self.stock)
+
+        stale.name = 'Renamed'
+        with self.assertNumQueries(1):
+            stale.save()
+
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.name, 'Renamed')
+        self.assertEqual(self.portfolio.cash_balance, Decimal('9700.00'))
+        self.assertEqual(self.portfolio.total_value(), Decimal('10000.00'))
+
+    def test_audit_compares_materialized_state_with_the_ledger(self):
+        LedgerService.record(self.portfolio, Transaction.SELL, 4, '22.00', stock=self.stock)
+        LedgerService.record(self.portfolio, Transaction.WITHDRAW, 1, '100.00')
+        self.assertEqual(LedgerService.audit(self.portfolio), [])
+
+        Portfolio.objects.filter(pk=self.portfolio.pk).update(cash_balance=Decimal('1.00'))
+        self.assertEqual(len(LedgerService.audit(self.portfolio)), 1)
+
+
+class RepriceFanOutTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('trader')
+        self.stock = Stock.objects.create(symbol='XYZ', company_name='XYZ Corp', last_price=Decimal('100.00'))
+        # This process's index, loaded before the trade below
+        HoldingsIndex._backend = MemoryHoldingsBackend()
+        HoldingsIndex.rebuild()
+
+    def tearDown(self):
+        HoldingsIndex._backend = None
+
+    def test_reprice_reaches_positions_missing_from_the_process_index(self):
+        # Bought as if by another process: this process's index never hears of it
+        LedgerService.record(self.portfolio, Transaction.BUY, 10, '100.00', stock=self.stock)
+        self.assertEqual(HoldingsIndex.holders('XYZ'), {})
+
+        self.assertEqual(ValuationService.reprice(self.stock, '150.00'), 1)
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.total_value(), Decimal('10500.00'))
+
+    def test_rolled_back_trade_leaves_the_index_alone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    LedgerService.record(self.portfolio, Transaction.BUY, 10, '100.00', stock=self.stock)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(HoldingsIndex.holders('XYZ'), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LedgerService.record(self.portfolio, Transaction.BUY, 10, '100.00', stock=self.stock)
+        self.assertEqual(HoldingsIndex.holders('XYZ'), {self.portfolio.pk: 10})
+
+
+class PortfolioTransactionRouteTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('orderer')
+        self.client = APIClient()
+        self.url = f'/api/portfolios/{self.portfolio.pk}/transactions/'
+        self.order = {'stock_symbol': 'XYZ', 'quantity': 2, 'price': '50.00', 'transaction_type': 'buy'}
+
+    def test_orders_require_authentication(self):
+        response = self.client.post(self.url, self.order, format='json')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertFalse(Transaction.objects.filter(transaction_type=Transaction.BUY).exists())
+
+    def test_orders_and_listing_share_the_nested_route(self):
+        self.client.force_authenticate(self.portfolio.user)
+        response = self.client.post(self.url, self.order, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        listing = self.client.get(self.url).json()
+        self.assertEqual(listing['results'][0]['id'], response.json()['transaction_id'])
+
+
+class PortfolioUpdateTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('editor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.portfolio.user)
+        self.url = f'/api/portfolios/{self.portfolio.pk}/'
+
+    def test_negative_opening_balances_are_rejected(self):
+        response = self.client.post('/api/portfolios/', {'name': 'Short', 'cash_balance': '-50.00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Portfolio.objects.filter(name='Short').exists())
+
+    def test_portfolios_open_with_a_deposit(self):
+        response = self.client.post('/api/portfolios/', {'name': 'New', 'cash_balance': '250.00'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        portfolio = Portfolio.objects.get(pk=response.json()['id'])
+        self.assertEqual(portfolio.cash_balance, Decimal('250.00'))
+        self.assertEqual(LedgerService.audit(portfolio), [])
+
+    def test_cash_edits_are_rejected(self):
+        response = self.client.patch(self.url, {'cash_balance': '99999.00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('adjust-cash', response.json()['cash_balance'][0])
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cash_balance, Decimal('10000.00'))
+
+    def test_unchanged_cash_is_accepted_with_other_edits(self):
+        response = self.client.patch(self.url, {'name': 'Renamed', 'cash_balance': '10000.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.portfolio.refresh_from_db()
+        self.assertEqual((self.portfolio.name, self.portfolio.cash_balance), ('Renamed', Decimal('10000.00')))
+
+
+class RiskRequestTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('risk')
+        self.client = APIClient()
+        self.client.force_authenticate(self.portfolio.user)
+        self.url = f'/api/portfolios/{self.portfolio.pk}/risk/'
+
+    def test_explicit_zero_and_oversized_requests_are_rejected(self):
+        for params in ({'scenarios': 0}, {'confidence': 0}, {'scenarios': RiskService.MAX_REQUEST_SCENARIOS + 1}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+        with self.assertRaises(ValueError):
+            RiskService.assess([self.portfolio], scenarios=0)
+
+
+class BacktestRequestTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('backtester')
+        self.client = APIClient()
+        self.client.force_authenticate(self.portfolio.user)
+        self.url = f'/api/portfolios/{self.portfolio.pk}/backtest/'
+
+    def test_malformed_symbols_and_amounts_are_rejected(self):
+        for body in (
+            {'symbols': [1, 2]},
+            {'symbols': ['AAPL'], 'initial_cash': 'nan'},
+            {'symbols': ['AAPL'], 'initial_cash': 'inf'},
+            {'symbols': ['AAPL'], 'slippage_bps': 'nan'},
+        ):
+            self.assertEqual(self.client.post(self.url, body, format='json').status_code, 400, body)
+
+
+class DeferredRefreshBackend(MemoryLeaderboardBackend):
+    """Counts background rebuilds instead of starting them"""
+    refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('ranked')
+        LeaderboardService._backend = DeferredRefreshBackend()
+
+    def tearDown(self):
+        LeaderboardService._backend = None
+
+    def test_writes_never_rebuild_per_process_boards(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            LedgerService.record(self.portfolio, Transaction.DEPOSIT, 1, '500.00')
+        self.assertFalse(LeaderboardService.backend().built())
+
+    def test_stale_boards_are_served_while_they_rebuild(self):
+        self.assertEqual(LeaderboardService.count(), 1)
+        backend = LeaderboardService.backend()
+        backend._built = (date.today() - timedelta(days=1), backend._built[1])
+        other = open_portfolio('late')
+        with self.captureOnCommitCallbacks(execute=True):
+            LedgerService.record(other, Transaction.DEPOSIT, 1, '500.00')
+
+        self.assertEqual(LeaderboardService.count(), 1)
+        self.assertEqual(backend.refreshes, 1)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True, DATABASE_REPLICAS=['replica'])
+class PageCacheTests(TransactionTestCase):
+    def test_cached_renders_read_the_primary(self):
+        request = RequestFactory().get('/portfolios/')
+        request.user = User.objects.create_user('viewer', password='x')
+        request.META['CSRF_COOKIE'] = 'secret'
+        request._messages = CookieStorage(request)
+        routed = []
+
+        def render(versions):
+            routed.append(ReplicaRouter().db_for_read(Portfolio))
+            return HttpResponse('page')
+
+        with use_replica():
+            PageCacheService.cached_page(request, 'test_page', render)
+            # Without a CSRF secret the page is not stored, but its fragments may be
+            del request.META['CSRF_COOKIE']
+            PageCacheService.cached_page(request, 'test_page', render)
+            self.assertEqual(ReplicaRouter().db_for_read(Portfolio), 'replica')
+        self.assertEqual(routed, ['default', 'default'])
+
+
+class MetricsTests(TestCase):
+    def test_counter_metadata_names_its_samples(self):
+        registry = MetricsRegistry()
+        registry.counter('orders', 'Orders placed', ('side',)).inc('buy')
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP orders_total Orders placed', '# TYPE orders_total counter', 'orders_total{side="buy"} 1.0',
+        ])
+
+    def test_benchmark_p95_is_the_nearest_rank(self):
+        self.assertEqual(summarize([run / 1000 for run in range(1, 11)])['p95_ms'], 10.0)
+        self.assertEqual(summarize([run / 1000 for run in range(1, 31)])['p95_ms'], 29.0)
+
+    def test_task_counter_metadata_names_its_samples(self):
+        task_metrics.record('api.tasks.rebuild_leaderboards', 'success', runtime=0.2, wait=0.01)
+        lines = task_metrics.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP celery_tasks_total Tasks run by queue, task and outcome',
+                                     '# TYPE celery_tasks_total counter'])
+        self.assertIn('celery_tasks_total{queue="analytics",task="api.tasks.rebuild_leaderboards",outcome="success"} 1.0',
+                      lines)
+
+
+class TradeImportTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('importer', cash='0.00')
+
+    def import_rows(self, rows, chunk_size=None):
+        lines = ['timestamp,transaction_type,symbol,quantity,price']
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        lines += [f"{(start + timedelta(seconds=index)).isoformat()},{row}" for index, row in enumerate(rows)]
+        return TradeImportService.import_csv(self.portfolio, io.StringIO('\n'.join(lines)), chunk_size)
+
+    def replay(self, rows):
+        state = LedgerState()
+        for row in rows:
+            transaction_type, symbol, quantity, price = row.split(',')
+            state.apply(transaction_type, symbol or None, int(quantity or 1), Decimal(price))
+        return state
+
+    def test_many_partial_sells_keep_a_finite_cost_basis(self):
+        # Each round keeps 1 of 1001 shares; a running product of the kept
+        # fractions underflows long before the end
+        rows = ['deposit,,,1000000.00', 'buy,AAA,1,10.00']
+        rows += ['buy,AAA,1000,10.00', 'sell,AAA,1000,10.00'] * 150
+        self.import_rows(rows)
+
+        position = Position.objects.get(portfolio=self.portfolio, stock__symbol='AAA')
+        self.assertEqual((position.quantity, position.average_buy_price), (1, Decimal('10.00')))
+
+    def test_import_matches_a_ledger_replay(self):
+        rows = [
+            'deposit,,,10000.00',
+            'buy,AAA,3,10.01', 'buy,AAA,7,20.03', 'sell,AAA,4,25.00', 'buy,AAA,2,14.99',
+            'buy,BBB,5,0.07', 'sell,BBB,5,0.09', 'buy,BBB,1,3.33',
+            'withdraw,,,0.10',
+        ]
+        self.import_rows(rows, chunk_size=3)
+        expected = self.replay(rows)
+
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.cash_balance, expected.cash)
+        positions = {
+            symbol: (quantity, avg_price) for symbol, quantity, avg_price in
+            Position.objects.filter(portfolio=self.portfolio).values_list('stock__symbol', 'quantity', 'average_buy_price')
+        }
+        self.assertEqual(positions, expected.positions)
+
+
+class ConcurrentOrderSource(io.StringIO):
+    """CSV source that has another connection deposit cash once the import starts reading"""
+
+    def __init__(self, portfolio, text):
+        super().__init__(text)
+        self.order = threading.Thread(target=self.deposit, args=(portfolio,))
+
+    def deposit(self, portfolio):
+        try:
+            LedgerService.record(portfolio, Transaction.DEPOSIT, 1, '500.00')
+        finally:
+            connection.close()
+
+    def read(self, *args):
+        if not self.order.ident:
+            self.order.start()
+            # Give the order time to commit, or to queue on the portfolio lock
+            self.order.join(timeout=1)
+        return super().read(*args)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentImportTests(TransactionTestCase):
+    def test_orders_placed_during_an_import_are_kept(self):
+        portfolio = open_portfolio('concurrent', cash='1000.00')
+        source = ConcurrentOrderSource(portfolio, '\n'.join([
+            'timestamp,transaction_type,symbol,quantity,price',
+            '2024-01-01T00:00:00Z,deposit,,,100.00',
+            '2024-01-01T00:00:01Z,buy,AAA,2,10.00',
+        ]))
+        TradeImportService.import_csv(portfolio, source)
+        source.order.join()
+
+        portfolio.refresh_from_db()
+        self.assertEqual(portfolio.cash_balance, Decimal('1580.00'))
+        self.assertEqual(LedgerService.audit(portfolio), [])
+
+
+class SnapshotBackfillTests(TestCase):
+    DAYS = [date(2024, 3, 4) + timedelta(days=offset) for offset in range(5)]
+
+    def setUp(self):
+        self.aaa = Stock.objects.create(symbol='AAA', company_name='AAA', last_price=Decimal('100.00'))
+        self.bbb = Stock.objects.create(symbol='BBB', company_name='BBB', last_price=Decimal('40.00'))
+        closes = {
+            self.aaa: ['100.00', '102.50', '99.75', '104.00', '103.10'],
+            # No close on the fourth day: the third day's is carried forward
+            self.bbb: ['40.00', '41.20', '39.90', None, '42.35'],
+        }
+        DailyPrice.objects.bulk_create([
+            DailyPrice(stock=stock, date=day, close=Decimal(close))
+            for stock, series in closes.items()
+            for day, close in zip(self.DAYS, series) if close
+        ])
+
+    def at(self, day, hour):
+        return timezone.make_aware(datetime.combine(self.DAYS[day], time(hour)))
+
+    def portfolio(self, username):
+        user = User.objects.create_user(username, password='x')
+        portfolio = Portfolio.objects.create(user=user, name='Main', cash_balance=0)
+        Portfolio.objects.filter(pk=portfolio.pk).update(created_at=self.at(0, 9))
+        return portfolio
+
+    def record(self, portfolio, day, transaction_type, quantity, price, stock=None):
+        LedgerService.record(portfolio, transaction_type, quantity, price, stock=stock, timestamp=self.at(day, 12))
+
+    def close_on(self, stock_id, day):
+        return DailyPrice.objects.filter(stock_id=stock_id, date__lte=day).latest('date').close
+
+    def test_snapshots_match_ledger_replays_at_stored_closes(self):
+        checkpointed = self.portfolio('checkpointed')
+        self.record(checkpointed, 0, Transaction.DEPOSIT, 1, '10000.00')
+        self.record(checkpointed, 0, Transaction.BUY, 10, '100.00', stock=self.aaa)
+        self.record(checkpointed, 1, Transaction.BUY, 25, '41.00', stock=self.bbb)
+        checkpoint = LedgerService.create_checkpoint(checkpointed)
+        PortfolioCheckpoint.objects.filter(pk=checkpoint.pk).update(timestamp=self.at(1, 18))
+        self.record(checkpointed, 2, Transaction.SELL, 4, '99.00', stock=self.aaa)
+        self.record(checkpointed, 3, Transaction.WITHDRAW, 1, '250.00')
+        self.record(checkpointed, 4, Transaction.SELL, 25, '42.00', stock=self.bbb)
+
+        other = self.portfolio('other')
+        self.record(other, 0, Transaction.DEPOSIT, 1, '5000.00')
+        self.record(other, 2, Transaction.BUY, 30, '40.10', stock=self.bbb)
+        self.record(other, 3, Transaction.BUY, 7, '103.00', stock=self.aaa)
+
+        summary = SnapshotBackfillService.backfill(self.DAYS[0], self.DAYS[-1])
+        self.assertEqual(summary['snapshots'], 2 * len(self.DAYS))
+
+        for portfolio in (checkpointed, other):
+            snapshots = dict(portfolio.snapshots.values_list('date', 'total_value'))
+            for day in self.DAYS:
+                state, _ = LedgerService.state_at(portfolio, timezone.make_aware(datetime.combine(day, time.max)))
+                expected = state.cash + sum(
+                    quantity * self.close_on(stock_id, day) for stock_id, (quantity, _) in state.positions.items()
+                )
+                self.assertEqual(snapshots[day], expected, (portfolio.user.username, day))
+
+
+class RebalanceTests(TestCase):
+    def setUp(self):
+        self.portfolio = open_portfolio('rebalancer')
+        # A stale stored price; execution must use a fresh quote instead
+        Stock.objects.create(symbol='AAPL', company_name='Apple', last_price=Decimal('1.00'))
+
+    def test_non_finite_weights_are_rejected(self):
+        for targets, tolerance in (({'AAPL': 'NaN'}, 0), ({'AAPL': '0.5'}, 'NaN'), ({'AAPL': 'Infinity'}, 0)):
+            with self.assertRaises(ValueError):
+                RebalanceService.plan(self.portfolio, targets, tolerance)
+
+    def test_execute_trades_at_fresh_quotes(self):
+        with override_settings(USE_MOCK_DATA=True):
+            plan = RebalanceService.execute(self.portfolio, {'AAPL': '0.5'})
+        quoted = Stock.objects.get(symbol='AAPL').last_price
+        self.assertNotEqual(quoted, Decimal('1.00'))
+        self.assertEqual([order['price'] for order in plan['orders']], [quoted])
+        self.assertEqual(Transaction.objects.get(pk=plan['transactions'][0]).price, quoted)
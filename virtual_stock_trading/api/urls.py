@@ -9,6 +9,7 @@ router.register(r'stocks', views.StockViewSet)
 router.register(r'portfolios', views.PortfolioViewSet, basename='portfolio')
 router.register(r'positions', views.PositionViewSet, basename='position')
 router.register(r'transactions', views.TransactionViewSet, basename='transaction')
+router.register(r'leaderboard', views.LeaderboardViewSet, basename='leaderboard')
 
 # Create a nested router for transactions within portfolios
 portfolio_router = routers.NestedSimpleRouter(router, r'portfolios', lookup='portfolio')
@@ -31,11 +32,13 @@ urlpatterns = [
     path('stocks/<str:symbol>/price/', views.stock_price_view, name='stock-price'),
     
     # REST API endpoints with namespace to avoid conflicts
-    path('api/', include((router.urls, 'api'))),
+    # Nested routes first, so the portfolio routes can't shadow them
     path('api/', include(portfolio_router.urls)),
+    path('api/', include((router.urls, 'api'))),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework_auth')),
     path('portfolios/<int:pk>/adjust-cash/', views.portfolio_adjust_cash_view, name='portfolio_adjust_cash'),
     path('transactions/create/', views.transaction_create_view, name='transaction_create'),
     path('transaction/<int:portfolio_id>/', views.create_transaction_view, name='create_transaction'),
     path('api/stocks/search/', views.stock_search_api_view, name='stock-search-api'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.shortcuts import render
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action, api_view
@@ -8,9 +9,28 @@ from django.contrib.auth.models import User
 from .models import Stock, Portfolio, Position, Transaction, PortfolioSnapshot
 from .serializers import (
     StockSerializer, PortfolioSerializer, PortfolioDetailSerializer,
-    PositionSerializer, TransactionSerializer, UserSerializer
+    PositionSerializer, TransactionSerializer, UserSerializer,
+    PortfolioSnapshotSerializer
 )
+from .fast_serializers import (
+    FastPortfolioSerializer, FastPortfolioDetailSerializer, FastPositionSerializer, FastTransactionSerializer
+)
+from .pagination import TransactionPagination, SnapshotPagination
 from .services.stock_service import StockService
+from .services.valuation_service import ValuationService
+from .services.export_service import ExportService
+from .services.import_service import TradeImportService
+from .services.ledger_service import LedgerService
+from .services.leaderboard_service import LeaderboardService
+from .services.page_cache import PageCacheService
+from .services.backtest_service import BacktestService, Commission, Slippage
+from .services.rebalance_service import RebalanceService
+from .services.risk_service import RiskService
+from .metrics import registry
+from . import task_metrics
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth.forms import UserCreationForm
 from django.views.generic.edit import CreateView
 from django.urls import reverse_lazy
@@ -19,15 +39,31 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import redirect
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from django.utils.dateparse import parse_date
 import random  # Add this import
 import decimal
 from decimal import Decimal  # Add this import at the top of the file
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
+import logging
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+search_logger = logging.getLogger('api.search')
+
+
+def fast_detail_response(serializer, queryset, pk):
+    """Serialize one object with a fast read-only serializer; 404 if missing"""
+    try:
+        data = serializer.one(queryset.filter(pk=pk))
+    except (TypeError, ValueError, DjangoValidationError):
+        data = None
+    if data is None:
+        raise Http404
+    return Response(data)
+
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -116,9 +152,157 @@ class PortfolioViewSet(viewsets.ModelViewSet):
             return PortfolioDetailSerializer
         return PortfolioSerializer
     
+    def list(self, request, *args, **kwargs):
+        # Read-only responses skip the DRF serializers; see fast_serializers
+        return Response(FastPortfolioSerializer.many(self.get_queryset().order_by('id')))
+    
+    def retrieve(self, request, *args, **kwargs):
+        return fast_detail_response(FastPortfolioDetailSerializer, self.get_queryset(), kwargs['pk'])
+    
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # The starting cash is recorded in the ledger as an opening deposit
+        opening_balance = serializer.validated_data.pop('cash_balance', Decimal('10000.00'))
+        with transaction.atomic():
+            portfolio = serializer.save(user=self.request.user, cash_balance=0)
+            LedgerService.open_portfolio(portfolio, opening_balance)
+            PageCacheService.invalidate(user_ids=[self.request.user.pk])
+    
+    def perform_update(self, serializer):
+        portfolio = serializer.save()
+        PageCacheService.invalidate(portfolio_ids=[portfolio.pk], user_ids=[portfolio.user_id])
+    
+    def perform_destroy(self, instance):
+        portfolio_id = instance.pk
+        PageCacheService.invalidate(portfolio_ids=[portfolio_id], user_ids=[instance.user_id])
+        instance.delete()
+        LeaderboardService.update([portfolio_id])
+    
+    @action(detail=True, methods=['get'])
+    def ledger(self, request, pk=None):
+        """
+        Cash and positions rebuilt from the transaction ledger, as of the
+        optional ?at= date or datetime (default: now).
+        """
+        portfolio = self.get_object()
+        try:
+            at = ExportService.parse_bound(request.query_params.get('at'), end=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        state, replayed = LedgerService.state_at(portfolio, at)
+        symbols = dict(Stock.objects.filter(id__in=state.positions).values_list('id', 'symbol'))
+        return Response({
+            'at': at or timezone.now(),
+            'cash_balance': state.cash,
+            'positions': [
+                {'symbol': symbols.get(stock_id), 'quantity': quantity, 'average_buy_price': avg_price}
+                for stock_id, (quantity, avg_price) in sorted(state.positions.items())
+            ],
+            'events_replayed': replayed,
+        })
     
+    @action(detail=True, methods=['post'])
+    def backtest(self, request, pk=None):
+        """
+        Backtest a built-in strategy over stored daily closes, starting from
+        the portfolio's cash (or initial_cash). Accepts strategy, params,
+        symbols (default: the portfolio's holdings), start and end dates
+        (default: the last year), commission_per_share, commission_rate,
+        commission_minimum, slippage_bps. Nothing is traded.
+        """
+        portfolio = self.get_object()
+        data = request.data
+        try:
+            end = parse_date(data['end']) if data.get('end') else date.today()
+            start = parse_date(data['start']) if data.get('start') else end - timedelta(days=365)
+            if start is None or end is None:
+                raise ValueError("Dates must be YYYY-MM-DD")
+            symbols = data.get('symbols') or list(
+                portfolio.positions.filter(quantity__gt=0).values_list('stock__symbol', flat=True)
+            )
+            if isinstance(symbols, str):
+                symbols = symbols.split(',')
+            result = BacktestService.run(
+                symbols, start, end,
+                strategy=data.get('strategy', 'buy_and_hold'),
+                params=data.get('params') or {},
+                initial_cash=float(data.get('initial_cash', portfolio.cash_balance)),
+                commission=Commission(
+                    per_share=float(data.get('commission_per_share', 0)),
+                    rate=float(data.get('commission_rate', 0)),
+                    minimum=float(data.get('commission_minimum', 0)),
+                ),
+                slippage=Slippage(bps=float(data.get('slippage_bps', 5))),
+            )
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'symbols': result.history.symbols,
+            'stats': result.stats(),
+            'positions': result.positions(),
+            'cash_balance': round(result.cash, 2),
+            'snapshots': result.equity_curve(),
+        })
+
+    @action(detail=True, methods=['post'])
+    def rebalance(self, request, pk=None):
+        """
+        The fewest whole-share orders that bring the portfolio to target
+        weights within its cash. Accepts targets ({symbol: weight}; held
+        symbols left out are sold), tolerance (weight drift left untraded)
+        and execute. Without execute=true only a preview is returned;
+        with it every order is placed in one atomic batch.
+        """
+        portfolio = self.get_object()
+        targets = request.data.get('targets')
+        if not isinstance(targets, dict):
+            return Response({'error': 'targets must map symbols to weights'}, status=status.HTTP_400_BAD_REQUEST)
+        tolerance = request.data.get('tolerance', 0)
+        try:
+            if str(request.data.get('execute', '')).lower() == 'true':
+                plan = RebalanceService.execute(portfolio, targets, tolerance)
+                return Response(plan, status=status.HTTP_201_CREATED)
+            return Response(RebalanceService.plan(portfolio, targets, tolerance))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def risk(self, request, pk=None):
+        """
+        Monte Carlo 1- and 10-day value at risk and expected shortfall (CVaR)
+        of the portfolio's current positions. Accepts ?confidence= (default
+        RISK_CONFIDENCE) and ?scenarios= (default RISK_SCENARIOS, at most
+        RiskService.MAX_REQUEST_SCENARIOS). Stored nightly reports are listed
+        under /risk-history/.
+        """
+        portfolio = self.get_object()
+        try:
+            confidence = float(request.query_params.get('confidence', settings.RISK_CONFIDENCE))
+            scenarios = int(request.query_params.get(
+                'scenarios', min(settings.RISK_SCENARIOS, RiskService.MAX_REQUEST_SCENARIOS)
+            ))
+            if scenarios > RiskService.MAX_REQUEST_SCENARIOS:
+                raise ValueError(f"At most {RiskService.MAX_REQUEST_SCENARIOS} scenarios can be requested")
+            report = RiskService.assess([portfolio], scenarios=scenarios, confidence=confidence)[portfolio.id]
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            key: round(value, 2) if key in ('total_value', 'var_1d', 'cvar_1d', 'var_10d', 'cvar_10d') else value
+            for key, value in report.items()
+        })
+
+    @action(detail=True, methods=['get'], url_path='risk-history')
+    def risk_history(self, request, pk=None):
+        """
+        Get the portfolio's nightly risk reports, newest first.
+        """
+        portfolio = self.get_object()
+        return Response(list(portfolio.risk_reports.order_by('-date').values(
+            'date', 'total_value', 'confidence', 'scenarios', 'var_1d', 'cvar_1d', 'var_10d', 'cvar_10d',
+        )[:365]))
+
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
         """
@@ -146,20 +330,70 @@ class PortfolioViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=True, methods=['get'])
-    def transactions(self, request, pk=None):
+    def snapshots(self, request, pk=None):
+        """
+        Get a portfolio's daily snapshots, newest first, one cursor page at a time.
+        """
+        portfolio = self.get_object()
+        paginator = SnapshotPagination()
+        page = paginator.paginate_queryset(portfolio.snapshots.all(), request, view=self)
+        serializer = PortfolioSnapshotSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['get'], url_path='export/transactions')
+    def export_transactions(self, request, pk=None):
+        """
+        Stream the portfolio's transactions as CSV or NDJSON.
+        """
+        return self._export(request, 'transactions')
+    
+    @action(detail=True, methods=['get'], url_path='export/snapshots')
+    def export_snapshots(self, request, pk=None):
         """
-        Get all transactions for a portfolio.
+        Stream the portfolio's daily snapshots as CSV or NDJSON.
+        """
+        return self._export(request, 'snapshots')
+    
+    def _export(self, request, kind):
+        """
+        Build a streaming export. Accepts ?output=csv|ndjson, ?start= and
+        ?end= dates, and ?gzip=true for a compressed download.
         """
         portfolio = self.get_object()
-        transactions = portfolio.transactions.all().order_by('-timestamp')
-        page = self.paginate_queryset(transactions)
+        output = request.query_params.get('output', 'csv')
+        if output not in ExportService.FORMATS:
+            return Response(
+                {'error': f"Unsupported output '{output}'. Use one of: {', '.join(ExportService.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = ExportService.parse_bound(request.query_params.get('start'))
+            end = ExportService.parse_bound(request.query_params.get('end'), end=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        if page is not None:
-            serializer = TransactionSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        chunks, filename = ExportService.export(portfolio, kind, output, start, end, compress)
+        content_type = 'application/gzip' if compress else ExportService.FORMATS[output]
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    @action(detail=True, methods=['post'], url_path='import')
+    def import_trades(self, request, pk=None):
+        """
+        Import a CSV of historical trades uploaded as the 'file' field.
+        """
+        portfolio = self.get_object()
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'Please upload a CSV file as "file"'}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = TransactionSerializer(transactions, many=True)
-        return Response(serializer.data)
+        try:
+            summary = TradeImportService.import_csv(portfolio, upload)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['get'])
     def performance(self, request, pk=None):
@@ -198,6 +432,12 @@ class PositionViewSet(viewsets.ModelViewSet):
             return Position.objects.filter(portfolio=portfolio)
         return Position.objects.filter(portfolio__user=self.request.user)
     
+    def list(self, request, *args, **kwargs):
+        return Response(FastPositionSerializer.many(self.get_queryset().order_by('id')))
+    
+    def retrieve(self, request, *args, **kwargs):
+        return fast_detail_response(FastPositionSerializer, self.get_queryset(), kwargs['pk'])
+    
     def create(self, request, *args, **kwargs):
         """
         Creating positions directly is not allowed. Use buy/sell transactions instead.
@@ -215,20 +455,39 @@ class PositionViewSet(viewsets.ModelViewSet):
             {"error": "Positions cannot be updated directly. Place buy/sell orders instead."},
             status=status.HTTP_400_BAD_REQUEST
         )
+    
+    def destroy(self, request, *args, **kwargs):
+        """
+        Deleting positions directly is not allowed. Use sell transactions instead.
+        """
+        return Response(
+            {"error": "Positions cannot be deleted directly. Place a sell order instead."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
 
 class TransactionViewSet(viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionPagination
+    # The transaction ledger is append-only
+    http_method_names = ['get', 'post', 'head', 'options']
     
     def get_queryset(self):
         portfolio_pk = self.kwargs.get('portfolio_pk')
         if portfolio_pk:
-            return Transaction.objects.filter(portfolio_id=portfolio_pk)
+            return Transaction.objects.filter(portfolio_id=portfolio_pk, portfolio__user=self.request.user)
         return Transaction.objects.none()
     
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(FastTransactionSerializer.queryset(self.get_queryset()))
+        return self.get_paginated_response(FastTransactionSerializer.represent(page))
+    
+    def retrieve(self, request, *args, **kwargs):
+        return fast_detail_response(FastTransactionSerializer, self.get_queryset(), kwargs['pk'])
+    
     def create(self, request, *args, **kwargs):
-        print("Transaction create method called!")  # Debug log
+        logger.debug("Transaction create for portfolio %s", self.kwargs.get('portfolio_pk'))
         portfolio_pk = self.kwargs.get('portfolio_pk')
         
         try:
@@ -239,8 +498,10 @@ class TransactionViewSet(viewsets.ModelViewSet):
             data = request.data
             symbol = data.get('stock_symbol')
             quantity = int(data.get('quantity', 0))
-            price = float(data.get('price', 0))
+            price = Decimal(str(data.get('price', 0)))
             transaction_type = data.get('transaction_type', 'buy')
+            if transaction_type not in (Transaction.BUY, Transaction.SELL):
+                return Response({"error": "Unsupported transaction type"}, status=400)
             
             # Get or create stock
             stock, created = Stock.objects.get_or_create(
@@ -252,62 +513,86 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 }
             )
             
-            # Calculate total
-            total_cost = price * quantity
+            # Record the trade; cash and position are updated with it
+            trade = LedgerService.record(portfolio, transaction_type, quantity, price, stock=stock)
             
-            # Check if portfolio has enough funds
-            if transaction_type == 'buy' and portfolio.cash_balance < total_cost:
-                return Response({"error": f"Insufficient funds. Need ${total_cost} but have ${portfolio.cash_balance}"}, status=400)
-            
-            # Create transaction record
-            transaction = Transaction.objects.create(
-                portfolio=portfolio,
-                stock=stock,
-                transaction_type=transaction_type,
-                quantity=quantity,
-                price=price
-            )
-            
-            # Update portfolio balance
-            if transaction_type == 'buy':
-                portfolio.cash_balance -= total_cost
-            else:  # sell
-                portfolio.cash_balance += total_cost
-            
-            portfolio.save()
-            
-            # Update or create position
-            if transaction_type == 'buy':
-                position, created = Position.objects.get_or_create(
-                    portfolio=portfolio,
-                    stock=stock,
-                    defaults={'quantity': 0, 'average_buy_price': 0}
-                )
-                
-                # Update position
-                if created:
-                    position.quantity = quantity
-                    position.average_buy_price = price
-                else:
-                    # Update average price
-                    total_shares = position.quantity + quantity
-                    position.average_buy_price = ((position.average_buy_price * position.quantity) + 
-                                              (price * quantity)) / total_shares
-                    position.quantity = total_shares
-                
-                position.save()
-                
+            verb = 'purchased' if transaction_type == 'buy' else 'sold'
             return Response({
                 "success": True,
-                "message": f"Successfully purchased {quantity} shares of {symbol}",
-                "transaction_id": transaction.id
+                "message": f"Successfully {verb} {quantity} shares of {symbol}",
+                "transaction_id": trade.id
             }, status=201)
             
         except Exception as e:
-            print(f"Transaction error: {str(e)}")
+            logger.info("Transaction rejected: %s", e)
             return Response({"error": str(e)}, status=400)
 
 
+class LeaderboardViewSet(viewsets.ViewSet):
+    """
+    API endpoint for the portfolio leaderboards.
+    Ranks every portfolio by its return over ?period= (all, month, week or
+    day), ?limit= (at most 100) portfolios from ?offset=, with the ranks of
+    the user's own portfolios under 'mine'.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        period = request.query_params.get('period', 'all')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= 100 or offset < 0:
+            return Response(
+                {'error': 'limit must be between 1 and 100 and offset cannot be negative'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            top = LeaderboardService.top(period, limit, offset)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        portfolios = {
+            portfolio_id: (name, username, total_value)
+            for portfolio_id, name, username, total_value in Portfolio.objects.filter(
+                pk__in=[portfolio_id for _, portfolio_id, _ in top]
+            ).values_list('id', 'name', 'user__username', 'cached_total_value')
+        }
+        results = [
+            {
+                'rank': rank,
+                'portfolio_id': portfolio_id,
+                'portfolio': portfolios[portfolio_id][0],
+                'user': portfolios[portfolio_id][1],
+                'total_value': portfolios[portfolio_id][2],
+                'return': round(value, 6),
+            }
+            for rank, portfolio_id, value in top if portfolio_id in portfolios
+        ]
+
+        mine = []
+        for portfolio_id, name, total_value in self.request.user.portfolios.order_by('id').values_list(
+            'id', 'name', 'cached_total_value'
+        ):
+            ranked = LeaderboardService.rank(portfolio_id, period)
+            mine.append({
+                'rank': ranked[0] if ranked else None,
+                'portfolio_id': portfolio_id,
+                'portfolio': name,
+                'total_value': total_value,
+                'return': round(ranked[1], 6) if ranked else None,
+            })
+
+        return Response({
+            'period': period,
+            'ranked': LeaderboardService.count(period),
+            'results': results,
+            'mine': mine,
+        })
+
+
 class RegisterView(CreateView):
     form_class = UserCreationForm
     template_name = 'api/register.html'
@@ -334,53 +619,59 @@ def portfolio_list_view(request):
         
         if name and cash_balance:
             try:
-                cash_balance = float(cash_balance)
-                portfolio = Portfolio.objects.create(
-                    user=request.user,
-                    name=name,
-                    cash_balance=cash_balance
-                )
+                cash_balance = Decimal(cash_balance)
+                with transaction.atomic():
+                    portfolio = Portfolio.objects.create(user=request.user, name=name, cash_balance=0)
+                    LedgerService.open_portfolio(portfolio, cash_balance)
+                    PageCacheService.invalidate(user_ids=[request.user.pk])
                 messages.success(request, f"Portfolio '{name}' created successfully!")
                 return redirect('portfolio_detail', pk=portfolio.id)
-            except ValueError:
+            except (ValueError, decimal.InvalidOperation, IntegrityError):
                 messages.error(request, "Invalid cash balance amount.")
         else:
             messages.error(request, "Please provide both name and initial balance.")
     
-    # Get all user portfolios with calculated fields
-    portfolios = Portfolio.objects.filter(user=request.user)
+    def render_page(versions):
+        # Get all user portfolios with calculated fields
+        portfolios = Portfolio.objects.filter(user=request.user).annotate(position_count=Count('positions'))
     
-    # Add calculated fields to each portfolio
-    for portfolio in portfolios:
-        # Calculate total value (cash + positions)
-        positions_value = sum(position.quantity * position.stock.last_price
-                             for position in portfolio.positions.all()
-                             if position.stock.last_price)
-        portfolio.total_value = portfolio.cash_balance + positions_value
+        # Add calculated fields to each portfolio
+        for portfolio in portfolios:
+            # Total value (cash + positions) is maintained by ValuationService
+            portfolio.total_value = portfolio.cached_total_value
         
-        # Calculate profit/loss if we have portfolio snapshots
-        # This is simplified - in reality you'd compare with the first snapshot
-        # or initial investment
-        portfolio.profit_loss = portfolio.total_value - portfolio.cash_balance
-        if portfolio.cash_balance > 0:
-            portfolio.profit_loss_percentage = (portfolio.profit_loss / portfolio.cash_balance) * 100
-        else:
-            portfolio.profit_loss_percentage = 0
+            # Calculate profit/loss if we have portfolio snapshots
+            # This is simplified - in reality you'd compare with the first snapshot
+            # or initial investment
+            portfolio.profit_loss = portfolio.total_value - portfolio.cash_balance
+            if portfolio.cash_balance > 0:
+                portfolio.profit_loss_percentage = (portfolio.profit_loss / portfolio.cash_balance) * 100
+            else:
+                portfolio.profit_loss_percentage = 0
+    
+        return render(request, 'api/portfolio_list.html', {'portfolios': portfolios})
     
-    return render(request, 'api/portfolio_list.html', {'portfolios': portfolios})
+    # Repeat views are served from the cache until a trade, cash movement or price change
+    return PageCacheService.cached_page(request, 'portfolio_list', render_page)
 
 @login_required
 def portfolio_detail_view(request, pk):
     """View to display portfolio details"""
-    portfolio = get_object_or_404(Portfolio, pk=pk, user=request.user)
-    positions = portfolio.positions.all()
-    transactions = portfolio.transactions.order_by('-timestamp')[:10]  # Last 10 transactions
-    
-    return render(request, 'api/portfolio_detail.html', {
-        'portfolio': portfolio,
-        'positions': positions,
-        'transactions': transactions,
-    })
+    def render_page(versions):
+        portfolio = get_object_or_404(Portfolio, pk=pk, user=request.user)
+        positions = portfolio.positions.all()
+        transactions = portfolio.transactions.order_by('-timestamp')[:10]  # Last 10 transactions
+        
+        return render(request, 'api/portfolio_detail.html', {
+            'portfolio': portfolio,
+            'positions': positions,
+            'transactions': transactions,
+            # The positions and transactions tables are cached under the portfolio's version
+            'fragment_version': versions[-1] if versions else None,
+            'fragment_timeout': PageCacheService.timeout(),
+        })
+    
+    return PageCacheService.cached_page(request, 'portfolio_detail', render_page, portfolio_id=pk)
 
 @login_required
 def watchlist_view(request):
@@ -390,7 +681,7 @@ def watchlist_view(request):
     if query:
         response = StockService.search_stocks(query)
         search_results = response.get('results', [])
-        print(f"Found {len(search_results)} stocks matching '{query}'")
+        search_logger.info("Watchlist search found %d stocks matching %r", len(search_results), query)
     
     # Get price data for popular stocks to display by default
     popular_symbols = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'JPM', 'V', 'JNJ']
@@ -451,44 +742,20 @@ def portfolio_adjust_cash_view(request, pk):
                 messages.error(request, "Amount must be positive.")
                 return redirect('portfolio_detail', pk=portfolio.id)
                 
-            if action == 'deposit':
-                # Add to cash balance
-                portfolio.cash_balance += amount
-                messages.success(request, f"Successfully deposited ${amount:.2f} to your portfolio.")
-                
-                # Create a transaction record - use only fields that exist in the model
-                Transaction.objects.create(
-                    portfolio=portfolio,
-                    transaction_type='deposit',
-                    quantity=1,  # Not applicable for deposits
-                    price=amount,
-                    # Remove total_amount and notes if they don't exist
-                )
-                
-            elif action == 'withdraw':
-                # Check if there's enough cash
-                if amount > portfolio.cash_balance:
-                    messages.error(request, f"Insufficient funds. Your available cash balance is ${portfolio.cash_balance:.2f}.")
-                    return redirect('portfolio_detail', pk=portfolio.id)
-                
-                # Subtract from cash balance
-                portfolio.cash_balance -= amount
-                messages.success(request, f"Successfully withdrew ${amount:.2f} from your portfolio.")
-                
-                # Create a transaction record - use only fields that exist in the model
-                Transaction.objects.create(
-                    portfolio=portfolio,
-                    transaction_type='withdraw',
-                    quantity=1,  # Not applicable for withdrawals
-                    price=amount,
-                    # Remove total_amount and notes if they don't exist
-                )
-            else:
+            if action not in (Transaction.DEPOSIT, Transaction.WITHDRAW):
                 messages.error(request, "Invalid action.")
                 return redirect('portfolio_detail', pk=portfolio.id)
             
-            # Save the portfolio
-            portfolio.save()
+            # Cash movements are ledger entries carrying the amount as price
+            try:
+                LedgerService.record(portfolio, action, 1, amount, notes=note)
+            except ValueError as e:
+                messages.error(request, str(e))
+                return redirect('portfolio_detail', pk=portfolio.id)
+            if action == Transaction.DEPOSIT:
+                messages.success(request, f"Successfully deposited ${amount:.2f} to your portfolio.")
+            else:
+                messages.success(request, f"Successfully withdrew ${amount:.2f} from your portfolio.")
             
         except (ValueError, decimal.InvalidOperation) as e:
             messages.error(request, f"Invalid amount: {str(e)}")
@@ -519,54 +786,16 @@ def transaction_create_view(request):
             }
         )
         
-        # If stock exists but price is outdated, update it
+        # If stock exists but price is outdated, update it and reprice holders
         if not created:
-            stock.last_price = price
-            stock.last_updated = timezone.now()
-            stock.save()
+            ValuationService.reprice(stock, price)
         
         # Get portfolio
         portfolio = Portfolio.objects.get(id=portfolio_id, user=request.user)
         
         # Process transaction based on type
         if transaction_type == 'buy':
-            # Calculate total cost
-            total_cost = price * quantity
-            
-            # Check if user has enough balance
-            if portfolio.cash_balance < total_cost:
-                return JsonResponse({'error': 'Insufficient funds'}, status=400)
-                
-            # Update portfolio balance
-            portfolio.cash_balance -= total_cost
-            portfolio.save()
-            
-            # Create transaction record
-            transaction = Transaction.objects.create(
-                portfolio=portfolio,
-                stock=stock,
-                transaction_type='buy',
-                quantity=quantity,
-                price=price
-            )
-            
-            # Create or update position
-            position, created = Position.objects.get_or_create(
-                portfolio=portfolio,
-                stock=stock,
-                defaults={
-                    'quantity': quantity,
-                    'average_buy_price': price
-                }
-            )
-            
-            if not created:
-                # Update existing position
-                new_quantity = position.quantity + quantity
-                position.average_buy_price = ((position.average_buy_price * position.quantity) + 
-                                          (price * quantity)) / new_quantity
-                position.quantity = new_quantity
-                position.save()
+            transaction = LedgerService.record(portfolio, Transaction.BUY, quantity, price, stock=stock)
                 
         # For now, we only support buy
         else:
@@ -623,56 +852,19 @@ def create_transaction_view(request, portfolio_id):
             }
         )
         
-        # Calculate total cost using Decimal
-        total_cost = price_decimal * Decimal(quantity)
+        if transaction_type not in (Transaction.BUY, Transaction.SELL):
+            return JsonResponse({"error": "Unsupported transaction type"}, status=400)
         
-        # Check if portfolio has enough funds for buy
-        if transaction_type == 'buy' and portfolio.cash_balance < total_cost:
-            return JsonResponse({
-                "error": f"Insufficient funds. Need ${total_cost:.2f} but have ${portfolio.cash_balance:.2f}"
-            }, status=400)
-            
-        # Create transaction record
-        transaction = Transaction.objects.create(
-            portfolio=portfolio,
-            stock=stock,
-            transaction_type=transaction_type,
-            quantity=quantity,
-            price=price_decimal  # Use decimal
-        )
-        
-        # Update portfolio balance
-        if transaction_type == 'buy':
-            portfolio.cash_balance -= total_cost
-        else:  # sell
-            portfolio.cash_balance += total_cost
-        
-        portfolio.save()
+        # Record the trade; cash and position are updated with it
+        try:
+            transaction = LedgerService.record(portfolio, transaction_type, quantity, price_decimal, stock=stock)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
         
-        # Update or create position
-        if transaction_type == 'buy':
-            position, created = Position.objects.get_or_create(
-                portfolio=portfolio,
-                stock=stock,
-                defaults={'quantity': 0, 'average_buy_price': Decimal('0.00')}
-            )
-            
-            # Update position
-            if created:
-                position.quantity = quantity
-                position.average_buy_price = price_decimal
-            else:
-                # Update average price using Decimal
-                total_shares = position.quantity + quantity
-                position.average_buy_price = ((position.average_buy_price * Decimal(position.quantity)) + 
-                                          (price_decimal * Decimal(quantity))) / Decimal(total_shares)
-                position.quantity = total_shares
-            
-            position.save()
-            
+        verb = 'purchased' if transaction_type == 'buy' else 'sold'
         return JsonResponse({
             "success": True,
-            "message": f"Successfully purchased {quantity} shares of {symbol}",
+            "message": f"Successfully {verb} {quantity} shares of {symbol}",
             "transaction_id": transaction.id,
             "new_balance": float(portfolio.cash_balance)
         }, status=201)
@@ -680,7 +872,7 @@ def create_transaction_view(request, portfolio_id):
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON data"}, status=400)
     except Exception as e:
-        print(f"Transaction error: {str(e)}")
+        logger.exception("Transaction error: %s", e)
         return JsonResponse({"error": str(e)}, status=500)
 
 @login_required
@@ -705,7 +897,19 @@ def stock_search_api_view(request):
     response = StockService.search_stocks(query)
     results = response.get('results', [])
     
-    # Log success for debugging
-    print(f"API search found {len(results)} results for '{query}'")
+    search_logger.info("API search found %d results for %r", len(results), query)
     
     return JsonResponse({'results': results})
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics for this process, plus the per-queue task metrics
+    the Celery workers keep in the shared cache. Scrapers authenticate with
+    'Authorization: Bearer <METRICS_TOKEN>'; staff users can always view it.
+    """
+    token = settings.METRICS_TOKEN
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not (request.user.is_staff or (token and constant_time_compare(supplied, token))):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render() + task_metrics.render(), content_type=registry.CONTENT_TYPE)
@@ -1,5 +1,7 @@
 import os
+import time
 from celery import Celery
+from celery.signals import before_task_publish, celeryd_init, task_postrun, task_prerun
 from django.conf import settings
 
 # Set default Django settings module
@@ -16,4 +18,54 @@ app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 @app.task(bind=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+    print(f'Request: {self.request!r}')
+
+
+@celeryd_init.connect
+def size_worker_for_queues(conf=None, options=None, **kwargs):
+    """
+    Size a worker started for particular queues (-Q) from
+    settings.TASK_QUEUE_WORKERS: the queues' concurrency is added up and
+    the smallest prefetch multiplier wins. --concurrency and
+    --prefetch-multiplier on the command line take precedence.
+    """
+    queues = [queue for queue in options.get('queues') or [] if queue in settings.TASK_QUEUE_WORKERS]
+    if not queues:
+        return
+    sizes = [settings.TASK_QUEUE_WORKERS[queue] for queue in queues]
+    if options.get('concurrency') is None:
+        conf.worker_concurrency = sum(size['concurrency'] for size in sizes)
+    if options.get('prefetch_multiplier') is None:
+        conf.worker_prefetch_multiplier = min(size['prefetch_multiplier'] for size in sizes)
+
+
+# Per-queue task metrics (api/task_metrics.py). The publish time travels in
+# a message header so the worker can tell how long the task sat in its queue.
+_started = {}
+
+
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def note_task_start(task_id=None, **kwargs):
+    _started[task_id] = (time.time(), time.perf_counter())
+
+
+@task_postrun.connect
+def record_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    from api import task_metrics
+
+    started = _started.pop(task_id, None)
+    if started is None or state not in ('SUCCESS', 'FAILURE', 'RETRY'):
+        return
+    started_at, started_counter = started
+    published_at = getattr(task.request, 'published_at', None)
+    task_metrics.record(
+        task.name,
+        state.lower(),
+        runtime=time.perf_counter() - started_counter,
+        wait=started_at - published_at if published_at else None,
+    )
@@ -52,11 +52,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this after SecurityMiddleware
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -111,6 +114,26 @@ if 'DATABASE_URL' in os.environ:
     )
 
 
+# SQLite tuned for single-node production (WAL, pragmas, busy timeout and
+# BEGIN IMMEDIATE transactions; see api/backends/sqlite3/base.py)
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'False').lower() == 'true'
+if SQLITE_TUNING and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['ENGINE'] = 'api.backends.sqlite3'
+
+# Read replicas: comma-separated database URLs, registered as replica_0,
+# replica_1, ... Read-only requests and the reporting tasks read from them;
+# a client that has just written reads from the primary for
+# REPLICA_STICKY_SECONDS so it never sees its own trade missing.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600, conn_health_checks=True)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '15'))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -168,7 +191,75 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Cursor-paginated transaction and snapshot listings: default page size and
+# the upper bound for the ?page_size= override
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '500'))
+
+# Per-request timing (Server-Timing header, performance log, /metrics).
+# The header exposes view and query timings to clients, so it is only sent
+# under DEBUG unless PERF_SERVER_TIMING says otherwise.
+# Requests slower than PERF_SLOW_REQUEST_MS are logged as warnings.
+# /metrics is open to staff users and to clients sending METRICS_TOKEN.
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'True').lower() == 'true'
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', str(DEBUG)).lower() == 'true'
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', '1000'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Opt-in profiling (off by default; the middleware unloads itself when off).
+# Requests carrying PROFILING_HEADER from staff users or with PROFILING_TOKEN
+# as its value, plus a PROFILING_SAMPLE_RATE fraction of all requests, are
+# run under cProfile. Requests slower than PROFILING_SLOW_MS (0 disables) are
+# saved with their SQL. Browse the results under Request profiles in the admin.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_HEADER = os.getenv('PROFILING_HEADER', 'X-Profile')
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_SLOW_MS = int(os.getenv('PROFILING_SLOW_MS', '1000'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', '500'))
+
+# Logging. Records are queued and written as JSON lines (LOG_FORMAT=text for
+# plain lines) by a background thread. LOG_LEVELS sets per-module levels,
+# e.g. 'api.services=DEBUG,django.db.backends=DEBUG'. Search and quote
+# events are sampled at LOG_SAMPLE_RATE; warnings and errors always pass.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'api.log.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'filters': {
+        'sampled': {'()': 'api.log.SamplingFilter', 'rate': LOG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'console': {
+            'class': 'api.log.QueueingStreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': LOG_FORMAT,
+        },
+    },
+    'root': {'handlers': ['console'], 'level': LOG_LEVEL},
+    'loggers': {
+        'django': {'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO').upper()},
+        'api.search': {'filters': ['sampled']},
+        'api.quotes': {'filters': ['sampled']},
+    },
 }
+for override in filter(None, os.getenv('LOG_LEVELS', '').split(',')):
+    name, _, level = override.partition('=')
+    LOGGING['loggers'].setdefault(name.strip(), {})['level'] = level.strip().upper()
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Adjust for production
@@ -185,6 +276,71 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Task topology. Market data and orders have their own queues so a long
+# snapshot or analytics run can never hold them up. Run a worker per queue
+# (or group of queues), e.g. `celery -A virtual_stock_trading worker -Q quotes`;
+# TASK_QUEUE_WORKERS sizes a worker from the queues it consumes.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'api.tasks.refresh_stock_prices': {'queue': 'quotes'},
+    'api.tasks.execute_order': {'queue': 'orders'},
+    'api.tasks.create_daily_portfolio_snapshots': {'queue': 'snapshots'},
+    'api.tasks.backfill_recent_snapshots': {'queue': 'snapshots'},
+    'api.tasks.create_ledger_checkpoints': {'queue': 'snapshots'},
+    'api.tasks.check_portfolio_valuations': {'queue': 'analytics'},
+    'api.tasks.rebuild_holdings_index': {'queue': 'analytics'},
+    'api.tasks.rebuild_leaderboards': {'queue': 'analytics'},
+    'api.tasks.record_portfolio_risk': {'queue': 'analytics'},
+}
+# Short tasks prefetch a few messages to keep processes busy; long ones take
+# one at a time so a queued job is not stuck behind a busy process.
+TASK_QUEUE_WORKERS = {
+    'quotes': {'concurrency': 4, 'prefetch_multiplier': 4},
+    'orders': {'concurrency': 4, 'prefetch_multiplier': 1},
+    'snapshots': {'concurrency': 1, 'prefetch_multiplier': 1},
+    'analytics': {'concurrency': 2, 'prefetch_multiplier': 1},
+}
+# Required for acks_late: a task a worker has not acknowledged within this
+# time is redelivered, so it must exceed the longest hard time limit.
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 2 * 60 * 60}
+
+# Market data. The .env file is loaded once, at the top of this module;
+# services read these settings instead of the environment.
+FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
+USE_MOCK_DATA = os.getenv('USE_MOCK_DATA', 'False').lower() == 'true'
+
+# Simulated market that serves quotes when Finnhub is not used or not
+# reachable. Prices are a function of the seed and the time since the epoch,
+# so every process with the same settings quotes the same price.
+MARKET_SIM_SEED = int(os.getenv('MARKET_SIM_SEED', '0'))
+MARKET_SIM_EPOCH = os.getenv('MARKET_SIM_EPOCH', '2024-01-01T00:00:00+00:00')
+MARKET_SIM_TICK_SECONDS = float(os.getenv('MARKET_SIM_TICK_SECONDS', '5'))
+# Default loading of each symbol on the market factor; two symbols' returns
+# are correlated by the product of their betas
+MARKET_SIM_BETA = float(os.getenv('MARKET_SIM_BETA', '0.6'))
+
+# Symbol -> holders index used to fan out price changes. Set a redis:// URL
+# to share one index between every process; it is rebuilt nightly. Without
+# it, price changes find their holders by joining Position, since an index
+# kept in each process would miss positions opened by the others.
+HOLDINGS_INDEX_URL = os.environ.get('HOLDINGS_INDEX_URL', '')
+
+# Cache. Set a redis:// URL when several worker processes serve requests, so
+# they share cached pages and see each other's invalidations; otherwise each
+# process has its own in-memory cache.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Per-user caching of the portfolio list and detail pages (and fragments of
+# them), invalidated by trades, cash movements and price changes. On by
+# default only with a shared CACHE_URL, since a per-process cache would keep
+# serving a page another worker has invalidated.
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'True' if CACHE_URL else 'False').lower() == 'true'
+PAGE_CACHE_SECONDS = int(os.getenv('PAGE_CACHE_SECONDS', '300'))
+
 # Celery Beat Schedule
 from celery.schedules import crontab
 
@@ -193,6 +349,56 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'api.tasks.create_daily_portfolio_snapshots',
         'schedule': crontab(hour=0, minute=0),  # Run at midnight every day
     },
+    'check-portfolio-valuations': {
+        'task': 'api.tasks.check_portfolio_valuations',
+        'schedule': crontab(minute=30),  # Run every hour
+    },
+    'backfill-recent-snapshots': {
+        'task': 'api.tasks.backfill_recent_snapshots',
+        'schedule': crontab(hour=0, minute=45),
+    },
+    'create-ledger-checkpoints': {
+        'task': 'api.tasks.create_ledger_checkpoints',
+        'schedule': crontab(hour=1, minute=0),
+    },
+}
+if HOLDINGS_INDEX_URL:
+    CELERY_BEAT_SCHEDULE['rebuild-holdings-index'] = {
+        'task': 'api.tasks.rebuild_holdings_index',
+        'schedule': crontab(hour=0, minute=15),
+    }
+
+# Monte Carlo value at risk (RiskService): scenarios drawn per batch of
+# portfolios, the VaR confidence level, and the trading days of returns
+# the covariance is estimated from. Reports are stored nightly.
+RISK_SCENARIOS = int(os.getenv('RISK_SCENARIOS', '20000'))
+RISK_CONFIDENCE = float(os.getenv('RISK_CONFIDENCE', '0.99'))
+RISK_LOOKBACK_DAYS = int(os.getenv('RISK_LOOKBACK_DAYS', '250'))
+RISK_SEED = int(os.getenv('RISK_SEED', '0'))
+CELERY_BEAT_SCHEDULE['record-portfolio-risk'] = {
+    'task': 'api.tasks.record_portfolio_risk',
+    'schedule': crontab(hour=1, minute=30),
 }
 
+# Held stocks are requoted every PRICE_REFRESH_MINUTES (0 disables)
+PRICE_REFRESH_MINUTES = int(os.getenv('PRICE_REFRESH_MINUTES', '0'))
+if PRICE_REFRESH_MINUTES:
+    CELERY_BEAT_SCHEDULE['refresh-stock-prices'] = {
+        'task': 'api.tasks.refresh_stock_prices',
+        'schedule': PRICE_REFRESH_MINUTES * 60,
+    }
+
+# Portfolio leaderboards (LeaderboardService). Set a redis:// URL when
+# several worker processes serve requests, so they share one ranking that
+# trades rescore; otherwise each process ranks in memory and rebuilds its
+# boards in the background. Boards are rebuilt from the database after the
+# nightly snapshots and every LEADERBOARD_REBUILD_MINUTES (0 disables).
+LEADERBOARD_URL = os.environ.get('LEADERBOARD_URL', '')
+LEADERBOARD_REBUILD_MINUTES = int(os.getenv('LEADERBOARD_REBUILD_MINUTES', '60'))
+if LEADERBOARD_URL and LEADERBOARD_REBUILD_MINUTES:
+    CELERY_BEAT_SCHEDULE['rebuild-leaderboards'] = {
+        'task': 'api.tasks.rebuild_leaderboards',
+        'schedule': LEADERBOARD_REBUILD_MINUTES * 60,
+    }
+
 CSRF_TRUSTED_ORIGINS = [f"https://{host}" for host in ALLOWED_HOSTS if host != '*']
\ No newline at end of file